@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import quoteattr
+
+from metadata import ENTITY_LOGICAL_NAMES
+from odata import Filter, build_filter, literal, query_columns
+
+GroupBy = Literal["owner", "business_unit", "status", "close_month"]
+# opportunities also carry the sales region, which orders, quotes and invoices don't have
+OpportunityGroupBy = Literal["region", "owner", "business_unit", "status", "close_month"]
+
+_COMMON_GROUP_COLUMNS = {
+    "owner": "_ownerid_value",
+    "business_unit": "_owningbusinessunit_value",
+    "status": "statecode",
+}
+# per table: the columns group_by can name
+GROUP_COLUMNS: Dict[str, Dict[str, str]] = {
+    "opportunities": {"region": "cs_accountsalesregion", **_COMMON_GROUP_COLUMNS},
+    "salesorders": _COMMON_GROUP_COLUMNS,
+    "quotes": _COMMON_GROUP_COLUMNS,
+    "invoices": _COMMON_GROUP_COLUMNS,
+}
+# per table: the amount that is summed, and the date close_month and the date range filters use
+AGGREGATE_TABLES: Dict[str, Tuple[str, str]] = {
+    "opportunities": ("estimatedvalue", "estimatedclosedate"),
+    "salesorders": ("totalamount", "datefulfilled"),
+    "quotes": ("totalamount", "closedon"),
+    "invoices": ("totalamount", "duedate"),
+}
+FETCH_OPERATORS = {"eq": "eq", "ne": "ne", "gt": "gt", "ge": "ge", "lt": "lt", "le": "le", "contains": "like"}
+
+
+def _attribute(column: str) -> str:
+    """FetchXML names lookups by their logical name, not the Web API's _<name>_value."""
+    if column.startswith("_") and column.endswith("_value"):
+        return column[1:-len("_value")]
+    return column
+
+
+def _fetch_condition(f: Filter, value: Any) -> str:
+    text = literal(value, f.kind, encode=False)
+    if text.startswith("'"):
+        text = text[1:-1].replace("''", "'")
+    if f.op == "contains":
+        text = f"%{text}%"
+    return (f"<condition attribute={quoteattr(_attribute(f.column))} "
+            f"operator={quoteattr(FETCH_OPERATORS[f.op])} value={quoteattr(text)} />")
+
+
+def apply_query(group_column: str, amount: str, filters: Sequence[Tuple[Filter, Any]]) -> str:
+    """$apply that filters, groups on one column and counts and sums each group."""
+    steps = []
+    expression = build_filter(filters)
+    if expression:
+        steps.append(f"filter({expression})")
+    steps.append(f"groupby(({group_column}),aggregate($count as count,{amount} with sum as total))")
+    return "$apply=" + "/".join(steps)
+
+
+def month_fetch_xml(table: str, amount: str, date_column: str, filters: Sequence[Tuple[Filter, Any]]) -> str:
+    """
+    FetchXML that counts and sums per calendar month. OData $apply can't group on part of a
+    date, FetchXML's dategrouping can.
+    """
+    entity = ENTITY_LOGICAL_NAMES[table]
+    conditions = "".join(_fetch_condition(f, value) for f, value in filters if value is not None)
+    return (
+        f'<fetch aggregate="true"><entity name="{entity}">'
+        f'<attribute name="{date_column}" groupby="true" dategrouping="year" alias="year" />'
+        f'<attribute name="{date_column}" groupby="true" dategrouping="month" alias="month" />'
+        f'<attribute name="{entity}id" aggregate="count" alias="count" />'
+        f'<attribute name="{amount}" aggregate="sum" alias="total" />'
+        + (f'<filter type="and">{conditions}</filter>' if conditions else "")
+        + "</entity></fetch>"
+    )
+
+
+async def aggregate(dv: Any, table: str, group_by: GroupBy, filters: Sequence[Tuple[Filter, Any]] = (),
+                    date_start: Optional[str] = None, date_end: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Count and total records of a table per group in one request, computed by Dataverse.
+    Returns [{"group": ..., "count": ..., "total": ...}], largest total first.
+    """
+    if table not in AGGREGATE_TABLES:
+        raise ValueError(f"Aggregation is not supported for {table}")
+    amount, date_column = AGGREGATE_TABLES[table]
+    filters = list(filters) + [(Filter(date_column, "ge", "date"), date_start),
+                               (Filter(date_column, "le", "date"), date_end)]
+
+    if group_by == "close_month":
+        await dv.metadata.validate(table, query_columns(filters) + [amount, date_column])
+        rows = await dv.query(table, "fetchXml=" + quote(month_fetch_xml(table, amount, date_column, filters)))
+        groups = [{"group": f"{row['year']}-{int(row['month']):02d}" if row.get("month") else None,
+                   "count": row.get("count", 0), "total": row.get("total")} for row in rows]
+        return sorted(groups, key=lambda g: g["group"] or "")
+
+    columns = GROUP_COLUMNS[table]
+    if group_by not in columns:
+        raise ValueError(f"Unknown group_by '{group_by}' for {table}, use one of {', '.join([*columns, 'close_month'])}")
+    group_column = columns[group_by]
+    await dv.metadata.validate(table, query_columns(filters) + [group_column, amount])
+    rows = await dv.query(table, apply_query(group_column, amount, filters))
+    groups = [{"group": row.get(group_column), "count": row.get("count", 0), "total": row.get("total")}
+              for row in rows]
+    return sorted(groups, key=lambda g: g["total"] or 0, reverse=True)
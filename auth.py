@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from azure.core.credentials import AccessToken, TokenCredential
+from azure.core.exceptions import ClientAuthenticationError
+from azure.identity import (AzureCliCredential, AzureDeveloperCliCredential, AzurePowerShellCredential,
+                            EnvironmentCredential, ManagedIdentityCredential, WorkloadIdentityCredential)
+
+from token_cache import FileTokenCache
+
+logger = logging.getLogger(__name__)
+
+# refresh this many seconds before the token expires
+REFRESH_MARGIN_SECONDS = 300
+# a cached token this close to expiry is no longer handed out
+EXPIRY_SKEW_SECONDS = 30
+# wait before retrying a failed background refresh
+RETRY_DELAY_SECONDS = 30
+
+
+# credential chain used for Dataverse: service principal settings, then local dev tools, then
+# managed identity (whose endpoint probe is slow off Azure). Each entry is one concrete
+# credential rather than DefaultAzureCredential's own chain, so remembering the one that
+# succeeded lets the next process skip the probing.
+CREDENTIAL_CHAIN: Dict[str, Callable[[], TokenCredential]] = {
+    "environment": EnvironmentCredential,
+    "workload_identity": WorkloadIdentityCredential,
+    "azure_cli": AzureCliCredential,
+    "azure_developer_cli": AzureDeveloperCliCredential,
+    "azure_powershell": AzurePowerShellCredential,
+    "managed_identity": ManagedIdentityCredential,
+}
+
+
+class CachedChainCredential:
+    """
+    Credential chain backed by the on-disk token cache.
+    A still-valid cached token is returned without touching any credential. Otherwise the
+    credential that succeeded last time is tried first, and the rest of the chain after it.
+    Credentials are only constructed when they are actually tried.
+    """
+
+    def __init__(self, cache: Optional[FileTokenCache] = None,
+                 chain: Optional[Dict[str, Callable[[], TokenCredential]]] = None,
+                 min_valid_seconds: float = REFRESH_MARGIN_SECONDS + EXPIRY_SKEW_SECONDS):
+        self.cache = cache
+        self.chain = chain or CREDENTIAL_CHAIN
+        self.min_valid_seconds = min_valid_seconds
+        self._credentials: Dict[str, TokenCredential] = {}
+
+    def _order(self) -> List[str]:
+        names = list(self.chain)
+        last = self.cache.last_credential() if self.cache else None
+        if last in names:
+            names.remove(last)
+            names.insert(0, last)
+        return names
+
+    def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        scope = " ".join(scopes)
+        if self.cache:
+            cached = self.cache.load(scope, self.min_valid_seconds)
+            if cached:
+                return cached
+
+        errors = []
+        for name in self._order():
+            try:
+                if name not in self._credentials:
+                    self._credentials[name] = self.chain[name]()
+                token = self._credentials[name].get_token(*scopes, **kwargs)
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                continue
+            if self.cache:
+                self.cache.save(scope, token, name)
+            return token
+        raise ClientAuthenticationError(
+            "No credential in the chain could get a token.\n" + "\n".join(errors))
+
+    def invalidate(self, scope: str):
+        """Drop the cached token so the next call goes back to the chain."""
+        if self.cache:
+            self.cache.discard(scope)
+
+
+def create_credential() -> TokenCredential:
+    """Credential chain for Dataverse, with the shared token cache unless TOKEN_CACHE_DISABLED is set."""
+    cache = None
+    if not os.getenv("TOKEN_CACHE_DISABLED"):
+        try:
+            cache = FileTokenCache()
+        except OSError:
+            logger.warning("Token cache directory is not writable, continuing without it")
+        except ValueError:
+            # a malformed TOKEN_CACHE_KEY or tokens.key
+            logger.warning("Token cache key is not a valid Fernet key, continuing without the cache")
+    return CachedChainCredential(cache)
+
+
+class TokenProvider:
+    """
+    Caches the Dataverse access token and its expiry, and refreshes it in the background
+    before it expires. Concurrent refreshes share one call to the credential chain, so
+    request paths only wait on the credential on a true cold start.
+    """
+
+    def __init__(self, credential: TokenCredential, scope: str,
+                 refresh_margin: float = REFRESH_MARGIN_SECONDS):
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self._token: Optional[AccessToken] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._background: Optional[asyncio.Task] = None
+
+    @property
+    def expires_on(self) -> Optional[int]:
+        return self._token.expires_on if self._token else None
+
+    def _usable(self, token: Optional[AccessToken]) -> bool:
+        return token is not None and token.expires_on - time.time() > EXPIRY_SKEW_SECONDS
+
+    async def get_token(self) -> str:
+        """Return a valid bearer token, fetching one only if none is cached."""
+        if self._usable(self._token):
+            return self._token.token
+        token = await self.refresh()
+        return token.token
+
+    async def refresh(self, force: bool = False) -> AccessToken:
+        """
+        Fetch a new token. Callers arriving while a fetch is running join that fetch.
+        force skips any token cache behind the credential, for tokens the server rejected.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch(force))
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future: asyncio.Future):
+        if self._inflight is future:
+            self._inflight = None
+
+    async def _fetch(self, force: bool) -> AccessToken:
+        invalidate = getattr(self.credential, "invalidate", None)
+        if force and invalidate:
+            await asyncio.to_thread(invalidate, self.scope)
+        # azure-identity credentials are synchronous, keep them off the event loop
+        token = await asyncio.to_thread(self.credential.get_token, self.scope)
+        self._token = token
+        logger.info("Dataverse token refreshed, expires in %ds",
+                    token.expires_on - int(time.time()))
+        return token
+
+    async def start(self):
+        """Acquire the first token and start the background refresh loop."""
+        if not self._usable(self._token):
+            await self.refresh()
+        if self._background is None:
+            self._background = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        previous = None
+        while True:
+            remaining = self._token.expires_on - time.time()
+            delay = remaining - self.refresh_margin
+            if previous is not None and self._token.expires_on <= previous:
+                # the credential handed back a token that expires no later (e.g. one it cached),
+                # so refreshing again right away would spin: wait part of what is left instead
+                delay = max(delay, remaining / 2, RETRY_DELAY_SECONDS)
+            previous = self._token.expires_on
+            await asyncio.sleep(max(delay, 0))
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Background token refresh failed")
+                previous = None
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+    async def stop(self):
+        if self._background is not None:
+            self._background.cancel()
+            try:
+                await self._background
+            except asyncio.CancelledError:
+                pass
+            self._background = None
+
+
+class BearerAuth(httpx.Auth):
+    """httpx auth flow that stamps each request with the provider's current token."""
+
+    def __init__(self, provider: TokenProvider):
+        self.provider = provider
+
+    async def async_auth_flow(self, request: httpx.Request):
+        request.headers["Authorization"] = f"Bearer {await self.provider.get_token()}"
+        response = yield request
+        if response.status_code == 401:
+            # token was revoked or rotated early, refresh once and replay
+            token = await self.provider.refresh(force=True)
+            request.headers["Authorization"] = f"Bearer {token.token}"
+            yield request
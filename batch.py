@@ -0,0 +1,90 @@
+import re
+import uuid
+from typing import Any, Dict, List, Sequence, Tuple
+from urllib.parse import quote
+
+from codec import loads
+
+# Encoding and decoding for the Dataverse Web API $batch endpoint (multipart/mixed, CRLF line endings)
+
+CRLF = "\r\n"
+# OData syntax characters that must survive percent-encoding of the request line
+URL_SAFE = "/:?&=$(),'@!*+;%[]~"
+
+
+class BatchPart:
+    """One decoded response from a $batch call."""
+
+    def __init__(self, status_code: int, headers: Dict[str, str], body: Any):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+
+def encode_batch(urls: Sequence[str]) -> Tuple[str, bytes]:
+    """Encode absolute GET urls as a $batch request body. Returns (content type, body)."""
+    boundary = f"batch_{uuid.uuid4().hex}"
+    lines = []
+    for url in urls:
+        lines += [
+            f"--{boundary}",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            f"GET {quote(url, safe=URL_SAFE)} HTTP/1.1",
+            "Accept: application/json",
+            "",
+        ]
+    lines += [f"--{boundary}--", ""]
+    return f"multipart/mixed; boundary={boundary}", CRLF.join(lines).encode("utf-8")
+
+
+def _boundary(content_type: str) -> str:
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise ValueError(f"No multipart boundary in content type: {content_type}")
+    return match.group(1)
+
+
+def _split_head(block: str) -> Tuple[str, str]:
+    """Split a MIME block into its header section and the rest."""
+    block = block.lstrip("\r\n")
+    for separator in ("\r\n\r\n", "\n\n"):
+        if separator in block:
+            return tuple(block.split(separator, 1))
+    return block, ""
+
+
+def _parse_headers(head: str) -> Dict[str, str]:
+    headers = {}
+    for line in head.splitlines():
+        name, _, value = line.partition(":")
+        if value:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def decode_batch(content_type: str, body: str) -> List[BatchPart]:
+    """Decode a multipart/mixed $batch response into one BatchPart per request, in order."""
+    boundary = _boundary(content_type)
+    parts = []
+    for block in body.split(f"--{boundary}")[1:]:
+        if block.startswith("--"):
+            break
+        mime_head, http_message = _split_head(block)
+        if "multipart/mixed" in _parse_headers(mime_head).get("content-type", ""):
+            # change sets nest another multipart body
+            parts.extend(decode_batch(_parse_headers(mime_head)["content-type"], http_message))
+            continue
+
+        head, payload = _split_head(http_message)
+        status_line, _, header_lines = head.partition("\n")
+        status_code = int(status_line.split()[1])
+        payload = payload.strip()
+        parts.append(BatchPart(status_code, _parse_headers(header_lines),
+                               loads(payload) if payload else None))
+    return parts
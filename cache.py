@@ -0,0 +1,161 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# seconds a response stays fresh, per table; tables not listed are never cached
+DEFAULT_TABLE_TTLS = {
+    "products": 300,
+    "businessunits": 3600,
+    "teams": 900,
+    "systemusers": 900,
+    "competitors": 3600,
+}
+DEFAULT_MAX_BYTES = int(os.getenv("DATAVERSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# how long past its TTL an entry may still be served while it is refreshed in the background
+DEFAULT_STALE_SECONDS = float(os.getenv("DATAVERSE_CACHE_STALE_SECONDS", "600"))
+DEFAULT_ETAG_MAX_BYTES = int(os.getenv("DATAVERSE_ETAG_MAX_BYTES", str(32 * 1024 * 1024)))
+
+FRESH = "fresh"
+STALE = "stale"
+
+
+def parse_ttls(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "products=300,teams=600" into per-table TTLs, on top of the defaults."""
+    ttls = dict(DEFAULT_TABLE_TTLS)
+    for item in (spec or "").split(","):
+        table, _, seconds = item.partition("=")
+        if table.strip() and seconds.strip():
+            ttls[table.strip()] = float(seconds)
+    return {table: ttl for table, ttl in ttls.items() if ttl > 0}
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, size: int, fresh_until: float, stale_until: float):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache for Dataverse reads, limited by response size in bytes.
+    Entries go through two tiers: fresh until the table's TTL, then stale for a grace window
+    during which they are still served while the caller refreshes them in the background.
+    Expired entries are kept until they are replaced or evicted, as a last resort while
+    Dataverse is unavailable. Cached values are shared, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttls: Optional[Dict[str, float]] = None,
+                 stale_seconds: float = DEFAULT_STALE_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttls = parse_ttls(os.getenv("DATAVERSE_CACHE_TTLS")) if ttls is None else ttls
+        self.stale_seconds = stale_seconds
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last_known_hits = 0
+
+    def caches(self, table: str) -> bool:
+        return table in self.ttls
+
+    def get(self, key: Hashable) -> Tuple[Any, Optional[str]]:
+        """Return (value, FRESH or STALE), or (None, None) on a miss."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or now >= entry.stale_until:
+            self.misses += 1
+            return None, None
+        self._entries.move_to_end(key)
+        if now < entry.fresh_until:
+            self.hits += 1
+            return entry.value, FRESH
+        self.stale_hits += 1
+        return entry.value, STALE
+
+    def last_known(self, key: Hashable) -> Optional[Any]:
+        """The cached value for a key however old it is, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.last_known_hits += 1
+        return entry.value
+
+    def set(self, table: str, key: Hashable, value: Any, size: int):
+        ttl = self.ttls.get(table)
+        if ttl is None or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        now = time.monotonic()
+        self._entries[key] = CacheEntry(value, size, now + ttl, now + ttl + self.stale_seconds)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def invalidate(self, table: Optional[str] = None):
+        """Drop every entry, or only the entries for one table (keys are (kind, table, ...))."""
+        for key in [k for k in self._entries if table is None or k[1] == table]:
+            self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "last_known_hits": self.last_known_hits,
+        }
+
+
+class EtagStore:
+    """
+    Last seen copy of each retrieved record with its @odata.etag, bounded LRU by bytes.
+    Used to revalidate retrieves with If-None-Match, so an unchanged record costs only headers.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_ETAG_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[str, Any, int]]" = OrderedDict()
+        self.bytes = 0
+        self.not_modified = 0
+        self.modified = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, Any, int]]:
+        """Return (etag, record, size) for a key, if one is stored."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, etag: str, record: Any, size: int):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[2]
+        self._entries[key] = (etag, record, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self._entries.popitem(last=False)[1][2]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "not_modified": self.not_modified,
+            "modified": self.modified,
+        }
@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def normalize_query(odata_query: str) -> str:
+    """
+    Canonical form of an OData query string, for use in keys.
+    Options are sorted and their names lower-cased, so "$top=5&$filter=x" and "$filter=x&$top=5" match.
+    """
+    options = []
+    for option in odata_query.split("&"):
+        name, sep, value = option.strip().partition("=")
+        if name:
+            options.append(f"{name.lower()}{sep}{value.strip()}")
+    return "&".join(sorted(options))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the work, everyone
+    arriving while it is in flight awaits the same result. Results are shared between
+    callers, so they must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # a cancelled waiter must not cancel the shared request for everyone else
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # mark the exception as retrieved even if every waiter has gone away
+            future.exception()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
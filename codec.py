@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Union
+
+import pydantic_core
+
+logger = logging.getLogger(__name__)
+
+# auto picks the fastest installed codec; orjson, msgspec, pydantic or json force one
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()
+
+
+def _fallback(value: Any) -> Any:
+    """Values the codecs can't encode natively (pydantic models, dates, sets...), as FastMCP does it."""
+    return pydantic_core.to_jsonable_python(value, fallback=str)
+
+
+def _stdlib() -> Dict[str, Callable]:
+    return {
+        "loads": json.loads,
+        "dumps": lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_fallback),
+    }
+
+
+def _pydantic() -> Dict[str, Callable]:
+    # pydantic-core ships with FastMCP, and is what its default serializer uses
+    return {
+        "loads": pydantic_core.from_json,
+        "dumps": lambda obj: pydantic_core.to_json(obj, fallback=str).decode(),
+    }
+
+
+def _orjson() -> Dict[str, Callable]:
+    import orjson
+
+    return {
+        "loads": orjson.loads,
+        "dumps": lambda obj: orjson.dumps(obj, default=_fallback, option=orjson.OPT_NON_STR_KEYS).decode(),
+    }
+
+
+def _msgspec() -> Dict[str, Callable]:
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder(enc_hook=_fallback)
+    return {
+        "loads": decoder.decode,
+        "dumps": lambda obj: encoder.encode(obj).decode(),
+    }
+
+
+CODECS = {"orjson": _orjson, "msgspec": _msgspec, "pydantic": _pydantic, "json": _stdlib}
+
+
+def load_codec(name: str = JSON_CODEC) -> Dict[str, Callable]:
+    """
+    The named codec, or for "auto" the first installed of orjson and msgspec, then pydantic-core.
+    json is the pure standard library codec, used when a requested codec isn't installed.
+    """
+    for candidate in (["orjson", "msgspec", "pydantic"] if name == "auto" else [name]):
+        try:
+            codec = CODECS[candidate]()
+        except ImportError:
+            if name != "auto":
+                logger.warning("JSON codec %s is not installed, using json", candidate)
+            continue
+        except KeyError:
+            raise ValueError(f"Unknown JSON codec '{name}', use auto, orjson, msgspec, pydantic or json")
+        codec["name"] = candidate
+        return codec
+    codec = _stdlib()
+    codec["name"] = "json"
+    return codec
+
+
+_codec = load_codec()
+CODEC_NAME: str = _codec["name"]
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON, e.g. a Dataverse response body."""
+    return _codec["loads"](data)
+
+
+def dumps(obj: Any) -> str:
+    """Encode JSON compactly; used as the FastMCP tool_serializer."""
+    return _codec["dumps"](obj)
@@ -0,0 +1,80 @@
+"""
+Compare the JSON codecs in codec.py on a Dataverse-shaped payload.
+
+    python codec_benchmark.py [records] [repeat]
+
+Decode is measured on a response body (what DataverseClient reads), encode on the
+records list (what a list_* tool returns). FastMCP's default serializer is included
+as the encode baseline.
+"""
+import random
+import sys
+import time
+import uuid
+
+from fastmcp.tools.tool import default_serializer
+
+from codec import CODECS
+
+
+def sample_page(records: int) -> dict:
+    random.seed(0)
+    rows = []
+    for i in range(records):
+        rows.append({
+            "@odata.etag": f'W/"{random.randint(10**6, 10**7)}"',
+            "opportunityid": str(uuid.UUID(int=random.getrandbits(128))),
+            "name": f"Opportunity {i} - {random.choice(['Fiber', 'Wireless', 'Cabling', 'Network'])} upgrade",
+            "statecode": random.randint(0, 2),
+            "statuscode": random.randint(1, 5),
+            "estimatedvalue": round(random.uniform(1000, 5_000_000), 2),
+            "actualvalue": None,
+            "estimatedclosedate": f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+            "closeprobability": random.randint(0, 100),
+            "cs_accountsalesregion": random.choice(["NAR", "CALA", "MEA", "Europe", "APAC"]),
+            "_parentaccountid_value": str(uuid.UUID(int=random.getrandbits(128))),
+            "_ownerid_value": str(uuid.UUID(int=random.getrandbits(128))),
+            "description": "Customer is evaluating options for the next fiscal year. " * random.randint(0, 4),
+            "createdon": "2023-06-01T12:34:56Z",
+            "modifiedon": "2024-02-03T08:09:10Z",
+        })
+    return {"@odata.context": "https://org.crm.dynamics.com/api/data/v9.2/$metadata#opportunities", "value": rows}
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    page = sample_page(records)
+    body = CODECS["json"]()["dumps"](page).encode()
+    print(f"{records} records, {len(body) / 1024:.0f} KiB, best of {repeat}")
+
+    baseline_encode = best_of(lambda: default_serializer(page["value"]), repeat)
+    results = [("fastmcp default", None, baseline_encode)]
+    for name, factory in CODECS.items():
+        try:
+            codec = factory()
+        except ImportError:
+            print(f"{name}: not installed")
+            continue
+        decode = best_of(lambda: codec["loads"](body), repeat)
+        encode = best_of(lambda: codec["dumps"](page["value"]), repeat)
+        results.append((name, decode, encode))
+
+    json_decode = next(decode for name, decode, _ in results if name == "json")
+    print(f"{'codec':<16}{'decode ms':>10}{'vs json':>9}{'encode ms':>11}{'vs fastmcp':>12}")
+    for name, decode, encode in results:
+        decode_cols = f"{decode * 1000:>10.2f}{json_decode / decode:>8.1f}x" if decode else f"{'-':>10}{'-':>9}"
+        print(f"{name:<16}{decode_cols}{encode * 1000:>11.2f}{baseline_encode / encode:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import re
+from typing import Any, Dict, List, Literal, Optional
+
+# Column profiles: which columns each table's tools return by default.
+# "compact" is enough to identify and triage a record, "standard" covers the business fields,
+# "full" sends no $select and returns every column.
+ColumnProfile = Literal["compact", "standard", "full"]
+DEFAULT_PROFILE: ColumnProfile = "standard"
+
+COLUMN_PROFILES: Dict[str, Dict[str, List[str]]] = {
+    "accounts": {
+        "compact": ["accountid", "name", "accountnumber", "cs_accountsalesregion", "statecode"],
+        "standard": ["accountid", "name", "accountnumber", "cs_accountsalesregion", "statecode",
+                     "statuscode", "revenue", "numberofemployees", "telephone1", "emailaddress1",
+                     "websiteurl", "address1_city", "address1_stateorprovince", "address1_country",
+                     "_ownerid_value", "_owningbusinessunit_value", "_parentaccountid_value",
+                     "_primarycontactid_value", "createdon", "modifiedon"],
+    },
+    "opportunities": {
+        "compact": ["opportunityid", "name", "statecode", "estimatedvalue", "estimatedclosedate",
+                    "_parentaccountid_value"],
+        "standard": ["opportunityid", "name", "statecode", "statuscode", "estimatedvalue",
+                     "actualvalue", "estimatedclosedate", "actualclosedate", "closeprobability",
+                     "stepname", "cs_accountsalesregion", "_parentaccountid_value",
+                     "_parentcontactid_value", "_ownerid_value", "_owningbusinessunit_value",
+                     "createdon", "modifiedon"],
+    },
+    "leads": {
+        "compact": ["leadid", "fullname", "companyname", "subject", "statecode"],
+        "standard": ["leadid", "fullname", "companyname", "subject", "statecode", "statuscode",
+                     "emailaddress1", "telephone1", "leadsourcecode", "leadqualitycode",
+                     "_ownerid_value", "_parentaccountid_value", "createdon", "modifiedon"],
+    },
+    "salesorders": {
+        "compact": ["salesorderid", "ordernumber", "name", "statecode", "totalamount",
+                    "_customerid_value"],
+        "standard": ["salesorderid", "ordernumber", "name", "statecode", "statuscode", "totalamount",
+                     "_customerid_value", "_opportunityid_value", "_quoteid_value", "_ownerid_value",
+                     "requestdeliveryby", "datefulfilled", "createdon", "modifiedon"],
+    },
+    "quotes": {
+        "compact": ["quoteid", "quotenumber", "name", "statecode", "totalamount", "_customerid_value"],
+        "standard": ["quoteid", "quotenumber", "name", "statecode", "statuscode", "totalamount",
+                     "_customerid_value", "_opportunityid_value", "_ownerid_value", "effectivefrom",
+                     "effectiveto", "closedon", "createdon", "modifiedon"],
+    },
+    "invoices": {
+        "compact": ["invoiceid", "invoicenumber", "name", "statecode", "totalamount", "_customerid_value"],
+        "standard": ["invoiceid", "invoicenumber", "name", "statecode", "statuscode", "totalamount",
+                     "_customerid_value", "_salesorderid_value", "_opportunityid_value",
+                     "_ownerid_value", "duedate", "datedelivered", "createdon", "modifiedon"],
+    },
+    "products": {
+        "compact": ["productid", "productnumber", "name", "price", "statecode"],
+        "standard": ["productid", "productnumber", "name", "description", "statecode", "statuscode",
+                     "price", "currentcost", "standardcost", "quantityonhand", "producttypecode",
+                     "cs_productgroup", "cs_itemtype", "cs_issalesenabled", "createdon", "modifiedon"],
+    },
+    "systemusers": {
+        "compact": ["systemuserid", "fullname", "internalemailaddress", "title"],
+        "standard": ["systemuserid", "fullname", "internalemailaddress", "title", "jobtitle",
+                     "domainname", "isdisabled", "_businessunitid_value", "_parentsystemuserid_value",
+                     "createdon"],
+    },
+    "businessunits": {
+        "compact": ["businessunitid", "name"],
+        "standard": ["businessunitid", "name", "isdisabled", "_parentbusinessunitid_value", "createdon"],
+    },
+    "teams": {
+        "compact": ["teamid", "name", "teamtype"],
+        "standard": ["teamid", "name", "teamtype", "isdefault", "_businessunitid_value",
+                     "_administratorid_value", "createdon"],
+    },
+    "competitors": {
+        "compact": ["competitorid", "name", "websiteurl"],
+        "standard": ["competitorid", "name", "websiteurl", "reportedrevenue", "overview",
+                     "strengths", "weaknesses", "createdon"],
+    },
+    "contacts": {
+        "compact": ["contactid", "fullname", "emailaddress1", "jobtitle"],
+        "standard": ["contactid", "fullname", "firstname", "lastname", "emailaddress1", "telephone1",
+                     "jobtitle", "statecode", "_parentcustomerid_value", "createdon", "modifiedon"],
+    },
+}
+
+
+def profile_columns(table: str, profile: ColumnProfile = DEFAULT_PROFILE) -> Optional[List[str]]:
+    """Columns of a profile, or None for "full" and tables without profiles."""
+    if profile == "full":
+        return None
+    profiles = COLUMN_PROFILES.get(table)
+    if profiles is None:
+        return None
+    if profile not in profiles:
+        raise ValueError(f"Unknown column profile '{profile}', use compact, standard or full.")
+    return profiles[profile]
+
+
+def select_clause(table: str, profile: ColumnProfile = DEFAULT_PROFILE) -> str:
+    """The $select option for a profile, or an empty string when every column is wanted."""
+    columns = profile_columns(table, profile)
+    return f"$select={','.join(columns)}" if columns else ""
+
+
+# single-valued navigation properties our tools expand, and the table each one points to
+NAVIGATION: Dict[str, str] = {
+    "parentaccountid": "accounts",
+    "parentcontactid": "contacts",
+}
+EXPAND = re.compile(r"^(\w+)\(\$select=([^)]*)\)$")
+
+
+def expand_clause(navigation: str, profile: ColumnProfile = DEFAULT_PROFILE) -> str:
+    """The $expand option for a navigation property, selecting the related table's profile."""
+    select = select_clause(NAVIGATION[navigation], profile)
+    return f"$expand={navigation}({select})" if select else f"$expand={navigation}"
+
+
+def with_select(table: str, odata_query: str, profile: ColumnProfile = DEFAULT_PROFILE) -> str:
+    """Append a profile's $select to an OData query that doesn't already choose its columns."""
+    select = select_clause(table, profile)
+    if not select or "$select=" in odata_query:
+        return odata_query
+    return f"{odata_query}&{select}" if odata_query else select
+
+
+def project(table: str, record: Dict[str, Any], profile: ColumnProfile = DEFAULT_PROFILE) -> Dict[str, Any]:
+    """Apply a profile to a record that was read with every column, e.g. from the replica."""
+    columns = profile_columns(table, profile)
+    if columns is None:
+        return record
+    # keep the annotations of the kept columns, such as their formatted values
+    kept = set(columns)
+    return {key: value for key, value in record.items() if key.partition("@")[0] in kept}
+
+
+class PayloadStats:
+    """Response bytes per table and column profile, to show what the profiles save."""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._labels: Dict[tuple, str] = {
+            (table, ",".join(columns)): profile
+            for table, profiles in COLUMN_PROFILES.items() for profile, columns in profiles.items()
+        }
+
+    def record(self, table: str, select: Optional[str], nbytes: int, expand: Optional[str] = None):
+        """
+        Count a response. When it expands one related record with a $select, as the
+        get_opportunity_account-style tools do, it counts towards the related table instead.
+        """
+        match = EXPAND.match(expand or "")
+        if match and match.group(1) in NAVIGATION:
+            table, select = NAVIGATION[match.group(1)], match.group(2)
+        label = "full" if not select else self._labels.get((table, select), "custom")
+        entry = self._stats.setdefault(table, {}).setdefault(label, {"responses": 0, "bytes": 0})
+        entry["responses"] += 1
+        entry["bytes"] += nbytes
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        return {
+            table: {label: {**entry, "avg_bytes": entry["bytes"] // entry["responses"]}
+                    for label, entry in labels.items()}
+            for table, labels in self._stats.items()
+        }
@@ -0,0 +1,160 @@
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# responses smaller than this aren't worth compressing
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# streamable HTTP answers tool calls as server-sent events, so they are compressed too;
+# turn off for proxies or clients that buffer a compressed stream
+COMPRESS_EVENT_STREAMS = os.getenv("COMPRESS_EVENT_STREAMS", "1").lower() not in ("0", "false", "no")
+
+
+def accept_encoding() -> str:
+    """Accept-Encoding for upstream requests: brotli when httpx can decode it, gzip always."""
+    return "br, gzip" if brotli is not None else "gzip"
+
+
+class TransferStats:
+    """Bytes on the wire vs. decoded bytes, to show what compression saves."""
+
+    def __init__(self):
+        self.responses = 0
+        self.compressed = 0
+        self.wire_bytes = 0
+        self.raw_bytes = 0
+
+    def record(self, wire_bytes: int, raw_bytes: int, compressed: bool):
+        self.responses += 1
+        self.compressed += int(compressed)
+        self.wire_bytes += wire_bytes
+        self.raw_bytes += raw_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "responses": self.responses,
+            "compressed": self.compressed,
+            "wire_bytes": self.wire_bytes,
+            "raw_bytes": self.raw_bytes,
+            "ratio": round(self.wire_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+        }
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31 writes a gzip header and trailer
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush, so a streamed chunk reaches the client without waiting for the next."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+def _choose(accept: str) -> Optional[str]:
+    accepted = {item.split(";")[0].strip().lower() for item in accept.split(",")
+                if not item.strip().endswith("q=0")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with brotli or gzip, whichever the client accepts.
+    Whole responses under minimum_size are sent as they are. Streamed responses are compressed
+    chunk by chunk with a flush after each, so they keep streaming.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 stats: Optional[TransferStats] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.stats = stats if stats is not None else TransferStats()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = _choose(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+        raw = wire = 0
+
+        async def wrapped_send(message):
+            nonlocal start, encoder, passthrough, raw, wire
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start is not None:
+                response_headers = {k.lower(): v for k, v in start.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    b"content-encoding" in response_headers
+                    or (content_type.startswith("text/event-stream") and not COMPRESS_EVENT_STREAMS)
+                    or (not more and len(body) < self.minimum_size)
+                )
+                if passthrough:
+                    await send(start)
+                else:
+                    encoder = _Encoder(encoding)
+                    kept = [(k, v) for k, v in start.get("headers", [])
+                            if k.lower() not in (b"content-length", b"vary")]
+                    vary = response_headers.get(b"vary")
+                    kept += [(b"content-encoding", encoding.encode()),
+                             (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding")]
+                    if not more:
+                        compressed = encoder.finish(body)
+                        kept.append((b"content-length", str(len(compressed)).encode()))
+                        await send({**start, "headers": kept})
+                        await send({"type": "http.response.body", "body": compressed})
+                        self.stats.record(len(compressed), len(body), True)
+                        start = None
+                        return
+                    await send({**start, "headers": kept})
+                start = None
+
+            if passthrough:
+                await send(message)
+                raw += len(body)
+                if not more:
+                    self.stats.record(raw, raw, False)
+                return
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            raw += len(body)
+            wire += len(data)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+            if not more:
+                self.stats.record(wire, raw, True)
+
+        await self.app(scope, receive, wrapped_send)
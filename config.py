@@ -1,53 +1,550 @@
-from urllib.parse import urlparse
-from azure.identity import AzureDeveloperCliCredential, ManagedIdentityCredential, ChainedTokenCredential, DefaultAzureCredential
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple
+from urllib.parse import unquote_plus, urlparse
 # from azure.keyvault.secrets import SecretClient
 
-# managed identity
+import httpx
 
-import requests
+from auth import BearerAuth, TokenProvider, create_credential
+from batch import BatchPart, decode_batch, encode_batch
+from cache import FRESH, STALE, EtagStore, ResponseCache
+from codec import loads
+from coalesce import SingleFlight, normalize_query
+from columns import DEFAULT_PROFILE, ColumnProfile, PayloadStats, project, select_clause
+from compression import TransferStats, accept_encoding
+from metadata import MetadataService
+from metrics import DATAVERSE_BYTES, DATAVERSE_DURATION, DATAVERSE_REQUESTS, table_label
+from mirror import UnsupportedQuery, create_mirror, select_columns
+from odata import literal, plan_stats
+from paging import InvalidCursor, decode_cursor, encode_cursor, page_size
+from replica import ReplicaSync
+from resilience import CircuitBreaker, CircuitOpen, Hedger
+from slowlog import SlowQueryLog
+from throttle import Throttle
+from tracing import current_span, query_shape, span, traced
 
+logger = logging.getLogger(__name__)
 
-def create_dataverse_client(api_url: str):
-    parsed = urlparse(api_url)
-    root = f"{parsed.scheme}://{parsed.netloc}"
+# connection pool and timeout defaults, overridable through the environment
+DEFAULT_POOL_SIZE = int(os.getenv("DATAVERSE_POOL_SIZE", "20"))
+DEFAULT_TIMEOUT = float(os.getenv("DATAVERSE_TIMEOUT", "30"))
+# records per page requested through Prefer: odata.maxpagesize
+DEFAULT_PAGE_SIZE = int(os.getenv("DATAVERSE_PAGE_SIZE", "500"))
+# ask for formatted values (option set labels, lookup names) along with the raw ones
+FORMATTED_VALUES = os.getenv("DATAVERSE_FORMATTED_VALUES", "1").lower() not in ("0", "false", "no")
+ANNOTATIONS_PREFERENCE = 'odata.include-annotations="OData.Community.Display.V1.FormattedValue"'
 
-    cred = ChainedTokenCredential(DefaultAzureCredential(
-    ), AzureDeveloperCliCredential(), ManagedIdentityCredential())
 
-    token = cred.get_token(f"{root}/.default").token
+class DataverseError(Exception):
+    """An error response from Dataverse, e.g. for one request inside a $batch."""
 
-    headers = {"Authorization": f"Bearer {token}", "OData-MaxVersion": "4.0", "OData-Version": "4.0",
-               "Accept": "application/json", "Content-Type": "application/json; charset=utf-8"}
+    def __init__(self, status_code: int, message: str, code: Optional[str] = None):
+        super().__init__(f"{status_code} {code or ''} {message}".replace("  ", " "))
+        self.status_code = status_code
+        self.code = code
+        self.message = message
 
-    class DataverseClient:
-        def __init__(self, base_url: str, headers: dict[str, str]):
-            self.base_url = base_url.rstrip("/")
-            self.root_url = self.base_url.rsplit('/api', 1)[0]
-            self.headers = headers
+    @classmethod
+    def from_part(cls, part: BatchPart) -> "DataverseError":
+        error = (part.body or {}).get("error", {}) if isinstance(part.body, dict) else {}
+        return cls(part.status_code, error.get("message", "Batch request failed"), error.get("code"))
 
-        def query(self, table: str, odata_query: str = ""):
-            resp = requests.get(
-                f"{self.base_url}/{table}?{odata_query}", headers=self.headers)
-            resp.raise_for_status()
-            return resp.json().get("value", [])
 
-        def retrieve(self, table: str, record_id: str):
-            resp = requests.get(
-                f"{self.base_url}/{table}({record_id})", headers=self.headers)
-            resp.raise_for_status()
-            return resp.json()
+def _row_count(resp: httpx.Response) -> Optional[int]:
+    """Records in a response: the length of a collection, 1 for a single record, None otherwise."""
+    if "json" not in resp.headers.get("content-type", "") or not resp.content:
+        return None
+    try:
+        body = loads(resp.content)
+    except Exception:
+        return None
+    if isinstance(body, dict):
+        return len(body["value"]) if isinstance(body.get("value"), list) else 1
+    return None
 
-        def query_with_params(self, table: str, params: dict) -> list[dict]:
-            url = f"{self.base_url}/{table}"
-            resp = requests.get(url, headers=self.headers,
-                                params=params, timeout=10)
-            resp.raise_for_status()
-            return resp.json()
 
-        def post(self, endpoint: str, payload: dict) -> dict:
-            url = f"{self.root_url}/{endpoint.lstrip('/')}"
-            resp = requests.post(url, headers=self.headers, json=payload)
+class DataverseClient:
+    """
+    Async client for the Dataverse Web API.
+    All calls share one keep-alive connection pool (HTTP/2 when the host supports it),
+    so concurrent tool calls are multiplexed instead of opening a new connection each time.
+    """
+
+    def __init__(self, base_url: str, headers: dict[str, str], tokens: TokenProvider,
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT,
+                 cache: Optional[ResponseCache] = None):
+        self.base_url = base_url.rstrip("/")
+        self.root_url = self.base_url.rsplit('/api', 1)[0]
+        self.headers = headers
+        self.tokens = tokens
+        self.pool_size = pool_size
+        self.http = httpx.AsyncClient(
+            http2=True,
+            headers=headers,
+            auth=BearerAuth(tokens),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+        )
+        # identical reads in flight at the same time share one upstream request
+        self.single_flight = SingleFlight()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.etags = EtagStore()
+        self.payloads = PayloadStats()
+        self.transfer = TransferStats()
+        # adaptive concurrency per host, backing off on 429/503 service protection limits
+        self.throttle = Throttle()
+        # requests over SLOW_QUERY_MS, as JSON lines
+        self.slow_queries = SlowQueryLog()
+        # duplicate reads stuck in the latency tail; stop calling Dataverse while it is failing
+        self.hedger = Hedger()
+        self.breaker = CircuitBreaker()
+        self.metadata = MetadataService(self)
+        # local copy of reference tables, started by the server lifespan
+        self.replica = ReplicaSync(self)
+        # optional SQLite mirror; with DATAVERSE_READ_MODE=mirror, reads it can answer skip the API
+        self.mirror = create_mirror(self)
+        self.read_from_mirror = os.getenv("DATAVERSE_READ_MODE", "api").lower() == "mirror"
+        if self.mirror is not None:
+            # each table is synced into one store: the mirror if reads come from it, else the replica
+            owner, other = (self.mirror, self.replica) if self.read_from_mirror else (self.replica, self.mirror)
+            for table in owner.tables:
+                other.tables.pop(table, None)
+        self._background: set[asyncio.Task] = set()
+
+    @staticmethod
+    def _timeout(timeout: Optional[float]):
+        return httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+
+    async def _send(self, method: str, url: str, table: str, timeout: Optional[float] = None,
+                    **kwargs) -> httpx.Response:
+        """
+        Every Dataverse request goes through here, queued behind the host's adaptive concurrency
+        limit; throttled reads are retried and slow GETs hedged. Raises CircuitOpen while the
+        circuit breaker is open. table labels the request for diagnostics.
+        """
+        if FORMATTED_VALUES:
+            headers = dict(kwargs.pop("headers", None) or {})
+            prefer = headers.get("Prefer")
+            headers["Prefer"] = f"{prefer},{ANNOTATIONS_PREFERENCE}" if prefer else ANNOTATIONS_PREFERENCE
+            kwargs["headers"] = headers
+        # reads are safe to repeat; our $batch requests only ever carry GETs
+        idempotent = method == "GET" or url.endswith("/$batch")
+        probe = self.breaker.check()
+
+        async def request():
+            # one span per attempt, so retries and hedges show up as such
+            with span(f"HTTP {method}", kind="client") as attempt:
+                resp = await self.http.request(method, url, timeout=self._timeout(timeout), **kwargs)
+                attempt.set(status_code=resp.status_code,
+                            service_request_id=resp.headers.get("x-ms-service-request-id"))
+                return resp
+
+        label = table_label(table)
+        started = time.perf_counter()
+        with span(f"dataverse {method} {label}", table=label, method=method) as trace:
+            if trace.recording:
+                target = httpx.URL(url).copy_merge_params(kwargs.get("params") or {})
+                trace.set(query=query_shape(unquote_plus(target.query.decode())))
+            host = httpx.URL(url).host
+
+            def send():
+                return self.throttle.send(host, request, idempotent,
+                                          self.hedger.observe if method == "GET" else None)
+
+            try:
+                # a hedged GET sends its duplicate through the limiter too
+                resp = await (self.hedger.send(send, self.throttle.limiter(host).busy) if method == "GET"
+                              else send())
+            except httpx.TransportError as e:
+                self.breaker.record(False, probe)
+                DATAVERSE_REQUESTS.inc(label, method, "error")
+                self._log_if_slow(method, label, url, kwargs.get("params"), started, error=e)
+                raise
+            except BaseException:
+                # cancelled, or failed before reaching Dataverse (e.g. no token): no outcome,
+                # but a probe must not keep the breaker half open for good
+                self.breaker.release(probe)
+                raise
+            finally:
+                DATAVERSE_DURATION.observe(time.perf_counter() - started, label, method)
+            self.breaker.record(resp.status_code < 500, probe)
+            self._log_if_slow(method, label, url, kwargs.get("params"), started, resp=resp)
+            trace.set(status_code=resp.status_code, bytes=len(resp.content),
+                      service_request_id=resp.headers.get("x-ms-service-request-id"))
+        self.transfer.record(resp.num_bytes_downloaded, len(resp.content), "content-encoding" in resp.headers)
+        DATAVERSE_REQUESTS.inc(label, method, str(resp.status_code))
+        DATAVERSE_BYTES.inc(label, "wire", amount=resp.num_bytes_downloaded)
+        DATAVERSE_BYTES.inc(label, "decoded", amount=len(resp.content))
+        params = resp.request.url.params
+        if method == "GET" and resp.status_code == 200 and "$apply" not in params and "fetchXml" not in params:
+            self.payloads.record(table, params.get("$select"), len(resp.content), params.get("$expand"))
+        return resp
+
+    def _log_if_slow(self, method: str, table: str, url: str, params: Optional[dict], started: float,
+                     resp: Optional[httpx.Response] = None, error: Optional[Exception] = None):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not self.slow_queries.slow(elapsed_ms):
+            return
+        # split into options before decoding, string literals may hold an encoded &
+        query = unquote_plus(normalize_query(httpx.URL(url).copy_merge_params(params or {}).query.decode()))
+        entry = {
+            "table": table,
+            "method": method,
+            "query": query,
+            "shape": query_shape(query),
+            "elapsed_ms": round(elapsed_ms, 1),
+            "status": resp.status_code if resp is not None else "error",
+            "rows": _row_count(resp) if resp is not None else None,
+            "bytes": len(resp.content) if resp is not None else None,
+            "wire_bytes": resp.num_bytes_downloaded if resp is not None else None,
+            "service_request_id": resp.headers.get("x-ms-service-request-id") if resp is not None else None,
+            "trace_id": getattr(current_span(), "trace_id", None),
+        }
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        self.slow_queries.record(entry)
+
+    async def get_json(self, url: str, table: str, headers: Optional[dict] = None,
+                       timeout: Optional[float] = None) -> dict:
+        """GET an absolute Web API url, such as a next or delta link, and return the decoded body."""
+        if not url.startswith(self.base_url + "/"):
+            raise ValueError(f"Refusing to follow a link outside {self.base_url}: {url}")
+        resp = await self._send("GET", url, table, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        return loads(resp.content)
+
+    @traced("dataverse.query")
+    async def query(self, table: str, odata_query: str = "", max_records: Optional[int] = None,
+                    timeout: Optional[float] = None):
+        """
+        Return every matching record, following @odata.nextLink, up to max_records.
+        Results may come from the response cache or be shared with concurrent identical
+        queries, so the returned list must not be mutated.
+        """
+        if self._mirror_serves(table):
+            try:
+                return await asyncio.to_thread(self.mirror.store.query, table, odata_query, max_records)
+            except UnsupportedQuery as e:
+                logger.debug("Mirror can't answer %s query, using the API: %s", table, e)
+        key = ("query", table, normalize_query(odata_query), max_records)
+        return await self._read(table, key, lambda: self._query(table, odata_query, max_records, timeout))
+
+    async def _query(self, table: str, odata_query: str, max_records: Optional[int],
+                     timeout: Optional[float]):
+        records, size = [], 0
+        async for page, nbytes in self._pages(table, odata_query, None, max_records, timeout):
+            records.extend(page)
+            size += nbytes
+        return records, size
+
+    async def query_pages(self, table: str, odata_query: str = "", page_size: Optional[int] = None,
+                          max_records: Optional[int] = None,
+                          timeout: Optional[float] = None) -> AsyncIterator[list[dict]]:
+        """
+        Yield the results one server page at a time, following @odata.nextLink.
+        Stops after max_records records, or as soon as the caller stops iterating.
+        """
+        async for page, _ in self._pages(table, odata_query, page_size, max_records, timeout):
+            yield page
+
+    async def _pages(self, table: str, odata_query: str, page_size: Optional[int],
+                     max_records: Optional[int], timeout: Optional[float]):
+        url = f"{self.base_url}/{table}?{odata_query}"
+        headers = {}
+        # $top already bounds the result, and Dataverse doesn't page it
+        if "$top=" not in odata_query:
+            size = page_size or DEFAULT_PAGE_SIZE
+            if max_records is not None:
+                # no point paying for a page of records that will be cut off
+                size = max(1, min(size, max_records))
+            headers["Prefer"] = f"odata.maxpagesize={size}"
+
+        remaining = max_records
+        while url:
+            resp = await self._send("GET", url, table, headers=headers, timeout=timeout)
             resp.raise_for_status()
-            return resp.json()
+            body = loads(resp.content)
+            page = body.get("value", [])
+            if remaining is not None:
+                page = page[:remaining]
+                remaining -= len(page)
+            if page:
+                yield page, len(resp.content)
+            if remaining == 0:
+                return
+            url = body.get("@odata.nextLink")
+
+    async def stream(self, table: str, odata_query: str = "", page_size: Optional[int] = None,
+                     max_records: Optional[int] = None,
+                     timeout: Optional[float] = None) -> AsyncIterator[dict]:
+        """Yield records one at a time, only holding one page in memory."""
+        async for page in self.query_pages(table, odata_query, page_size, max_records, timeout):
+            for record in page:
+                yield record
+
+    @traced("dataverse.query_page")
+    async def query_page(self, table: str, odata_query: str = "", top: int = DEFAULT_PAGE_SIZE,
+                         cursor: Optional[str] = None,
+                         timeout: Optional[float] = None) -> Tuple[list[dict], Optional[str]]:
+        """
+        One page of up to top records and an opaque cursor for the next page (None on the last).
+        odata_query must not contain $top, which turns off server paging. With a cursor the query
+        is resumed from it and odata_query is ignored. Cursors wrap @odata.nextLink, or an offset
+        when the page came from the mirror.
+        """
+        state = decode_cursor(cursor, table) if cursor else None
+        if state is not None:
+            top = int(state["n"])
+        size = page_size(top)
+
+        if state is None or state["k"] == "offset":
+            query, offset = (state["q"], int(state["o"])) if state else (odata_query, 0)
+            if state is not None and state.get("s") != "mirror":
+                raise InvalidCursor("This cursor can't be resumed any more, list again without one")
+            if self._mirror_serves(table):
+                try:
+                    # one extra row tells whether there is a next page
+                    rows = await asyncio.to_thread(self.mirror.store.query, table, query, size + 1, offset)
+                    next_cursor = None
+                    if len(rows) > size:
+                        next_cursor = encode_cursor({"k": "offset", "t": table, "s": "mirror", "q": query,
+                                                     "o": offset + size, "n": size})
+                    return rows[:size], next_cursor
+                except UnsupportedQuery as e:
+                    if state is not None:
+                        raise
+                    logger.debug("Mirror can't answer %s query, using the API: %s", table, e)
+            elif state is not None:
+                raise InvalidCursor("This cursor can't be resumed any more, list again without one")
+            url = f"{self.base_url}/{table}?{odata_query}" if odata_query else f"{self.base_url}/{table}"
+        else:
+            url = state["u"]
+            if not url.startswith(f"{self.base_url}/{table}"):
+                raise InvalidCursor(f"This cursor doesn't belong to {table}")
+
+        key = ("page", table, url, size)
+        records, next_link = await self._read(table, key, lambda: self._query_page(table, url, size, timeout))
+        next_cursor = None
+        if next_link:
+            next_cursor = encode_cursor({"k": "link", "t": table, "u": next_link, "n": size})
+        return records, next_cursor
+
+    async def _query_page(self, table: str, url: str, size: int, timeout: Optional[float]):
+        # the next link is only honored with the same page size it was issued for
+        resp = await self._send("GET", url, table, headers={"Prefer": f"odata.maxpagesize={size}"},
+                                timeout=timeout)
+        resp.raise_for_status()
+        body = loads(resp.content)
+        return (body.get("value", []), body.get("@odata.nextLink")), len(resp.content)
+
+    @traced("dataverse.retrieve")
+    async def retrieve(self, table: str, record_id: str, odata_query: str = "",
+                       timeout: Optional[float] = None):
+        """Retrieve one record, through the response cache and request coalescing."""
+        normalized = normalize_query(odata_query)
+        # the mirror holds whole rows, so it can answer a plain retrieve or one that only picks columns
+        if (not normalized or (normalized.startswith("$select=") and "&" not in normalized)) \
+                and self._mirror_serves(table):
+            record = await asyncio.to_thread(self.mirror.store.get, table, record_id)
+            if record is not None:
+                if not normalized:
+                    return record
+                return select_columns(record, normalized[len("$select="):].split(","))
+        key = ("retrieve", table, record_id.lower(), normalized)
+        return await self._read(table, key, lambda: self._retrieve(table, record_id, odata_query, timeout))
+
+    async def _retrieve(self, table: str, record_id: str, odata_query: str,
+                        timeout: Optional[float]):
+        url = f"{self.base_url}/{table}({record_id})"
+        if odata_query:
+            url = f"{url}?{odata_query}"
+
+        # expanded related records can change without the parent's etag changing
+        conditional = "$expand" not in odata_query
+        key = (table, record_id.lower(), normalize_query(odata_query))
+        stored = self.etags.get(key) if conditional else None
+        headers = {"If-None-Match": stored[0]} if stored else {}
+
+        resp = await self._send("GET", url, table, headers=headers, timeout=timeout)
+        if stored and resp.status_code == 304:
+            self.etags.not_modified += 1
+            return stored[1], stored[2]
+        resp.raise_for_status()
+        record = loads(resp.content)
+        etag = record.get("@odata.etag") if conditional else None
+        if etag:
+            if stored:
+                self.etags.modified += 1
+            self.etags.set(key, etag, record, len(resp.content))
+        return record, len(resp.content)
+
+    async def lookup(self, table: str, record_id: str, profile: ColumnProfile = DEFAULT_PROFILE) -> dict:
+        """
+        Retrieve one record with a column profile, answering from the local replica when the table is replicated.
+        Both paths check the GUID and return the same columns.
+        """
+        record_id = literal(record_id, "guid")
+        record = self.replica.get(table, record_id)
+        if record is None:
+            record = await self.retrieve(table, record_id, select_clause(table, profile))
+        return project(table, record, profile)
+
+    @traced("dataverse.query_with_params")
+    async def query_with_params(self, table: str, params: dict, timeout: Optional[float] = 10) -> list[dict]:
+        key = ("query_with_params", table, tuple(sorted((str(k), str(v)) for k, v in params.items())))
+        return await self._read(table, key, lambda: self._query_with_params(table, params, timeout))
+
+    async def _query_with_params(self, table: str, params: dict, timeout: Optional[float]):
+        url = f"{self.base_url}/{table}"
+        resp = await self._send("GET", url, table, params=params, timeout=timeout)
+        resp.raise_for_status()
+        return loads(resp.content), len(resp.content)
+
+    def _mirror_serves(self, table: str) -> bool:
+        return self.read_from_mirror and self.mirror is not None and self.mirror.ready(table)
+
+    async def _read(self, table: str, key: tuple, fetch: Callable[[], Awaitable[Tuple[Any, int]]]):
+        """
+        Serve a read from the response cache when possible. Stale entries are returned at once
+        and refreshed in the background; misses go upstream through request coalescing.
+        fetch returns (value, response size in bytes). While Dataverse is failing (circuit
+        open, 5xx, connection errors) the last known value is served if there is one.
+        """
+        try:
+            return await self._read_through(table, key, fetch)
+        except (CircuitOpen, httpx.TransportError, httpx.HTTPStatusError) as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                raise
+            value = self._last_known(key)
+            if value is None:
+                raise
+            current_span().set(last_known=True)
+            logger.warning("Serving last known %s data: %s", table, e)
+            return value
+
+    async def _read_through(self, table: str, key: tuple, fetch: Callable[[], Awaitable[Tuple[Any, int]]]):
+        if self.cache.caches(table):
+            value, state = self.cache.get(key)
+            current_span().set(cache=state or "miss")
+            if state == FRESH:
+                return value
+            if state == STALE:
+                task = asyncio.create_task(self.single_flight.do(key, lambda: self._fill(table, key, fetch)))
+                self._background.add(task)
+                task.add_done_callback(self._background_done)
+                return value
+        return await self.single_flight.do(key, lambda: self._fill(table, key, fetch))
+
+    def _last_known(self, key: tuple) -> Optional[Any]:
+        value = self.cache.last_known(key)
+        if value is None and key[0] == "retrieve":
+            # retrieves of every table keep their last copy for etag revalidation
+            stored = self.etags.get(key[1:])
+            value = stored[1] if stored else None
+        return value
+
+    async def _fill(self, table: str, key: tuple, fetch: Callable[[], Awaitable[Tuple[Any, int]]]):
+        value, size = await fetch()
+        self.cache.set(table, key, value, size)
+        return value
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning("Background cache refresh failed: %s", task.exception())
+
+    async def post(self, endpoint: str, payload: dict, timeout: Optional[float] = None) -> dict:
+        url = f"{self.root_url}/{endpoint.lstrip('/')}"
+        resp = await self._send("POST", url, endpoint, json=payload, timeout=timeout)
+        resp.raise_for_status()
+        return loads(resp.content)
+
+    async def batch(self, requests: Sequence[Tuple[str, str]], return_exceptions: bool = False,
+                    timeout: Optional[float] = None) -> list[Any]:
+        """
+        Run several reads in one $batch round trip.
+        requests are (table, odata_query) pairs, e.g. ("opportunities", "$apply=...") or ("accounts(<id>)", "").
+        Results come back in order: the "value" list for collections, the record otherwise.
+        A failed part raises DataverseError, or is returned in its slot when return_exceptions is set.
+        Batched queries are not paged, so keep them bounded ($top, $apply, single records).
+        """
+        urls = [f"{self.base_url}/{table}?{odata_query}" if odata_query else f"{self.base_url}/{table}"
+                for table, odata_query in requests]
+        content_type, body = encode_batch(urls)
+        with span("dataverse.batch", parts=len(urls),
+                  tables=",".join(sorted({table_label(table) for table, _ in requests}))):
+            resp = await self._send("POST", f"{self.base_url}/$batch", "$batch", content=body,
+                                    headers={"Content-Type": content_type}, timeout=timeout)
+        resp.raise_for_status()
+
+        results = []
+        for part in decode_batch(resp.headers["content-type"], resp.text):
+            if not part.ok:
+                error = DataverseError.from_part(part)
+                if not return_exceptions:
+                    raise error
+                results.append(error)
+            elif isinstance(part.body, dict) and "value" in part.body:
+                results.append(part.body["value"])
+            else:
+                results.append(part.body)
+        return results
+
+    async def start(self):
+        """Acquire the first token and begin refreshing it in the background."""
+        await self.tokens.start()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "etags": self.etags.stats(),
+            "payloads": self.payloads.stats(),
+            "transfer": self.transfer.stats(),
+            "throttle": self.throttle.stats(),
+            "hedging": self.hedger.stats(),
+            "breaker": self.breaker.stats(),
+            "slow_queries": self.slow_queries.stats(),
+            "metadata": self.metadata.stats(),
+            "query_plans": plan_stats(),
+            "replica": {table: self.replica.store.count(table)
+                        for table in self.replica.tables if self.replica.ready(table)},
+            "mirror": None if self.mirror is None else {
+                "read_from_mirror": self.read_from_mirror,
+                "tables": {table: self.mirror.store.count(table)
+                           for table in self.mirror.tables if self.mirror.ready(table)},
+            },
+            "single_flight": {"started": self.single_flight.started,
+                              "coalesced": self.single_flight.coalesced,
+                              "in_flight": self.single_flight.in_flight},
+        }
+
+    async def aclose(self):
+        """Stop the token refresher and close the pooled connections."""
+        await self.tokens.stop()
+        await self.replica.stop()
+        if self.mirror is not None:
+            await self.mirror.stop()
+            self.mirror.store.close()
+        for task in list(self._background):
+            task.cancel()
+        await self.slow_queries.flush()
+        await self.http.aclose()
+
+
+def create_dataverse_client(api_url: str, pool_size: Optional[int] = None, timeout: Optional[float] = None):
+    parsed = urlparse(api_url)
+    root = f"{parsed.scheme}://{parsed.netloc}"
+
+    tokens = TokenProvider(create_credential(), f"{root}/.default")
+
+    headers = {"OData-MaxVersion": "4.0", "OData-Version": "4.0",
+               "Accept": "application/json", "Accept-Encoding": accept_encoding(),
+               "Content-Type": "application/json; charset=utf-8"}
 
-    return DataverseClient(api_url, headers)
+    return DataverseClient(api_url, headers, tokens,
+                           pool_size=pool_size or DEFAULT_POOL_SIZE,
+                           timeout=timeout or DEFAULT_TIMEOUT)
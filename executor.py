@@ -0,0 +1,139 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastmcp.server.dependencies import get_http_headers
+from fastmcp.tools.tool import ParsedFunction, ToolResult
+from mcp.types import TextContent
+
+from metrics import TOOL_CALLS, TOOL_DURATION, plugin_label
+from slim import ResultShaper
+from tracing import TRACER, span
+
+# number of worker threads available to synchronous tools
+DEFAULT_TOOL_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "8"))
+
+
+def tool_result(value: Any, text: str, output_schema: Optional[Dict[str, Any]]) -> ToolResult:
+    """
+    The ToolResult FastMCP would build for value, reusing its already encoded text.
+    Structured content follows the tool's output schema the way FastMCP does it.
+    """
+    if output_schema is not None:
+        structured = {"result": value} if output_schema.get("x-fastmcp-wrap-result") else value
+    else:
+        structured = value if isinstance(value, dict) else None
+    content = [] if value is None else [TextContent(type="text", text=text)]
+    return ToolResult(content=content, structured_content=structured)
+
+
+class ToolExecutor:
+    """
+    Execution layer for the mounted plugin servers.
+    Coroutine tools are awaited directly on the event loop. Synchronous tools are sent to a
+    bounded thread pool, so blocking work in one tool can't stall every other MCP session.
+    Every result is slimmed and held to the tool's byte budget by the ResultShaper.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, shaper: Optional[ResultShaper] = None):
+        self.max_workers = max_workers or DEFAULT_TOOL_WORKERS
+        self.shaper = shaper if shaper is not None else ResultShaper()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+
+    def wrap(self, fn: Callable[..., Any], slim: bool = True) -> Callable[..., Any]:
+        """
+        Return a tool callable that never blocks the event loop, shapes its result and is timed.
+        slim=False keeps nulls and every key, for results that aren't Dataverse records.
+        """
+        name = fn.__name__
+        plugin = plugin_label(fn)
+        output_schema = ParsedFunction.from_function(fn, validate=False).output_schema
+        call = fn if inspect.iscoroutinefunction(fn) else functools.partial(self.submit, fn)
+
+        @functools.wraps(fn)
+        async def run(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            # each tool call is the root of a trace, or continues the MCP client's
+            traceparent = get_http_headers().get("traceparent") if TRACER.enabled else None
+            with span(f"tool {plugin}.{name}", traceparent=traceparent, plugin=plugin, tool=name):
+                try:
+                    value, text = self.shaper.shape(name, await call(*args, **kwargs), slim)
+                    outcome = "ok"
+                    # handed to FastMCP ready-made, so it doesn't encode the result a second time
+                    return tool_result(value, text, output_schema)
+                finally:
+                    TOOL_CALLS.inc(plugin, name, outcome)
+                    TOOL_DURATION.observe(time.perf_counter() - started, plugin, name)
+
+        return run
+
+    async def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a synchronous callable on the pool and await its result."""
+        enqueued = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def call():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait_seconds += time.perf_counter() - enqueued
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        loop = asyncio.get_running_loop()
+        # the worker thread runs in the caller's context, so spans started there join its trace
+        context = contextvars.copy_context()
+        try:
+            result = await loop.run_in_executor(self._get_pool(), context.run, call)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="tool")
+        return self._pool
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of sync tool calls waiting for a free worker."""
+        return self.queued
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "total_wait_seconds": round(self.total_wait_seconds, 6),
+                "results": self.shaper.stats(),
+            }
+
+    def shutdown(self, wait: bool = False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
@@ -1,7 +1,9 @@
+import hmac
 import os
 import sys
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
 
 from contextlib import asynccontextmanager
@@ -11,7 +13,14 @@ from dotenv import load_dotenv
 
 from fastmcp import FastMCP
 
+from codec import CODEC_NAME, dumps
+from compression import CompressionMiddleware, TransferStats
 from config import create_dataverse_client
+from executor import ToolExecutor
+from metrics import REGISTRY
+from profiler import Profiler, ProfilerBusy
+from slowlog import SLOW_QUERY_KEEP
+from tracing import TRACER
 
 from servers.accounts import create_accounts_plugin_server
 from servers.competitors import create_competitors_plugin_server
@@ -25,6 +34,55 @@ from servers.users import create_users_plugin_server
 
 load_dotenv()
 
+# shared execution layer for every mounted plugin's tools
+tool_executor = ToolExecutor()
+# bytes saved by compressing HTTP responses to MCP clients
+http_transfer = TransferStats()
+# Dataverse client of the running server, set by the lifespan
+dv_client = None
+# on-demand profiling through /admin/profile
+profiler = Profiler()
+# bearer token for the /admin routes; they are off when it isn't set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def register_gauges():
+    """Gauges read on each /metrics scrape; the Dataverse ones are empty until the client is up."""
+    def client(read):
+        return lambda: read(dv_client) if dv_client else None
+
+    def per_host(field):
+        return client(lambda dv: {(host,): stats[field] for host, stats in dv.throttle.stats().items()})
+
+    REGISTRY.gauge("mcp_tool_queue_depth", "Sync tool calls waiting for a worker thread.",
+                   lambda: tool_executor.queue_depth)
+    REGISTRY.gauge("mcp_tool_running", "Sync tool calls running on a worker thread.", lambda: tool_executor.running)
+    REGISTRY.gauge("dataverse_pool_size", "Connections in the Dataverse connection pool.",
+                   client(lambda dv: dv.pool_size))
+    REGISTRY.gauge("dataverse_concurrency_limit", "Adaptive concurrency limit per host.",
+                   per_host("limit"), ("host",))
+    REGISTRY.gauge("dataverse_requests_in_flight", "Dataverse requests holding a concurrency slot.",
+                   per_host("in_flight"), ("host",))
+    REGISTRY.gauge("dataverse_requests_queued", "Dataverse requests waiting for a concurrency slot.",
+                   per_host("queued"), ("host",))
+    REGISTRY.gauge("dataverse_coalesced_in_flight", "Distinct reads in flight after request coalescing.",
+                   client(lambda dv: dv.single_flight.in_flight))
+    REGISTRY.gauge("dataverse_cache_entries", "Entries in the response cache.",
+                   client(lambda dv: dv.cache.stats()["entries"]))
+    REGISTRY.gauge("dataverse_cache_bytes", "Bytes held by the response cache.", client(lambda dv: dv.cache.bytes))
+    REGISTRY.gauge("dataverse_cache_hit_ratio", "Fresh and stale cache hits over all cache lookups.",
+                   client(lambda dv: _hit_ratio(dv.cache.stats())))
+    REGISTRY.gauge("dataverse_breaker_open", "1 while the circuit breaker is failing requests fast.",
+                   client(lambda dv: int(dv.breaker.state != "closed")))
+
+
+def _hit_ratio(stats: dict):
+    lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+    return (stats["hits"] + stats["stale_hits"]) / lookups if lookups else None
+
+
+register_gauges()
+
 
 @dataclass
 class AppState:
@@ -39,28 +97,42 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[AppState]:
     Manages the server's startup and shutdown lifecycle.
     Initializes the Dataverse client and mounts all plugins.
     """
+    global dv_client
     # print("initializing Dataverse client")
     dv_client = create_dataverse_client(os.getenv("DATAVERSE_URL"))
+    await dv_client.start()
+    # keeps reference tables replicated locally in the background
+    await dv_client.replica.start()
+    if dv_client.mirror is not None:
+        await dv_client.mirror.start()
+    # exports finished spans in the background when TRACE_EXPORT is set
+    await TRACER.start()
 
     # print("mounting plugins")
-    server.mount(create_accounts_plugin_server(dv_client), prefix="Accounts")
-    server.mount(create_competitors_plugin_server(dv_client), prefix="Competitors")
-    server.mount(create_invoices_plugin_server(dv_client), prefix="Invoices")
-    server.mount(create_leads_plugin_server(dv_client), prefix="Leads")
-    server.mount(create_opportunities_plugin_server(dv_client), prefix="Opportunities")
-    server.mount(create_orders_plugin_server(dv_client), prefix="Orders")
-    server.mount(create_products_plugin_server(dv_client), prefix="Products")
-    server.mount(create_quotes_plugin_server(dv_client), prefix="Quotes")
-    server.mount(create_users_plugin_server(dv_client), prefix="Users")
+    server.mount(create_accounts_plugin_server(dv_client, tool_executor), prefix="Accounts")
+    server.mount(create_competitors_plugin_server(dv_client, tool_executor), prefix="Competitors")
+    server.mount(create_invoices_plugin_server(dv_client, tool_executor), prefix="Invoices")
+    server.mount(create_leads_plugin_server(dv_client, tool_executor), prefix="Leads")
+    server.mount(create_opportunities_plugin_server(dv_client, tool_executor), prefix="Opportunities")
+    server.mount(create_orders_plugin_server(dv_client, tool_executor), prefix="Orders")
+    server.mount(create_products_plugin_server(dv_client, tool_executor), prefix="Products")
+    server.mount(create_quotes_plugin_server(dv_client, tool_executor), prefix="Quotes")
+    server.mount(create_users_plugin_server(dv_client, tool_executor), prefix="Users")
     # print("plugins mounted")
 
-    yield AppState(dv_client=dv_client)
-    # print("server shutting down")
+    try:
+        yield AppState(dv_client=dv_client)
+    finally:
+        # print("server shutting down")
+        await dv_client.aclose()
+        await TRACER.stop()
+        tool_executor.shutdown()
 
 
 mcp = FastMCP(
     name="DataverseMCP",
     lifespan=app_lifespan,
+    tool_serializer=dumps,
 )
 
 
@@ -70,25 +142,99 @@ def get_server_status() -> str:
     return "OK"
 
 
-if __name__ == "__main__":
-    # print("Starting FastMCP server on http://0.0.0.0:8000")
-    if "--stdio" in sys.argv:
-        mcp.run()
-    else:
-        mcp.run(transport="http")
-
-
 @mcp.custom_route("/", methods=["GET"])
 async def root(request: Request) -> JSONResponse:
     return JSONResponse({"message": "Server is running"})
 
+
+@mcp.custom_route("/status", methods=["GET"])
+async def status(request: Request) -> JSONResponse:
+    """Reports the tool executor's queue depth and the Dataverse client's cache counters."""
+    return JSONResponse({
+        "status": "OK",
+        "executor": tool_executor.stats(),
+        "dataverse": dv_client.stats() if dv_client else None,
+        "http_compression": http_transfer.stats(),
+        "json_codec": CODEC_NAME,
+        "tracing": TRACER.stats(),
+    })
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    """Per-tool and per-table counters and latency histograms, in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def admin_denied(request: Request):
+    """None if the request carries the admin token, else the response to send back."""
+    if not ADMIN_TOKEN:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+    return None
+
+
+@mcp.custom_route("/admin/slow-queries", methods=["GET"])
+async def slow_queries(request: Request) -> JSONResponse:
+    """The latest Dataverse calls over SLOW_QUERY_MS, newest first."""
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        limit = int(request.query_params.get("limit", "50"))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return JSONResponse({"error": "limit must be a positive integer"}, status_code=400)
+    # no more than the log keeps in memory
+    limit = min(limit, SLOW_QUERY_KEEP)
+    return JSONResponse({"slow_queries": dv_client.slow_queries.entries(limit) if dv_client else []})
+
+
+@mcp.custom_route("/admin/profile", methods=["GET", "POST", "DELETE"])
+async def profile(request: Request):
+    """
+    POST ?seconds=30&modes=sample,cpu,memory starts a profiling window, GET reports it (and
+    ?format=collapsed returns the sampled stacks for a flame graph), DELETE stops it early.
+    """
+    denied = admin_denied(request)
+    if denied is not None:
+        return denied
+    if request.method == "POST":
+        modes = [mode.strip() for mode in request.query_params.get("modes", "sample").split(",") if mode.strip()]
+        try:
+            profiler.start(float(request.query_params.get("seconds", "30")), modes)
+        except ProfilerBusy as e:
+            return JSONResponse({"error": str(e)}, status_code=409)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return JSONResponse(profiler.status(), status_code=202)
+    if request.method == "DELETE" and profiler.running:
+        profiler.stop()
+    if request.query_params.get("format") == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return JSONResponse(profiler.status())
+
+# outermost first: responses are compressed after CORS has added its headers
+HTTP_MIDDLEWARE = [
+    Middleware(CompressionMiddleware, stats=http_transfer),
+    Middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    ),
+]
+
 # maybe fastapi instead
-app = mcp.http_app()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
\ No newline at end of file
+app = mcp.http_app(middleware=HTTP_MIDDLEWARE)
+
+
+if __name__ == "__main__":
+    # print("Starting FastMCP server on http://0.0.0.0:8000")
+    if "--stdio" in sys.argv:
+        mcp.run()
+    else:
+        # the same routes and middleware as app, which uvicorn fastmcp_server:app serves
+        mcp.run(transport="http", middleware=HTTP_MIDDLEWARE)
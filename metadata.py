@@ -0,0 +1,235 @@
+import asyncio
+import difflib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from token_cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# entity set name (what the Web API URLs use) -> logical name (what EntityDefinitions uses)
+ENTITY_LOGICAL_NAMES = {
+    "accounts": "account",
+    "opportunities": "opportunity",
+    "leads": "lead",
+    "salesorders": "salesorder",
+    "quotes": "quote",
+    "invoices": "invoice",
+    "products": "product",
+    "systemusers": "systemuser",
+    "businessunits": "businessunit",
+    "teams": "team",
+    "competitors": "competitor",
+    "contacts": "contact",
+}
+# attribute types whose Web API column is _<name>_value
+LOOKUP_TYPES = {"Lookup", "Customer", "Owner"}
+# attribute metadata types that carry an option set
+OPTION_SET_TYPES = ["PicklistAttributeMetadata", "StateAttributeMetadata", "StatusAttributeMetadata"]
+
+METADATA_CACHE_DIR = Path(os.getenv("METADATA_CACHE_DIR", DEFAULT_CACHE_DIR))
+# how long table metadata read from disk is trusted before it is fetched again
+METADATA_TTL_SECONDS = float(os.getenv("METADATA_TTL_SECONDS", str(24 * 3600)))
+# after a failed fetch, a table (or the version check) isn't tried again for this long
+METADATA_RETRY_SECONDS = float(os.getenv("METADATA_RETRY_SECONDS", "60"))
+
+
+class UnknownColumn(ValueError):
+    """A query names a column the table doesn't have."""
+
+
+class MetadataUnavailable(RuntimeError):
+    """A table's metadata failed to load recently and isn't retried yet."""
+
+
+def _label(option: Dict[str, Any]) -> Optional[str]:
+    label = option.get("Label") or {}
+    return (label.get("UserLocalizedLabel") or {}).get("Label")
+
+
+class MetadataService:
+    """
+    Columns, types and option sets of Dataverse tables, read from EntityDefinitions.
+    A table's metadata is fetched once with a single $batch and kept in memory and in a file
+    shared by every server process. The file is dropped when the organization's version
+    changes (RetrieveVersion) and each table is refetched after METADATA_TTL_SECONDS.
+    A failed fetch isn't repeated for METADATA_RETRY_SECONDS, so an outage doesn't add a
+    failing round trip to every call.
+    """
+
+    def __init__(self, dv_client: Any, cache_dir: Optional[Path] = None, ttl: float = METADATA_TTL_SECONDS):
+        self.dv = dv_client
+        org = hashlib.sha1(dv_client.root_url.encode()).hexdigest()[:12]
+        self.path = Path(cache_dir or METADATA_CACHE_DIR) / f"metadata-{org}.json"
+        self.ttl = ttl
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        # tables read from disk that haven't been confirmed against Dataverse in this process
+        self._from_disk: set = set()
+        self._version: Optional[str] = None
+        self._disk_loaded = False
+        self._disk_retry_at = 0.0
+        # table -> when a failed fetch may be tried again (time.monotonic)
+        self._retry_at: Dict[str, float] = {}
+        self.fetches = 0
+        self.disk_hits = 0
+
+    async def columns(self, table: str) -> List[str]:
+        """Every readable column of a table, as the Web API names them."""
+        return sorted((await self.table(table))["columns"])
+
+    async def column_types(self, table: str) -> Dict[str, str]:
+        return dict((await self.table(table))["columns"])
+
+    async def options(self, table: str, column: str) -> Dict[int, str]:
+        """Value -> label of an option set column, empty for other columns."""
+        options = (await self.table(table))["options"].get(column, {})
+        return {int(value): label for value, label in options.items()}
+
+    async def validate(self, table: str, columns: Iterable[str]):
+        """
+        Raise UnknownColumn if any column isn't on the table, before a query costs a round trip.
+        Metadata that can't be loaded doesn't block the query; Dataverse will still reject bad columns.
+        """
+        columns = [column for column in columns if column]
+        if not columns:
+            return
+        try:
+            unknown = self._unknown(await self.table(table), columns)
+            if unknown and table in self._from_disk:
+                # the cached copy may predate a new column
+                unknown = self._unknown(await self.table(table, refresh=True), columns)
+        except Exception:
+            logger.warning("Metadata for %s unavailable, not validating columns", table, exc_info=True)
+            return
+        if unknown:
+            known = self._tables[table]["columns"]
+            hints = []
+            for column in unknown:
+                close = difflib.get_close_matches(column, known, n=3)
+                hints.append(f"'{column}'" + (f" (did you mean {', '.join(close)}?)" if close else ""))
+            raise UnknownColumn(f"Unknown column for {table}: {'; '.join(hints)}")
+
+    @staticmethod
+    def _unknown(metadata: Dict[str, Any], columns: List[str]) -> List[str]:
+        return [column for column in columns if column not in metadata["columns"]]
+
+    async def table(self, table: str, refresh: bool = False) -> Dict[str, Any]:
+        """A table's metadata: {"columns": {name: type}, "options": {name: {value: label}}}."""
+        if not self._disk_loaded and time.monotonic() >= self._disk_retry_at:
+            await self.dv.single_flight.do(("metadata-disk",), self._load_disk)
+        entry = self._tables.get(table)
+        if entry is not None and not refresh and time.time() - entry["fetched_at"] < self.ttl:
+            if table in self._from_disk:
+                self.disk_hits += 1
+            return entry
+        if time.monotonic() < self._retry_at.get(table, 0.0):
+            if entry is not None:
+                return entry
+            raise MetadataUnavailable(f"Metadata for {table} failed to load, retrying later")
+        return await self.dv.single_flight.do(("metadata", table), lambda: self._fetch(table))
+
+    async def _load_disk(self):
+        try:
+            version = (await self.dv.get_json(f"{self.dv.base_url}/RetrieveVersion()", "metadata")).get("Version")
+        except Exception:
+            logger.warning("RetrieveVersion failed, relying on the metadata TTL until it is retried", exc_info=True)
+            version = None
+            self._disk_retry_at = time.monotonic() + METADATA_RETRY_SECONDS
+        cached = await asyncio.to_thread(self._read_file) or {}
+        if version is not None:
+            if self._from_disk and cached.get("version") != version:
+                # read before the version could be checked, and it turns out to be stale
+                for table in self._from_disk:
+                    self._tables.pop(table, None)
+                self._from_disk.clear()
+            self._version = version
+            self._disk_loaded = True
+        if cached and (version is None or cached.get("version") == version):
+            for table, entry in cached.get("tables", {}).items():
+                if table not in self._tables:
+                    self._tables[table] = entry
+                    self._from_disk.add(table)
+
+    async def _fetch(self, table: str) -> Dict[str, Any]:
+        try:
+            logical = ENTITY_LOGICAL_NAMES.get(table) or await self._logical_name(table)
+            attributes = f"EntityDefinitions(LogicalName='{logical}')/Attributes"
+            results = await self.dv.batch(
+                [(attributes, "$select=LogicalName,AttributeType,AttributeOf,IsValidForRead")]
+                + [(f"{attributes}/Microsoft.Dynamics.CRM.{kind}", "$select=LogicalName&$expand=OptionSet($select=Options)")
+                   for kind in OPTION_SET_TYPES]
+            )
+        except Exception:
+            self._retry_at[table] = time.monotonic() + METADATA_RETRY_SECONDS
+            raise
+        self._retry_at.pop(table, None)
+        columns = {}
+        for attribute in results[0]:
+            # AttributeOf marks companion columns like the formatted name of a lookup
+            if attribute.get("AttributeOf") or attribute.get("IsValidForRead") is False:
+                continue
+            name, kind = attribute["LogicalName"], attribute.get("AttributeType") or ""
+            if kind == "Virtual":
+                continue
+            columns[f"_{name}_value" if kind in LOOKUP_TYPES else name] = kind
+        options = {}
+        for attributes_with_options in results[1:]:
+            for attribute in attributes_with_options:
+                option_set = attribute.get("OptionSet") or {}
+                options[attribute["LogicalName"]] = {
+                    str(option["Value"]): _label(option) for option in option_set.get("Options", [])
+                }
+
+        entry = {"fetched_at": time.time(), "columns": columns, "options": options}
+        self._tables[table] = entry
+        self._from_disk.discard(table)
+        self.fetches += 1
+        try:
+            await asyncio.to_thread(self._write_file)
+        except OSError:
+            logger.warning("Could not write the metadata cache %s", self.path, exc_info=True)
+        return entry
+
+    async def _logical_name(self, table: str) -> str:
+        body = await self.dv.get_json(
+            f"{self.dv.base_url}/EntityDefinitions?$select=LogicalName&$filter=EntitySetName eq '{table}'",
+            "metadata")
+        matches = body.get("value", [])
+        if not matches:
+            raise ValueError(f"Unknown table: {table}")
+        return matches[0]["LogicalName"]
+
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable metadata cache %s", self.path)
+            return None
+
+    def _write_file(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # keep tables another process wrote, unless they belong to another version
+        cached = self._read_file() or {}
+        tables = cached.get("tables", {}) if cached.get("version") == self._version else {}
+        tables.update(self._tables)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".metadata-")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": self._version, "tables": tables}, f)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tables": len(self._tables),
+            "version": self._version,
+            "fetches": self.fetches,
+            "disk_hits": self.disk_hits,
+            "failing": sorted(table for table, at in self._retry_at.items() if at > time.monotonic()),
+        }
@@ -0,0 +1,169 @@
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# seconds; tool calls and Dataverse requests both range from milliseconds to tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # per label set: a count per bucket (not cumulative), the sum and the count
+        self._series: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = 'le="' + _number(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    A value read when /metrics is scraped. collect returns a number, a {labels: number}
+    dict, or None when there is nothing to report yet.
+    """
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Any], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self.collect()
+        samples: Iterable = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in samples:
+            if sample is not None:
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(sample)}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, collect: Callable[[], Any],
+              labelnames: Sequence[str] = ()) -> Gauge:
+        """Register a gauge, replacing one of the same name (e.g. when a server restarts)."""
+        self._metrics.pop(name, None)
+        return self._add(Gauge(name, help, collect, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TOOL_CALLS = REGISTRY.counter(
+    "mcp_tool_calls_total", "Tool calls by plugin, tool and outcome (ok or error).", ("plugin", "tool", "outcome"))
+TOOL_DURATION = REGISTRY.histogram(
+    "mcp_tool_duration_seconds", "Tool call latency, including result shaping.", ("plugin", "tool"))
+DATAVERSE_REQUESTS = REGISTRY.counter(
+    "dataverse_requests_total", "Dataverse Web API requests by table, method and status code.",
+    ("table", "method", "status"))
+DATAVERSE_DURATION = REGISTRY.histogram(
+    "dataverse_request_duration_seconds", "Dataverse request latency, including throttling waits and retries.",
+    ("table", "method"))
+DATAVERSE_BYTES = REGISTRY.counter(
+    "dataverse_response_bytes_total", "Dataverse response bytes, on the wire and decoded.", ("table", "encoding"))
+
+
+def table_label(table: str) -> str:
+    """
+    A bounded label for a request's table: "accounts(<id>)" and "EntityDefinitions(...)/..." lose their keys,
+    and Dataverse search endpoints ("/api/search/v1.0/query") are all "search".
+    """
+    if table.lstrip("/").startswith("api/search/"):
+        return "search"
+    return table.split("(", 1)[0].split("/", 1)[0] or "unknown"
+
+
+def plugin_label(fn: Callable[..., Any]) -> str:
+    """The plugin a tool belongs to, from its logic class: AccountsPluginLogic -> Accounts."""
+    owner: Optional[Any] = getattr(fn, "__self__", None)
+    if owner is None:
+        return "main"
+    return type(owner).__name__.replace("PluginLogic", "") or "main"
@@ -0,0 +1,250 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+from codec import dumps, loads
+from replica import ReplicaSync
+
+# mirrored tables: primary key column and the columns our tools filter on, which get indexes
+MIRROR_TABLES: Dict[str, Tuple[str, List[str]]] = {
+    "opportunities": ("opportunityid", ["_parentaccountid_value", "_ownerid_value", "statecode",
+                                        "cs_accountsalesregion", "estimatedclosedate"]),
+    "accounts": ("accountid", ["_parentaccountid_value", "_ownerid_value", "statecode",
+                               "cs_accountsalesregion"]),
+    "products": ("productid", ["productnumber", "statecode"]),
+    "salesorders": ("salesorderid", ["_customerid_value", "_ownerid_value", "statecode"]),
+}
+
+COMPARISONS = {"eq": "=", "ne": "!=", "gt": ">", "ge": ">=", "lt": "<", "le": "<="}
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+CLAUSE = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s+(eq|ne|gt|ge|lt|le)\s+(.+?)\s*$")
+NUMBER = re.compile(r"^-?\d+(\.\d+)?$")
+
+
+class UnsupportedQuery(ValueError):
+    """The OData query uses something the mirror can't answer; send it to Dataverse instead."""
+
+
+def _split_and(filter_str: str) -> List[str]:
+    """Split a $filter on top-level ' and ', ignoring anything inside quotes."""
+    clauses, current, quoted = [], "", False
+    tokens = re.split(r"(\s+and\s+|')", filter_str, flags=re.IGNORECASE)
+    for token in tokens:
+        if token == "'":
+            quoted = not quoted
+            current += token
+        elif not quoted and token.strip().lower() == "and" and token != token.strip():
+            clauses.append(current)
+            current = ""
+        else:
+            current += token
+    clauses.append(current)
+    return clauses
+
+
+def _literal(text: str) -> Any:
+    if text.startswith("'") and text.endswith("'") and len(text) >= 2:
+        return unquote(text[1:-1]).replace("''", "'")
+    lowered = text.lower()
+    if lowered == "null":
+        return None
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if NUMBER.match(text):
+        return float(text) if "." in text else int(text)
+    if IDENTIFIER.match(text) and not text[0].isdigit():
+        raise UnsupportedQuery(f"Unsupported literal: {text}")
+    # guids and dates are written unquoted in OData, with a date's + offset encoded
+    return unquote(text)
+
+
+def select_columns(record: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    """What $select would have returned: the columns, null when missing, with their annotations."""
+    selected = {column: record.get(column) for column in columns}
+    selected.update((key, value) for key, value in record.items()
+                    if "@" in key and key.partition("@")[0] in selected)
+    return selected
+
+
+def _is_lookup(column: str) -> bool:
+    return column.startswith("_") and column.endswith("_value")
+
+
+def _normalize(column: str, value: Any) -> Any:
+    # guids compare case-insensitively
+    if isinstance(value, str) and _is_lookup(column):
+        return value.lower()
+    return value
+
+
+class SqliteMirror:
+    """
+    Local SQLite copy of Dataverse tables, written by a ReplicaSync.
+    Each row is stored as JSON, with the filter columns of MIRROR_TABLES copied into real,
+    indexed columns. Simple OData queries ($filter conjunctions, $orderby, $top, $select)
+    are translated to SQL, comparing strings case-insensitively as Dataverse does; anything
+    else raises UnsupportedQuery.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, tables: Optional[Dict[str, Tuple[str, List[str]]]] = None):
+        self.path = path
+        self.tables = tables or MIRROR_TABLES
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS _sync_state (tbl TEXT PRIMARY KEY, delta_link TEXT)")
+            for table, (_, columns) in self.tables.items():
+                self._create(table, columns)
+        self._delta_links = dict(self._db.execute("SELECT tbl, delta_link FROM _sync_state"))
+
+    def _create(self, table: str, columns: List[str]):
+        column_defs = "".join(f', "{column}"' for column in columns)
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id TEXT PRIMARY KEY, data TEXT NOT NULL{column_defs})')
+        for column in columns:
+            self._db.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}" ON "{table}" ("{column}")')
+            # string filters compare case-insensitively, like Dataverse, and need their own index
+            self._db.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_nocase" '
+                             f'ON "{table}" ("{column}" COLLATE NOCASE)')
+
+    def delta_link(self, table: str) -> Optional[str]:
+        return self._delta_links.get(table)
+
+    def _row(self, table: str, record_id: str, row: Dict[str, Any]) -> tuple:
+        columns = self.tables[table][1]
+        return (record_id.lower(), dumps(row), *(_normalize(c, row.get(c)) for c in columns))
+
+    def _upsert(self, table: str, upserts: Iterable[Tuple[str, Dict[str, Any]]]):
+        columns = self.tables[table][1]
+        names = ", ".join(["id", "data", *(f'"{c}"' for c in columns)])
+        marks = ", ".join("?" * (len(columns) + 2))
+        self._db.executemany(f'INSERT OR REPLACE INTO "{table}" ({names}) VALUES ({marks})',
+                             (self._row(table, record_id, row) for record_id, row in upserts))
+
+    def _save_delta_link(self, table: str, delta_link: Optional[str]):
+        if delta_link is None:
+            self._db.execute("DELETE FROM _sync_state WHERE tbl = ?", (table,))
+            self._delta_links.pop(table, None)
+        else:
+            self._db.execute("INSERT OR REPLACE INTO _sync_state VALUES (?, ?)", (table, delta_link))
+            self._delta_links[table] = delta_link
+
+    def replace(self, table: str, rows: Iterable[Tuple[str, Dict[str, Any]]], delta_link: str):
+        with self._lock, self._db:
+            self._db.execute(f'DELETE FROM "{table}"')
+            self._upsert(table, rows)
+            self._save_delta_link(table, delta_link)
+
+    def apply(self, table: str, upserts: Iterable[Tuple[str, Dict[str, Any]]], deletes: Iterable[str],
+              delta_link: str):
+        with self._lock, self._db:
+            self._upsert(table, upserts)
+            self._db.executemany(f'DELETE FROM "{table}" WHERE id = ?',
+                                 ((record_id.lower(),) for record_id in deletes))
+            self._save_delta_link(table, delta_link)
+
+    def forget(self, table: str):
+        with self._lock, self._db:
+            self._save_delta_link(table, None)
+
+    def count(self, table: str) -> int:
+        with self._lock:
+            return self._db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def get(self, table: str, record_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f'SELECT data FROM "{table}" WHERE id = ?', (record_id.lower(),)).fetchone()
+        return loads(row[0]) if row else None
+
+    def _expr(self, table: str, column: str) -> str:
+        if not IDENTIFIER.match(column):
+            raise UnsupportedQuery(f"Unsupported column: {column}")
+        if column in self.tables[table][1]:
+            return f'"{column}"'
+        return f"json_extract(data, '$.{column}')"
+
+    def _sql(self, table: str, odata_query: str, max_records: Optional[int],
+             offset: int = 0) -> Tuple[str, list, Optional[List[str]]]:
+        options = {}
+        for option in odata_query.split("&"):
+            name, _, value = option.partition("=")
+            if name:
+                options[name.strip().lower()] = value.strip()
+        unsupported = set(options) - {"$filter", "$orderby", "$top", "$select"}
+        if unsupported:
+            raise UnsupportedQuery(f"Unsupported options: {', '.join(sorted(unsupported))}")
+
+        where, params = [], []
+        if options.get("$filter"):
+            for clause in _split_and(options["$filter"]):
+                match = CLAUSE.match(clause)
+                if not match:
+                    raise UnsupportedQuery(f"Unsupported filter clause: {clause.strip()}")
+                column, op, literal = match.groups()
+                value = _normalize(column, _literal(literal))
+                expr = self._expr(table, column)
+                if _is_lookup(column) and column not in self.tables[table][1]:
+                    expr = f"lower({expr})"
+                if value is None and op in ("eq", "ne"):
+                    where.append(f"{expr} IS {'NOT ' if op == 'ne' else ''}NULL")
+                else:
+                    collate = " COLLATE NOCASE" if isinstance(value, str) else ""
+                    where.append(f"{expr}{collate} {COMPARISONS[op]} ?")
+                    params.append(value)
+
+        sql = f'SELECT data FROM "{table}"'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if options.get("$orderby"):
+            terms = []
+            for term in options["$orderby"].split(","):
+                column, _, direction = term.strip().partition(" ")
+                direction = direction.strip().lower() or "asc"
+                if direction not in ("asc", "desc"):
+                    raise UnsupportedQuery(f"Unsupported sort direction: {direction}")
+                # only affects text, numbers still sort as numbers
+                terms.append(f"{self._expr(table, column)} COLLATE NOCASE {direction.upper()}")
+            sql += " ORDER BY " + ", ".join(terms)
+
+        limits = [n for n in (max_records, int(options["$top"]) if options.get("$top") else None) if n is not None]
+        if limits or offset:
+            # -1 is no limit, SQLite needs a LIMIT before an OFFSET
+            sql += " LIMIT ? OFFSET ?"
+            params += [min(limits) if limits else -1, offset]
+
+        select = [c.strip() for c in options["$select"].split(",")] if options.get("$select") else None
+        return sql, params, select
+
+    def query(self, table: str, odata_query: str = "", max_records: Optional[int] = None,
+              offset: int = 0) -> List[Dict[str, Any]]:
+        """Answer a simple OData query from the mirror. Raises UnsupportedQuery otherwise."""
+        sql, params, select = self._sql(table, odata_query, max_records, offset)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        records = [loads(data) for (data,) in rows]
+        if select:
+            records = [select_columns(record, select) for record in records]
+        return records
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_mirror(dv_client: Any) -> Optional[ReplicaSync]:
+    """The SQLite mirror sync, if DATAVERSE_MIRROR_PATH is set. MIRROR_TABLES picks a subset of tables."""
+    path = os.getenv("DATAVERSE_MIRROR_PATH")
+    if not path:
+        return None
+    selected = os.getenv("MIRROR_TABLES")
+    names = {n.strip() for n in selected.split(",")} if selected else set(MIRROR_TABLES)
+    tables = {table: spec for table, spec in MIRROR_TABLES.items() if table in names}
+    store = SqliteMirror(path, tables)
+    return ReplicaSync(dv_client, tables={table: spec[0] for table, spec in tables.items()},
+                       interval=float(os.getenv("MIRROR_SYNC_SECONDS", "300")), store=store)
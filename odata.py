@@ -0,0 +1,149 @@
+import math
+import os
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+GUID = re.compile(r"^\{?[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\}?$")
+DATE = re.compile(r"^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})?)?$")
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+OPERATORS = {"eq", "ne", "gt", "ge", "lt", "le", "contains", "startswith"}
+FUNCTIONS = {"contains", "startswith"}
+# characters in a string literal that would end or change the query string they go into
+URL_RESERVED = str.maketrans({"%": "%25", "&": "%26", "#": "%23", "+": "%2B"})
+# longest $filter expression sent in one request; longer "any of" filters are split into chunks
+MAX_FILTER_LENGTH = int(os.getenv("ODATA_MAX_FILTER_LENGTH", "4000"))
+
+
+class Filter(NamedTuple):
+    """
+    One $filter clause of a tool: column, operator and how its value is written.
+    kind is "string" (quoted and escaped), "number", "guid", "date" (both unquoted, validated)
+    or "auto" (by the value's Python type).
+    """
+    column: str
+    op: str = "eq"
+    kind: str = "auto"
+
+
+# clauses shared by several tools
+REGION = Filter("cs_accountsalesregion", "eq", "string")
+STATE = Filter("statecode", "eq", "number")
+OWNER = Filter("_ownerid_value", "eq", "guid")
+PARENT_ACCOUNT = Filter("_parentaccountid_value", "eq", "guid")
+CUSTOMER = Filter("_customerid_value", "eq", "guid")
+BUSINESS_UNIT = Filter("_owningbusinessunit_value", "eq", "guid")
+
+
+def literal(value: Any, kind: str = "auto", encode: bool = True) -> str:
+    """
+    Write a value as an OData literal, escaping strings and validating guids and dates.
+    Strings and dates are percent-encoded for a query string unless encode is False.
+    Numbers are written without an exponent, whose + would be read as a space.
+    """
+    if kind == "auto":
+        if value is None:
+            return "null"
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        kind = "number" if isinstance(value, (int, float)) else "string"
+    if kind == "string":
+        text = str(value).replace("'", "''")
+        return "'" + (text.translate(URL_RESERVED) if encode else text) + "'"
+    if kind == "number":
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Expected a number, got {value!r}")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f"Expected a finite number, got {value!r}")
+        # repr is the shortest exact form of a float; Decimal writes it out without 1e+16
+        return str(value) if isinstance(value, int) else format(Decimal(repr(value)), "f")
+    if kind == "guid":
+        if not isinstance(value, str) or not GUID.match(value.strip()):
+            raise ValueError(f"Expected a GUID, got {value!r}")
+        return value.strip().strip("{}").lower()
+    if kind == "date":
+        if not isinstance(value, str) or not DATE.match(value.strip()):
+            raise ValueError(f"Expected an ISO 8601 date, got {value!r}")
+        # a +02:00 offset would otherwise arrive as a space
+        return value.strip().translate(URL_RESERVED) if encode else value.strip()
+    raise ValueError(f"Unknown literal kind: {kind}")
+
+
+@lru_cache(maxsize=256)
+def _plan(filters: Tuple[Filter, ...], top: bool, orderby: bool, select: str) -> str:
+    """
+    The query template for one combination of present filters and options. Options come out
+    in sorted order, so equal queries always compile to the same string.
+    """
+    options = []
+    if filters:
+        clauses = []
+        for i, f in enumerate(filters):
+            if f.op not in OPERATORS or not IDENTIFIER.match(f.column):
+                raise ValueError(f"Invalid filter: {f}")
+            clauses.append(f"{f.op}({f.column},{{{i}}})" if f.op in FUNCTIONS else f"{f.column} {f.op} {{{i}}}")
+        options.append("$filter=" + " and ".join(clauses))
+    if orderby:
+        options.append(f"$orderby={{{len(filters)}}}")
+    if select:
+        options.append(select)
+    if top:
+        options.append(f"$top={{{len(filters) + int(orderby)}}}")
+    return "&".join(options)
+
+
+def build_query(filters: Sequence[Tuple[Filter, Any]] = (), top: Optional[int] = None,
+                sort_by: Optional[str] = None, sort_direction: Optional[str] = None,
+                select: str = "") -> str:
+    """
+    Canonical OData query string. filters are (Filter, value) pairs; a None value leaves the
+    clause out. Sorting needs both sort_by and sort_direction. select is a $select option,
+    as made by columns.select_clause.
+    """
+    present = tuple(f for f, value in filters if value is not None)
+    args = [literal(value, f.kind) for f, value in filters if value is not None]
+    orderby = bool(sort_by and sort_direction)
+    if orderby:
+        if not IDENTIFIER.match(sort_by) or sort_direction not in ("asc", "desc"):
+            raise ValueError(f"Invalid sort: {sort_by} {sort_direction}")
+        args.append(f"{sort_by} {sort_direction}")
+    if top is not None:
+        args.append(int(top))
+    return _plan(present, top is not None, orderby, select).format(*args)
+
+
+def build_filter(filters: Sequence[Tuple[Filter, Any]]) -> str:
+    """Just the $filter expression of build_query, e.g. for a filter() step inside $apply."""
+    return build_query(filters)[len("$filter="):]
+
+
+def any_of(column: str, values: Sequence[Any], kind: str = "auto",
+           max_length: int = MAX_FILTER_LENGTH) -> List[str]:
+    """
+    "(column eq a or column eq b ...)" expressions matching any of values, split so no expression
+    is longer than max_length. Duplicates are dropped.
+    """
+    if not IDENTIFIER.match(column):
+        raise ValueError(f"Invalid column: {column}")
+    chunks, clauses, length = [], [], 2
+    for value in dict.fromkeys(literal(value, kind) for value in values):
+        clause = f"{column} eq {value}"
+        if clauses and length + len(clause) + 4 > max_length:
+            chunks.append("(" + " or ".join(clauses) + ")")
+            clauses, length = [], 2
+        clauses.append(clause)
+        length += len(clause) + 4
+    if clauses:
+        chunks.append("(" + " or ".join(clauses) + ")")
+    return chunks
+
+
+def query_columns(filters: Sequence[Tuple[Filter, Any]] = (), sort_by: Optional[str] = None) -> List[str]:
+    """The columns a build_query call would use, for validation against the table metadata."""
+    return [f.column for f, value in filters if value is not None] + ([sort_by] if sort_by else [])
+
+
+def plan_stats() -> dict:
+    info = _plan.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "plans": info.currsize}
@@ -0,0 +1,65 @@
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from codec import dumps, loads
+
+# Dataverse won't return more than this many records per page
+MAX_PAGE_SIZE = 5000
+
+
+class InvalidCursor(ValueError):
+    """A cursor that is malformed, belongs to another table, or can't be resumed any more."""
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """An opaque continuation token for a list tool."""
+    return base64.urlsafe_b64encode(dumps(state).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, table: str) -> Dict[str, Any]:
+    """
+    The state inside a cursor, checked to belong to table. A cursor is either
+    {"k": "link", "u": next link} or {"k": "offset", "s": source, "q": query, "o": offset},
+    with the table "t" and page size "n".
+    """
+    try:
+        state = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise InvalidCursor("Invalid cursor, list again without one")
+    if not isinstance(state, dict) or state.get("t") != table or state.get("k") not in ("link", "offset"):
+        raise InvalidCursor(f"This cursor doesn't belong to {table}")
+    return state
+
+
+def cursor_source(cursor: Optional[str], table: str) -> Optional[str]:
+    """Where a cursor's pages come from: "link" for the Web API, else the offset source (mirror, replica)."""
+    if not cursor:
+        return None
+    state = decode_cursor(cursor, table)
+    return "link" if state["k"] == "link" else state.get("s")
+
+
+def page_size(top: int) -> int:
+    return max(1, min(int(top), MAX_PAGE_SIZE))
+
+
+def page(records: List[Dict[str, Any]], next_cursor: Optional[str]) -> Dict[str, Any]:
+    """What list tools return: one page of records and the cursor of the next, if there is one."""
+    return {"records": records, "next_cursor": next_cursor}
+
+
+def slice_rows(table: str, rows: List[Dict[str, Any]], top: int, cursor: Optional[str],
+               source: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Page through rows held locally (e.g. the replica), with offset cursors."""
+    offset = 0
+    if cursor:
+        state = decode_cursor(cursor, table)
+        if state["k"] != "offset" or state.get("s") != source:
+            raise InvalidCursor("This cursor can't be resumed any more, list again without one")
+        offset, top = int(state["o"]), int(state["n"])
+    size = page_size(top)
+    end = offset + size
+    next_cursor = None
+    if end < len(rows):
+        next_cursor = encode_cursor({"k": "offset", "t": table, "s": source, "q": "", "o": end, "n": size})
+    return rows[offset:end], next_cursor
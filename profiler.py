@@ -0,0 +1,169 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+# longest profiling window the admin route accepts, in seconds
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+MODES = ("cpu", "sample", "memory")
+
+
+class ProfilerBusy(Exception):
+    """A profiling window is already running."""
+
+
+class StackSampler:
+    """
+    Sampling CPU profiler: a background thread records every other thread's stack at a fixed
+    interval, the way pyinstrument or py-spy do, so the overhead doesn't grow with call counts.
+    Stacks are kept collapsed ("thread;outer;...;inner") for flame graphs.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """Functions by the share of samples they were on CPU in (self time)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": name, "samples": count, "share": round(count / total, 4)}
+                for name, count in leaves.most_common(limit)]
+
+
+class Profiler:
+    """
+    On-demand profiling of the running server for a time window: cProfile of the event loop
+    thread (cpu), a stack sampler over every thread (sample), and tracemalloc snapshots
+    compared at both ends of the window (memory). One window runs at a time; the results of
+    the last one are kept until the next starts.
+    """
+
+    def __init__(self):
+        self.modes: Sequence[str] = ()
+        self.started: Optional[float] = None
+        self.ends: Optional[float] = None
+        self.result: Dict[str, Any] = {}
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, seconds: float, modes: Sequence[str] = ("sample",)):
+        """Begin a window on the event loop thread; it stops by itself after seconds."""
+        if self.running:
+            raise ProfilerBusy("A profile is already running")
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown or not modes:
+            raise ValueError(f"Unknown profile mode {', '.join(unknown) or '(none)'}, use {', '.join(MODES)}")
+        seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+        self.modes = tuple(modes)
+        self.result = {}
+        self.started = time.time()
+        self.ends = self.started + seconds
+        if "cpu" in modes:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        if "sample" in modes:
+            self._sampler = StackSampler()
+            self._sampler.start()
+        if "memory" in modes:
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start(25)
+            self._snapshot = tracemalloc.take_snapshot()
+        self._task = asyncio.create_task(self._finish_after(seconds))
+
+    async def _finish_after(self, seconds: float):
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """End the window now and keep its results."""
+        if self._profile is not None:
+            self._profile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(40)
+            self.result["cpu"] = out.getvalue()
+            self._profile = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self.result["sample"] = {"samples": self._sampler.samples, "top": self._sampler.top(),
+                                     "collapsed": self._sampler.collapsed()}
+            self._sampler = None
+        if self._snapshot is not None:
+            current = tracemalloc.take_snapshot()
+            stats = current.compare_to(self._snapshot, "lineno")
+            self.result["memory"] = {
+                "traced_bytes": tracemalloc.get_traced_memory()[0],
+                "top": [{"line": str(stat.traceback[0]), "size_diff": stat.size_diff, "size": stat.size,
+                         "count_diff": stat.count_diff} for stat in stats[:30]],
+            }
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            self._snapshot = None
+        self.ends = min(self.ends or time.time(), time.time())
+        task, self._task = self._task, None
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            task.cancel()
+
+    def status(self) -> Dict[str, Any]:
+        result = dict(self.result)
+        if "sample" in result:
+            # the collapsed stacks are served separately, they can be large
+            result["sample"] = {k: v for k, v in result["sample"].items() if k != "collapsed"}
+        return {"running": self.running, "modes": list(self.modes), "started": self.started,
+                "ends": self.ends, "result": result}
+
+    def collapsed(self) -> str:
+        return self.result.get("sample", {}).get("collapsed", "")
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# reference tables kept locally, with their primary key column
+DEFAULT_REPLICA_TABLES = {
+    "products": "productid",
+    "systemusers": "systemuserid",
+    "businessunits": "businessunitid",
+    "teams": "teamid",
+    "competitors": "competitorid",
+}
+DEFAULT_SYNC_SECONDS = float(os.getenv("REPLICA_SYNC_SECONDS", "60"))
+REPLICA_PAGE_SIZE = 5000
+
+
+class ChangeTrackingDisabled(RuntimeError):
+    """The table doesn't have change tracking enabled, so it can't be replicated."""
+
+
+class MemoryStore:
+    """
+    In-memory copy of each replicated table, keyed by primary id.
+    A store also keeps each table's delta link; a table with a delta link is fully synced.
+    """
+
+    # stores doing blocking I/O are written from a worker thread
+    blocking = False
+
+    def __init__(self):
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.delta_links: Dict[str, str] = {}
+
+    def delta_link(self, table: str) -> Optional[str]:
+        return self.delta_links.get(table)
+
+    def replace(self, table: str, rows: Iterable[Tuple[str, Dict[str, Any]]], delta_link: str):
+        self.tables[table] = {record_id.lower(): row for record_id, row in rows}
+        self.delta_links[table] = delta_link
+
+    def apply(self, table: str, upserts: Iterable[Tuple[str, Dict[str, Any]]], deletes: Iterable[str],
+              delta_link: str):
+        rows = self.tables.setdefault(table, {})
+        for record_id, row in upserts:
+            rows[record_id.lower()] = row
+        for record_id in deletes:
+            rows.pop(record_id.lower(), None)
+        self.delta_links[table] = delta_link
+
+    def forget(self, table: str):
+        """Drop a table's delta link so the next sync is a full read."""
+        self.delta_links.pop(table, None)
+
+    def count(self, table: str) -> int:
+        return len(self.tables.get(table, {}))
+
+    def get(self, table: str, record_id: str) -> Optional[Dict[str, Any]]:
+        return self.tables.get(table, {}).get(record_id.lower())
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return list(self.tables.get(table, {}).values())
+
+
+class ReplicaSync:
+    """
+    Keeps a local replica of reference tables current with Dataverse change tracking.
+    The first sync of a table is a full read with Prefer: odata.track-changes; every later
+    sync follows the table's delta link and applies only new, changed and deleted rows.
+    Until a table's first sync completes, get() and rows() return None and callers should
+    go to Dataverse instead.
+    """
+
+    def __init__(self, dv_client: Any, tables: Optional[Dict[str, str]] = None,
+                 interval: float = DEFAULT_SYNC_SECONDS, store: Optional[Any] = None):
+        self.dv = dv_client
+        self.tables = tables if tables is not None else self._tables_from_env()
+        self.interval = interval
+        self.store = store if store is not None else MemoryStore()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _tables_from_env() -> Dict[str, str]:
+        """REPLICA_TABLES picks a subset of the defaults, an empty value turns the replica off."""
+        selected = os.getenv("REPLICA_TABLES")
+        if selected is None:
+            return dict(DEFAULT_REPLICA_TABLES)
+        names = {name.strip() for name in selected.split(",") if name.strip()}
+        return {table: key for table, key in DEFAULT_REPLICA_TABLES.items() if table in names}
+
+    def ready(self, table: str) -> bool:
+        return table in self.tables and self.store.delta_link(table) is not None
+
+    async def _write(self, method, *args):
+        if self.store.blocking:
+            await asyncio.to_thread(method, *args)
+        else:
+            method(*args)
+
+    def get(self, table: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """A replicated record, or None if the table isn't replicated yet or has no such row."""
+        if not self.ready(table):
+            return None
+        return self.store.get(table, record_id)
+
+    def rows(self, table: str) -> Optional[List[Dict[str, Any]]]:
+        """Every replicated row of a table, or None if the table isn't replicated yet."""
+        if not self.ready(table):
+            return None
+        return self.store.rows(table)
+
+    async def start(self):
+        if self.tables and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self._sync_logged(table) for table in self.tables))
+            await asyncio.sleep(self.interval)
+
+    async def _sync_logged(self, table: str):
+        try:
+            await self.sync_table(table)
+        except ChangeTrackingDisabled:
+            logger.warning("Change tracking is not enabled for %s, not replicating it", table)
+            self.tables.pop(table, None)
+        except Exception:
+            logger.exception("Replica sync of %s failed", table)
+
+    async def sync_table(self, table: str):
+        delta_link = self.store.delta_link(table)
+        if delta_link is None:
+            await self._full_sync(table)
+            return
+        try:
+            upserts, deletes, next_delta = await self._read_changes(table, delta_link)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                raise
+            # expired or invalid delta token, start over with a full read
+            logger.warning("Delta link for %s rejected (%s), resyncing", table, e.response.status_code)
+            self.store.forget(table)
+            await self._full_sync(table)
+            return
+        await self._write(self.store.apply, table, upserts, deletes, next_delta)
+        if upserts or deletes:
+            logger.info("Replica %s: %d changed, %d deleted", table, len(upserts), len(deletes))
+
+    async def _full_sync(self, table: str):
+        upserts, _, delta_link = await self._read_changes(table, f"{self.dv.base_url}/{table}")
+        await self._write(self.store.replace, table, upserts, delta_link)
+        logger.info("Replica %s loaded with %d rows", table, len(upserts))
+
+    async def _read_changes(self, table: str, url: str):
+        """Follow next links from url to the end, returning (upserts, deletes, delta link)."""
+        primary_key = self.tables[table]
+        headers = {"Prefer": f"odata.track-changes,odata.maxpagesize={REPLICA_PAGE_SIZE}"}
+        upserts, deletes = [], []
+        while True:
+            body = await self.dv.get_json(url, table, headers=headers)
+            for row in body.get("value", []):
+                if "$deletedEntity" in row.get("@odata.context", ""):
+                    deletes.append(row["id"])
+                else:
+                    upserts.append((row[primary_key], row))
+            if "@odata.nextLink" in body:
+                url = body["@odata.nextLink"]
+                continue
+            if "@odata.deltaLink" not in body:
+                raise ChangeTrackingDisabled(table)
+            return upserts, deletes, body["@odata.deltaLink"]
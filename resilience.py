@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+# a read still waiting at this percentile of recent latencies gets a duplicate sent
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.05"))
+# at most this share of reads may be hedged; 0 turns hedging off
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+# the breaker opens at this error rate over the last BREAKER_WINDOW requests...
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "20"))
+# ...and lets a probe through after this long
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Dataverse is failing too often; the request was not sent."""
+
+
+class CircuitBreaker:
+    """
+    Fails requests fast while Dataverse is unhealthy. Opens when the error rate (5xx and
+    transport errors) over the last window of requests reaches error_rate, then after
+    cooldown lets one probe through: success closes it again, failure reopens it.
+    """
+
+    def __init__(self, error_rate: float = BREAKER_ERROR_RATE, window: int = BREAKER_WINDOW,
+                 min_requests: int = BREAKER_MIN_REQUESTS, cooldown: float = BREAKER_COOLDOWN):
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+
+    def check(self) -> bool:
+        """
+        Raise CircuitOpen unless a request may be sent now. Returns True for the half-open
+        probe, which must end in record(..., probe=True) or release().
+        """
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        raise CircuitOpen(f"Dataverse is unavailable, retrying in {self.cooldown:.0f}s")
+
+    def record(self, ok: bool, probe: bool = False):
+        if probe:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if self.state == CLOSED and len(self._outcomes) >= self.min_requests \
+                and failures / len(self._outcomes) >= self.error_rate:
+            self._open()
+
+    def release(self, probe: bool):
+        """A request ended without an outcome (cancelled, or failed before reaching Dataverse)."""
+        if probe:
+            # let the next request probe instead
+            self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "opened": self.opened, "rejected": self.rejected,
+                "error_rate": round(self._outcomes.count(False) / len(self._outcomes), 3) if self._outcomes else 0.0}
+
+
+def _failed(task: asyncio.Future) -> bool:
+    """A copy that raised or came back throttled or with a server error."""
+    if task.exception() is not None:
+        return True
+    status = task.result().status_code
+    return status == 429 or status >= 500
+
+
+class Hedger:
+    """
+    Hedged reads: when a read is still running at the HEDGE_PERCENTILE of recent read
+    latencies, an identical one is sent and whichever succeeds first wins; the other is
+    cancelled. A 429 or 5xx only wins when neither copy succeeds. Hedges are drawn from a budget earned at HEDGE_BUDGET per read, so they
+    add at most that share of extra load. Each copy is a full request through the
+    concurrency limiter, and none is sent while busy() says Dataverse is under pressure.
+    Latencies come in through observe(), timed from when a request got its slot, so
+    queueing and Retry-After waits don't count.
+    """
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, min_delay: float = HEDGE_MIN_DELAY,
+                 budget: float = HEDGE_BUDGET, samples: int = 200):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = budget
+        self._latencies: deque = deque(maxlen=samples)
+        self._tokens = 0.0
+        self.reads = 0
+        self.hedged = 0
+        self.hedge_won = 0
+
+    def observe(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        """How long a read may run before it is hedged; infinite until there are enough samples."""
+        if len(self._latencies) < 20:
+            return float("inf")
+        ordered = sorted(self._latencies)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return max(ordered[index], self.min_delay)
+
+    async def send(self, request: Callable[[], Awaitable[httpx.Response]],
+                   busy: Optional[Callable[[], bool]] = None) -> httpx.Response:
+        self.reads += 1
+        # a small burst allowance, so a run of slow reads can all be hedged
+        self._tokens = min(self._tokens + self.budget, 10.0)
+        first = asyncio.ensure_future(request())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.delay())
+            if done or self._tokens < 1 or (busy is not None and busy()):
+                return await first
+            self._tokens -= 1
+            self.hedged += 1
+            second = asyncio.ensure_future(request())
+            tasks.append(second)
+            pending = {first, second}
+            finished = []
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished += done
+                winner = next((task for task in done if not _failed(task)), None)
+                if winner is None and pending:
+                    # one copy failed, the other may still answer
+                    continue
+                # both failed: a response, even an error, says more than an exception
+                winner = winner or next((task for task in finished if task.exception() is None), finished[0])
+                if winner is second:
+                    self.hedge_won += 1
+                return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        return {"reads": self.reads, "hedged": self.hedged, "hedge_won": self.hedge_won,
+                "delay": None if delay == float("inf") else round(delay, 3)}
@@ -1,6 +1,22 @@
 from typing import Optional, Literal, List, Dict, Any
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from odata import BUSINESS_UNIT, PARENT_ACCOUNT, REGION, STATE, any_of, build_query, literal, query_columns
+from paging import page
+
+DEAL_STATES = {0: "open", 1: "won", 2: "lost"}
+EMPTY_DEAL_SUMMARY = {
+    "open_revenue": 0,
+    "open_deal_count": 0,
+    "won_revenue": 0,
+    "won_deal_count": 0,
+    "lost_revenue": 0,
+    "lost_deal_count": 0
+}
+
 
 class AccountsPluginLogic:
     """Contains the business logic for account-related operations."""
@@ -8,55 +24,44 @@ class AccountsPluginLogic:
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_accounts(
+    async def list_accounts(
             self,
             top: int = 5,
             region: Optional[str] = None,
             status: Optional[Literal[0, 1]] = None,
             business_unit_id: Optional[str] = None,
             sort_by: Optional[str] = None,
-            sort_direction: Optional[Literal["asc", "desc"]] = None
-    ) -> List[Dict[str, Any]]:
+            sort_direction: Optional[Literal["asc", "desc"]] = None,
+            profile: ColumnProfile = "standard",
+            cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        List the top N accounts from Dataverse. Optional filters for region, status, business unit, and sorting.
+        List accounts from Dataverse, top per page. Optional filters for region, status, business unit, and sorting.
         If region is provided, it filters by the specified region, must be one of the following: NAR, CALA, MEA, Europe, or APAC.
         Status must be a numeric code: 0 for active, 1 for inactive.
         If business_unit_id is provided, it filters accounts by the owning business unit's GUID.
         If sort_by is provided, sort_direction must also be provided as 'asc' or 'desc'.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
         """
-        clauses = []
-        if region:
-            clauses.append(f"cs_accountsalesregion eq '{region}'")
-        if status:
-            clauses.append(f"statecode eq {status}")
-        if business_unit_id:
-            clauses.append(f"_owningbusinessunit_value eq {business_unit_id}")
-
-        filter_str = ""
-        if clauses:
-            filter_str = "$filter=" + " and ".join(clauses)
-
-        order_str = ""
-        if sort_by and sort_direction:
-            order_str = f"$orderby={sort_by} {sort_direction}"
-
-        parts = [f"$top={top}"]
-        if filter_str:
-            parts.append(filter_str)
-        if order_str:
-            parts.append(order_str)
-
-        odata_query = "&".join(parts)
-        return self.dv.query("accounts", odata_query)
-
-    def get_account(
+        filters = [(REGION, region), (STATE, status), (BUSINESS_UNIT, business_unit_id)]
+        await self.dv.metadata.validate("accounts", query_columns(filters, sort_by))
+        odata_query = build_query(filters, None, sort_by, sort_direction, select_clause("accounts", profile))
+        records, next_cursor = await self.dv.query_page("accounts", odata_query, top, cursor)
+        return page(records, next_cursor)
+
+    async def get_account(
             self,
-            account_id: str
+            account_id: str,
+            profile: ColumnProfile = "standard"
     ) -> Dict[str, Any]:
-        """Retrieve a single account by its ID."""
-        return self.dv.retrieve("accounts", account_id)
+        """
+        Retrieve a single account by its ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("accounts", account_id, select_clause("accounts", profile))
 
-    def search_accounts_by_name(
+    async def search_accounts_by_name(
             self,
             search_query: str,
             top: int = 10
@@ -72,32 +77,28 @@ class AccountsPluginLogic:
             "top": top,
             "fuzzy": True
         }
-        response = self.dv.post(search_endpoint, payload)
+        response = await self.dv.post(search_endpoint, payload)
         # records = [item.get('@search.entity')
         #            for item in response.get('value', []) if item.get('@search.entity')]
         # return records
         return response
 
-    def list_account_opportunities(
+    async def list_account_opportunities(
             self,
             account_id: str,
-            status: Optional[Literal[0, 1, 2]] = None
+            status: Optional[Literal[0, 1, 2]] = None,
+            profile: ColumnProfile = "standard"
     ) -> List[Dict[str, Any]]:
         """
         Lists all sales opportunities for a specific account.
         Can optionally filter by opportunity status (0=Open, 1=Won, 2=Lost).
+        profile picks the columns returned: compact, standard or full.
         """
-        filter_clauses = [f"_parentaccountid_value eq {account_id}"]
-
-        if status is not None:
-            filter_clauses.append(f"statecode eq {status}")
-
-        filter_str = " and ".join(filter_clauses)
-        odata_query = f"$filter={filter_str}"
-
-        return self.dv.query("opportunities", odata_query)
+        odata_query = build_query([(PARENT_ACCOUNT, account_id), (STATE, status)],
+                                  select=select_clause("opportunities", profile))
+        return await self.dv.query("opportunities", odata_query)
     
-    def list_account_orders(
+    async def list_account_orders(
             self,
             account_id: str,
             status: Optional[Literal[0, 1, 2, 3, 4]] = None
@@ -109,68 +110,67 @@ class AccountsPluginLogic:
         filter_clauses = [f"_parentaccountid_value eq {account_id}"]
         # TODO: all of it lol
 
-    def get_account_deal_summary(
+    async def get_account_deal_summary(
             self,
             account_id: str
     ) -> Dict[str, Any]:
         """
         Summarizes open, won, and lost opportunities and revenues for a given account's GUID.
         """
-        summary = {
-            "open_revenue": 0,
-            "open_deal_count": 0,
-            "won_revenue": 0,
-            "won_deal_count": 0,
-            "lost_revenue": 0,
-            "lost_deal_count": 0
-        }
-
-        open_query = (
-            f"$apply=filter(_parentaccountid_value eq {account_id} and statecode eq 0)/"
-            f"aggregate($count as open_deal_count, estimatedvalue with sum as open_revenue)"
-        )
-        
-        won_query = (
-            f"$apply=filter(_parentaccountid_value eq {account_id} and statecode eq 1)/"
-            f"aggregate($count as won_deal_count, actualvalue with sum as won_revenue)"
-        )
-
-        lost_query = (
-            f"$apply=filter(_parentaccountid_value eq {account_id} and statecode eq 2)/"
-            f"aggregate($count as lost_deal_count, actualvalue with sum as lost_revenue)"
-        )
-
-        open_result = self.dv.query("opportunities", open_query)
-        if open_result:
-            summary.update(open_result[0])
-
-        won_result = self.dv.query("opportunities", won_query)
-        if won_result:
-            summary.update(won_result[0])
-
-        lost_result = self.dv.query("opportunities", lost_query)
-        if lost_result:
-            summary.update(lost_result[0])
+        summaries = await self.get_account_deal_summaries([account_id])
+        return next(iter(summaries.values()))
 
-        return summary
-        
-
-    def inspect_account_fields(self) -> List[str]:
-        """Return the columns for an account record."""
-        records = self.dv.query("accounts", "$top=1")
-        return list(records[0].keys()) if records else []
-
-
-def create_accounts_plugin_server(dv_client: Any) -> FastMCP:
+    async def get_account_deal_summaries(
+            self,
+            account_ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarizes open, won, and lost opportunities and revenues for several accounts at once, given their GUIDs.
+        Returns a summary per account GUID (lower-cased), computed in one grouped request.
+        """
+        summaries = {literal(account_id, "guid"): dict(EMPTY_DEAL_SUMMARY) for account_id in account_ids}
+        if not summaries:
+            return {}
+
+        queries = [
+            f"$apply=filter({chunk})/groupby((_parentaccountid_value,statecode),"
+            f"aggregate($count as deal_count,estimatedvalue with sum as estimated,actualvalue with sum as actual))"
+            for chunk in any_of("_parentaccountid_value", list(summaries), "guid")
+        ]
+        if len(queries) == 1:
+            results = [await self.dv.query("opportunities", queries[0])]
+        else:
+            # long ID lists are split to keep URLs short, but still sent in one round trip
+            results = await self.dv.batch([("opportunities", query) for query in queries])
+
+        for rows in results:
+            for row in rows:
+                summary = summaries.get((row.get("_parentaccountid_value") or "").lower())
+                state = DEAL_STATES.get(row.get("statecode"))
+                if summary is None or state is None:
+                    continue
+                # open deals count estimated revenue, closed ones what was actually won or lost
+                revenue = row.get("estimated") if state == "open" else row.get("actual")
+                summary[f"{state}_deal_count"] = row.get("deal_count", 0)
+                summary[f"{state}_revenue"] = revenue or 0
+        return summaries
+
+    async def inspect_account_fields(self) -> List[str]:
+        """Return the columns for an account record, from the cached table metadata."""
+        return await self.dv.metadata.columns("accounts")
+
+
+def create_accounts_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Accounts 'plugin' server."""
-    accounts_mcp = FastMCP(name="AccountsPlugin")
+    accounts_mcp = FastMCP(name="AccountsPlugin", tool_serializer=dumps)
     plugin_logic = AccountsPluginLogic(dv_client)
 
-    accounts_mcp.tool(plugin_logic.list_accounts)
-    accounts_mcp.tool(plugin_logic.get_account)
-    accounts_mcp.tool(plugin_logic.search_accounts_by_name)
-    accounts_mcp.tool(plugin_logic.list_account_opportunities)
-    accounts_mcp.tool(plugin_logic.get_account_deal_summary)
-    accounts_mcp.tool(plugin_logic.inspect_account_fields)
+    accounts_mcp.tool(executor.wrap(plugin_logic.list_accounts))
+    accounts_mcp.tool(executor.wrap(plugin_logic.get_account))
+    accounts_mcp.tool(executor.wrap(plugin_logic.search_accounts_by_name))
+    accounts_mcp.tool(executor.wrap(plugin_logic.list_account_opportunities))
+    accounts_mcp.tool(executor.wrap(plugin_logic.get_account_deal_summary))
+    accounts_mcp.tool(executor.wrap(plugin_logic.get_account_deal_summaries))
+    accounts_mcp.tool(executor.wrap(plugin_logic.inspect_account_fields))
 
     return accounts_mcp
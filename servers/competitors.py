@@ -1,32 +1,48 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, project, select_clause
+from executor import ToolExecutor
+from paging import cursor_source, page, slice_rows
+
 class CompetitorsPluginLogic:
     """Contains the business logic for competitor-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_competitors(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N competitors from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("competitors", odata_query)
+    async def list_competitors(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List competitors from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        rows = self.dv.replica.rows("competitors")
+        if rows is not None and cursor_source(cursor, "competitors") in (None, "replica"):
+            rows, next_cursor = slice_rows("competitors", rows, top, cursor, "replica")
+            return page([project("competitors", row, profile) for row in rows], next_cursor)
+        records, next_cursor = await self.dv.query_page("competitors", select_clause("competitors", profile), top, cursor)
+        return page(records, next_cursor)
 
-    def get_competitor(self, competitor_id: str) -> Dict[str, Any]:
-        """Retrieve a single competitor by its ID."""
-        return self.dv.retrieve("competitors", competitor_id)
+    async def get_competitor(self, competitor_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single competitor by its ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.lookup("competitors", competitor_id, profile)
 
-    def inspect_competitor_fields(self) -> List[str]:
-        """Return the columns for a competitor record."""
-        records = self.dv.query("competitors", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_competitor_fields(self) -> List[str]:
+        """Return the columns for a competitor record, from the cached table metadata."""
+        return await self.dv.metadata.columns("competitors")
 
-def create_competitors_plugin_server(dv_client: Any) -> FastMCP:
+def create_competitors_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the competitors 'plugin' server."""
-    competitors_mcp = FastMCP(name="CompetitorsPlugin")
+    competitors_mcp = FastMCP(name="CompetitorsPlugin", tool_serializer=dumps)
     plugin_logic = CompetitorsPluginLogic(dv_client)
 
-    competitors_mcp.tool(plugin_logic.list_competitors)
-    competitors_mcp.tool(plugin_logic.get_competitor)
-    competitors_mcp.tool(plugin_logic.inspect_competitor_fields)
+    competitors_mcp.tool(executor.wrap(plugin_logic.list_competitors))
+    competitors_mcp.tool(executor.wrap(plugin_logic.get_competitor))
+    competitors_mcp.tool(executor.wrap(plugin_logic.inspect_competitor_fields))
 
     return competitors_mcp
@@ -1,32 +1,44 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from paging import page
+
 class ContactsPluginLogic:
     """Contains the business logic for contact-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_contacts(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N contacts from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("contacts", odata_query)
+    async def list_contacts(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List contacts from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        records, next_cursor = await self.dv.query_page("contacts", select_clause("contacts", profile), top, cursor)
+        return page(records, next_cursor)
 
-    def get_contact(self, contact_id: str) -> Dict[str, Any]:
-        """Retrieve a single contact by its contact id."""
-        return self.dv.retrieve("contacts", contact_id)
+    async def get_contact(self, contact_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single contact by its contact id.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("contacts", contact_id, select_clause("contacts", profile))
 
-    def inspect_contact_fields(self) -> List[str]:
-        """Return the columns for an contact record."""
-        records = self.dv.query("contacts", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_contact_fields(self) -> List[str]:
+        """Return the columns for an contact record, from the cached table metadata."""
+        return await self.dv.metadata.columns("contacts")
 
-def create_contacts_plugin_server(dv_client: Any) -> FastMCP:
+def create_contacts_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the contacts 'plugin' server."""
-    contacts_mcp = FastMCP(name="contactsPlugin")
+    contacts_mcp = FastMCP(name="contactsPlugin", tool_serializer=dumps)
     plugin_logic = ContactsPluginLogic(dv_client)
 
-    contacts_mcp.tool(plugin_logic.list_contacts)
-    contacts_mcp.tool(plugin_logic.get_contact)
-    contacts_mcp.tool(plugin_logic.inspect_contact_fields)
+    contacts_mcp.tool(executor.wrap(plugin_logic.list_contacts))
+    contacts_mcp.tool(executor.wrap(plugin_logic.get_contact))
+    contacts_mcp.tool(executor.wrap(plugin_logic.inspect_contact_fields))
 
     return contacts_mcp
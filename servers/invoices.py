@@ -1,32 +1,67 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Literal
 from fastmcp import FastMCP
 
+from aggregation import GroupBy, aggregate
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from odata import CUSTOMER, OWNER, STATE
+from paging import page
+
 class InvoicesPluginLogic:
     """Contains the business logic for invoice-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_invoices(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N invoices from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("invoices", odata_query)
+    async def list_invoices(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List invoices from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        records, next_cursor = await self.dv.query_page("invoices", select_clause("invoices", profile), top, cursor)
+        return page(records, next_cursor)
+
+    async def get_invoice(self, invoice_number: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single invoice by its invoice number.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("invoices", invoice_number, select_clause("invoices", profile))
 
-    def get_invoice(self, invoice_number: str) -> Dict[str, Any]:
-        """Retrieve a single invoice by its invoice number."""
-        return self.dv.retrieve("invoices", invoice_number)
+    async def aggregate_invoices(
+            self,
+            group_by: GroupBy = "status",
+            status: Optional[Literal[0, 1, 2, 3]] = None,
+            account_id: Optional[str] = None,
+            owner_id: Optional[str] = None,
+            due_date_start: Optional[str] = None,
+            due_date_end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Count invoices and total their amounts per group, computed by Dataverse in one request.
+        group_by is one of owner, business_unit, status, or close_month (by due date).
+        Optional filters: status (0=Active, 1=Closed, 2=Paid, 3=Canceled), account_id, owner_id,
+        and a due date range (YYYY-MM-DD).
+        Returns one row per group with its count and total, largest total first (months in calendar order).
+        """
+        return await aggregate(self.dv, "invoices", group_by,
+                               [(STATE, status), (CUSTOMER, account_id), (OWNER, owner_id)],
+                               due_date_start, due_date_end)
 
-    def inspect_invoice_fields(self) -> List[str]:
-        """Return the columns for an invoice record."""
-        records = self.dv.query("invoices", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_invoice_fields(self) -> List[str]:
+        """Return the columns for an invoice record, from the cached table metadata."""
+        return await self.dv.metadata.columns("invoices")
 
-def create_invoices_plugin_server(dv_client: Any) -> FastMCP:
+def create_invoices_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the invoices 'plugin' server."""
-    invoices_mcp = FastMCP(name="invoicesPlugin")
+    invoices_mcp = FastMCP(name="invoicesPlugin", tool_serializer=dumps)
     plugin_logic = InvoicesPluginLogic(dv_client)
 
-    invoices_mcp.tool(plugin_logic.list_invoices)
-    invoices_mcp.tool(plugin_logic.get_invoice)
-    invoices_mcp.tool(plugin_logic.inspect_invoice_fields)
+    invoices_mcp.tool(executor.wrap(plugin_logic.list_invoices))
+    invoices_mcp.tool(executor.wrap(plugin_logic.get_invoice))
+    invoices_mcp.tool(executor.wrap(plugin_logic.aggregate_invoices, slim=False))
+    invoices_mcp.tool(executor.wrap(plugin_logic.inspect_invoice_fields))
 
     return invoices_mcp
@@ -1,32 +1,44 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from paging import page
+
 class LeadsPluginLogic:
     """Contains the business logic for lead-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_leads(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N leads from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("leads", odata_query)
+    async def list_leads(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List leads from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        records, next_cursor = await self.dv.query_page("leads", select_clause("leads", profile), top, cursor)
+        return page(records, next_cursor)
 
-    def get_lead(self, lead_id: str) -> Dict[str, Any]:
-        """Retrieve a single lead by its ID."""
-        return self.dv.retrieve("leads", lead_id)
+    async def get_lead(self, lead_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single lead by its ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("leads", lead_id, select_clause("leads", profile))
 
-    def inspect_lead_fields(self) -> List[str]:
-        """Return the columns for a lead record."""
-        records = self.dv.query("leads", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_lead_fields(self) -> List[str]:
+        """Return the columns for a lead record, from the cached table metadata."""
+        return await self.dv.metadata.columns("leads")
 
-def create_leads_plugin_server(dv_client: Any) -> FastMCP:
+def create_leads_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Leads 'plugin' server."""
-    leads_mcp = FastMCP(name="LeadsPlugin")
+    leads_mcp = FastMCP(name="LeadsPlugin", tool_serializer=dumps)
     plugin_logic = LeadsPluginLogic(dv_client)
 
-    leads_mcp.tool(plugin_logic.list_leads)
-    leads_mcp.tool(plugin_logic.get_lead)
-    leads_mcp.tool(plugin_logic.inspect_lead_fields)
+    leads_mcp.tool(executor.wrap(plugin_logic.list_leads))
+    leads_mcp.tool(executor.wrap(plugin_logic.get_lead))
+    leads_mcp.tool(executor.wrap(plugin_logic.inspect_lead_fields))
 
     return leads_mcp
@@ -1,12 +1,24 @@
 from typing import List, Dict, Any, Optional, Literal
 from fastmcp import FastMCP
 
+from aggregation import OpportunityGroupBy, aggregate
+from codec import dumps
+from columns import ColumnProfile, expand_clause, select_clause
+from executor import ToolExecutor
+from odata import OWNER, REGION, STATE, Filter, build_query, query_columns
+from paging import page
+
+MIN_REVENUE = Filter("estimatedvalue", "ge", "number")
+MAX_REVENUE = Filter("estimatedvalue", "le", "number")
+CLOSE_DATE_START = Filter("estimatedclosedate", "ge", "date")
+CLOSE_DATE_END = Filter("estimatedclosedate", "le", "date")
+
 class OpportunitiesPluginLogic:
     """Contains the business logic for opportunity-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_opportunities(
+    async def list_opportunities(
             self, 
             top: int = 5, 
             region: Optional[str] = None,
@@ -17,94 +29,111 @@ class OpportunitiesPluginLogic:
             est_close_date_start: Optional[str] = None,
             est_close_date_end: Optional[str] = None,
             sort_by: Optional[str] = None,
-            sort_direction: Optional[Literal["asc", "desc"]] = None
-            ) -> List[Dict[str, Any]]:
+            sort_direction: Optional[Literal["asc", "desc"]] = None,
+            profile: ColumnProfile = "standard",
+            cursor: Optional[str] = None
+            ) -> Dict[str, Any]:
         """
-        List the top N opportunities from Dataverse. 
+        List opportunities from Dataverse, top per page. 
         Optional filters for est_revenue, status, and sorting.
         Status must be a numeric code: 0 for open, 1 for won, 2 for lost.
         If region is provided, it filters by the specified region, must be one of the following: NAR, CALA, MEA, Europe, or APAC.
         If sort_by is provided, sort_direction must also be provided as 'asc' or 'desc'.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
         """
-        clauses = []
-        if region:
-            clauses.append(f"cs_accountsalesregion eq '{region}'")
-        if status:
-            clauses.append(f"statecode eq {status}")
-        if owner_id:
-            clauses.append(f"_ownerid_value eq {owner_id}")
-        if min_revenue:
-            clauses.append(f"estimatedvalue ge {min_revenue}")
-        if max_revenue:
-            clauses.append(f"estimatedvalue le {max_revenue}")
-        if est_close_date_start:
-            clauses.append(f"estimatedclosedate ge {est_close_date_start}")
-        if est_close_date_end:
-            clauses.append(f"estimatedclosedate le {est_close_date_end}")
-
-        filter_str = ""
-        if clauses:
-            filter_str = "$filter=" + " and ".join(clauses)
-
-        order_str = ""
-        if sort_by and sort_direction:
-            order_str = f"$orderby={sort_by} {sort_direction}"
-
-        parts = [f"$top={top}"]
-        if filter_str:
-            parts.append(filter_str)
-        if order_str:
-            parts.append(order_str)
-
-        odata_query = "&".join(parts)
-        return self.dv.query("opportunities", odata_query)
+        filters = [
+            (REGION, region),
+            (STATE, status),
+            (OWNER, owner_id),
+            (MIN_REVENUE, min_revenue),
+            (MAX_REVENUE, max_revenue),
+            (CLOSE_DATE_START, est_close_date_start),
+            (CLOSE_DATE_END, est_close_date_end),
+        ]
+        await self.dv.metadata.validate("opportunities", query_columns(filters, sort_by))
+        odata_query = build_query(filters, None, sort_by, sort_direction, select_clause("opportunities", profile))
+        records, next_cursor = await self.dv.query_page("opportunities", odata_query, top, cursor)
+        return page(records, next_cursor)
     
-    def get_opportunity_account(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
+    async def get_opportunity_account(self, opportunity_id: str,
+                                      profile: ColumnProfile = "standard") -> Optional[Dict[str, Any]]:
         """
         Retrieves the parent account (company) record associated with a specific opportunity.
         Returns the account record or None if no account is linked.
+        profile picks the columns returned: compact, standard or full.
         """
-        odata_query = "$expand=parentaccountid"
-        opportunity = self.dv.retrieve("opportunities", opportunity_id, odata_query)
+        # only the key of the opportunity itself, it is just the way to the account
+        odata_query = f"$select=opportunityid&{expand_clause('parentaccountid', profile)}"
+        opportunity = await self.dv.retrieve("opportunities", opportunity_id, odata_query)
         if not opportunity or "parentaccountid" not in opportunity:
             return None
         return opportunity.get("parentaccountid")
 
-    def get_opportunity_contact(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
+    async def get_opportunity_contact(self, opportunity_id: str,
+                                      profile: ColumnProfile = "standard") -> Optional[Dict[str, Any]]:
         """
         Retrieves the primary contact (person) record associated with a specific opportunity.
         Returns the contact record or None if no contact is linked.
+        profile picks the columns returned: compact, standard or full.
         """
-        odata_query = "$expand=parentcontactid"
-        opportunity = self.dv.retrieve("opportunities", opportunity_id, odata_query)
+        # only the key of the opportunity itself, it is just the way to the contact
+        odata_query = f"$select=opportunityid&{expand_clause('parentcontactid', profile)}"
+        opportunity = await self.dv.retrieve("opportunities", opportunity_id, odata_query)
         if not opportunity or "parentcontactid" not in opportunity:
             return None
         return opportunity.get("parentcontactid")
 
-    def get_opportunity(self, opportunity_id: str) -> Dict[str, Any]:
-        """Retrieve a single opportunity by its ID."""
-        return self.dv.retrieve("opportunities", opportunity_id)
+    async def get_opportunity(self, opportunity_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single opportunity by its ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("opportunities", opportunity_id, select_clause("opportunities", profile))
+
+    async def list_opportunities_by_owner(self, user_id: str, profile: ColumnProfile = "standard") -> List[Dict[str, Any]]:
+        """
+        List opportunities owned by a specific user, based on user_id.
+        profile picks the columns returned: compact, standard or full.
+        """
+        odata_query = build_query([(OWNER, user_id)], select=select_clause("opportunities", profile))
+        return await self.dv.query("opportunities", odata_query)
 
-    def list_opportunities_by_owner(self, user_id: str) -> List[Dict[str, Any]]:
-        """List opportunities owned by a specific user, based on user_id."""
-        odata_query = f"$filter=_ownerid_value eq {user_id}"
-        return self.dv.query("opportunities", odata_query)
+    async def aggregate_opportunities(
+            self,
+            group_by: OpportunityGroupBy = "region",
+            status: Optional[Literal[0, 1, 2]] = None,
+            region: Optional[str] = None,
+            owner_id: Optional[str] = None,
+            close_date_start: Optional[str] = None,
+            close_date_end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Count opportunities and total their estimated revenue per group, computed by Dataverse in one request.
+        group_by is one of region, owner, business_unit, status, or close_month (by estimated close date).
+        Optional filters: status (0=open, 1=won, 2=lost), region (NAR, CALA, MEA, Europe, or APAC), owner_id,
+        and an estimated close date range (YYYY-MM-DD).
+        Returns one row per group with its count and total, largest total first (months in calendar order).
+        """
+        return await aggregate(self.dv, "opportunities", group_by,
+                               [(STATE, status), (REGION, region), (OWNER, owner_id)],
+                               close_date_start, close_date_end)
 
-    def inspect_opportunity_fields(self) -> List[str]:
-        """Return the columns for an opportunity record."""
-        records = self.dv.query("opportunities", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_opportunity_fields(self) -> List[str]:
+        """Return the columns for an opportunity record, from the cached table metadata."""
+        return await self.dv.metadata.columns("opportunities")
 
-def create_opportunities_plugin_server(dv_client: Any) -> FastMCP:
+def create_opportunities_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Opportunities 'plugin' server."""
-    opportunities_mcp = FastMCP(name="OpportunitiesPlugin")
+    opportunities_mcp = FastMCP(name="OpportunitiesPlugin", tool_serializer=dumps)
     plugin_logic = OpportunitiesPluginLogic(dv_client)
 
-    opportunities_mcp.tool(plugin_logic.list_opportunities)
-    opportunities_mcp.tool(plugin_logic.get_opportunity)
-    opportunities_mcp.tool(plugin_logic.get_opportunity_account)
-    opportunities_mcp.tool(plugin_logic.get_opportunity_contact)
-    opportunities_mcp.tool(plugin_logic.list_opportunities_by_owner)
-    opportunities_mcp.tool(plugin_logic.inspect_opportunity_fields)
+    opportunities_mcp.tool(executor.wrap(plugin_logic.list_opportunities))
+    opportunities_mcp.tool(executor.wrap(plugin_logic.get_opportunity))
+    opportunities_mcp.tool(executor.wrap(plugin_logic.get_opportunity_account))
+    opportunities_mcp.tool(executor.wrap(plugin_logic.get_opportunity_contact))
+    opportunities_mcp.tool(executor.wrap(plugin_logic.list_opportunities_by_owner))
+    opportunities_mcp.tool(executor.wrap(plugin_logic.aggregate_opportunities, slim=False))
+    opportunities_mcp.tool(executor.wrap(plugin_logic.inspect_opportunity_fields))
 
     return opportunities_mcp
@@ -1,38 +1,76 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Literal
 from fastmcp import FastMCP
 
+from aggregation import GroupBy, aggregate
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from odata import CUSTOMER, OWNER, STATE, build_query
+from paging import page
+
 class OrdersPluginLogic:
     """Contains the business logic for order-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_orders(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N orders from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("salesorders", odata_query)
+    async def list_orders(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List orders from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        records, next_cursor = await self.dv.query_page("salesorders", select_clause("salesorders", profile), top, cursor)
+        return page(records, next_cursor)
 
-    def get_order(self, order_number: str) -> Dict[str, Any]:
-        """Retrieve a single order by its order number."""
-        return self.dv.retrieve("salesorders", order_number)
+    async def get_order(self, order_number: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single order by its order number.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("salesorders", order_number, select_clause("salesorders", profile))
     
-    def get_orders_by_account(self, account_id: str) -> List[Dict[str, Any]]:
-        """Retrieve orders associated with a specific account ID."""
-        odata_query = f"$filter=_customerid_value eq {account_id}"
-        return self.dv.query("salesorders", odata_query)
+    async def get_orders_by_account(self, account_id: str, profile: ColumnProfile = "standard") -> List[Dict[str, Any]]:
+        """
+        Retrieve orders associated with a specific account ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        odata_query = build_query([(CUSTOMER, account_id)], select=select_clause("salesorders", profile))
+        return await self.dv.query("salesorders", odata_query)
+
+    async def aggregate_orders(
+            self,
+            group_by: GroupBy = "status",
+            status: Optional[Literal[0, 1, 2, 3, 4]] = None,
+            account_id: Optional[str] = None,
+            owner_id: Optional[str] = None,
+            fulfilled_date_start: Optional[str] = None,
+            fulfilled_date_end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Count orders and total their amounts per group, computed by Dataverse in one request.
+        group_by is one of owner, business_unit, status, or close_month (by fulfillment date).
+        Optional filters: status (0=Active, 1=Submitted, 2=Cancelled, 3=Fulfilled, 4=Invoiced), account_id,
+        owner_id, and a fulfillment date range (YYYY-MM-DD).
+        Returns one row per group with its count and total, largest total first (months in calendar order).
+        """
+        return await aggregate(self.dv, "salesorders", group_by,
+                               [(STATE, status), (CUSTOMER, account_id), (OWNER, owner_id)],
+                               fulfilled_date_start, fulfilled_date_end)
 
-    def inspect_order_fields(self) -> List[str]:
-        """Return the columns for an order record."""
-        records = self.dv.query("salesorders", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_order_fields(self) -> List[str]:
+        """Return the columns for an order record, from the cached table metadata."""
+        return await self.dv.metadata.columns("salesorders")
 
-def create_orders_plugin_server(dv_client: Any) -> FastMCP:
+def create_orders_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Orders 'plugin' server."""
-    orders_mcp = FastMCP(name="OrdersPlugin")
+    orders_mcp = FastMCP(name="OrdersPlugin", tool_serializer=dumps)
     plugin_logic = OrdersPluginLogic(dv_client)
 
-    orders_mcp.tool(plugin_logic.list_orders)
-    orders_mcp.tool(plugin_logic.get_order)
-    orders_mcp.tool(plugin_logic.get_orders_by_account)
-    orders_mcp.tool(plugin_logic.inspect_order_fields)
+    orders_mcp.tool(executor.wrap(plugin_logic.list_orders))
+    orders_mcp.tool(executor.wrap(plugin_logic.get_order))
+    orders_mcp.tool(executor.wrap(plugin_logic.get_orders_by_account))
+    orders_mcp.tool(executor.wrap(plugin_logic.aggregate_orders, slim=False))
+    orders_mcp.tool(executor.wrap(plugin_logic.inspect_order_fields))
 
     return orders_mcp
@@ -1,6 +1,28 @@
 from typing import List, Dict, Any, Optional, Literal
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from odata import STATE, Filter, build_query, literal, query_columns
+from paging import page
+
+MIN_PRICE = Filter("price", "ge", "number")
+MAX_PRICE = Filter("price", "le", "number")
+MIN_COST = Filter("currentcost", "ge", "number")
+MAX_COST = Filter("currentcost", "le", "number")
+PRODUCT_NUMBER = Filter("productnumber", "eq", "string")
+DETAILS_FIELDS = ["productid", "productnumber", "name", "description", "price",
+                  "standardcost", "quantityonhand", "stockvolume",
+                  "statecode", "cs_issalesenabled", "cs_productgroup",
+                  "cs_itemtype"]
+DETAILS_SELECT = f"$select={','.join(DETAILS_FIELDS)}"
+
+
+def product_details(record: Dict[str, Any]) -> Dict[str, Any]:
+    """The details columns of a product, with their annotations, whether it came from the replica or the API."""
+    return {key: value for key, value in record.items() if key.partition("@")[0] in DETAILS_FIELDS}
+
 
 class ProductsPluginLogic:
     """Contains the business logic for product-related operations."""
@@ -8,7 +30,7 @@ class ProductsPluginLogic:
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_products(
+    async def list_products(
         self,
         top: int = 5,
         status: Optional[Literal[0, 1, 2, 3]] = None,
@@ -17,48 +39,37 @@ class ProductsPluginLogic:
         min_current_cost: Optional[float] = None,
         max_current_cost: Optional[float] = None,
         sort_by: Optional[str] = None,
-        sort_direction: Optional[Literal["asc", "desc"]] = None
-    ) -> List[Dict[str, Any]]:
+        sort_direction: Optional[Literal["asc", "desc"]] = None,
+        profile: ColumnProfile = "standard",
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        List the top N products from Dataverse. Optional filter for status, pricing (how much product sells for), and sorting.
+        List products from Dataverse, top per page. Optional filter for status, pricing (how much product sells for), and sorting.
         Status must be a numeric code: 0 for active, 1 for retired, 2 for draft, 3 for under revision.
         If sort_by is provided, sort_direction must also be provided as 'asc' or 'desc'.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        filters = [
+            (STATE, status),
+            (MIN_PRICE, min_list_price),
+            (MAX_PRICE, max_list_price),
+            (MIN_COST, min_current_cost),
+            (MAX_COST, max_current_cost),
+        ]
+        await self.dv.metadata.validate("products", query_columns(filters, sort_by))
+        odata_query = build_query(filters, None, sort_by, sort_direction, select_clause("products", profile))
+        records, next_cursor = await self.dv.query_page("products", odata_query, top, cursor)
+        return page(records, next_cursor)
+
+    async def get_product(self, product_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single product by its ID.
+        profile picks the columns returned: compact, standard or full.
         """
-        # TODO: actual implementation
-        clauses = []
-        if status:
-            clauses.append(f"statecode eq {status}")
-        if min_list_price:
-            clauses.append(f"price ge {min_list_price}")
-        if max_list_price:
-            clauses.append(f"price le {max_list_price}")
-        if min_current_cost:
-            clauses.append(f"currentcost ge {min_current_cost}")
-        if max_current_cost:
-            clauses.append(f"currentcost le {max_current_cost}")
-
-        filter_str = ""
-        if clauses:
-            filter_str = "$filter=" + " and ".join(clauses)
-
-        order_str = ""
-        if sort_by and sort_direction:
-            order_str = f"$orderby={sort_by} {sort_direction}"
-
-        parts = [f"$top={top}"]
-        if filter_str:
-            parts.append(filter_str)
-        if order_str:
-            parts.append(order_str)
-
-        odata_query = "&".join(parts)
-        return self.dv.query("products", odata_query)
-
-    def get_product(self, product_id: str) -> Dict[str, Any]:
-        """Retrieve a single product by its ID."""
-        return self.dv.retrieve("products", product_id)
-
-    def get_product_details(
+        return await self.dv.lookup("products", product_id, profile)
+
+    async def get_product_details(
         self,
         product_id: Optional[str] = None,
         product_number: Optional[str] = None
@@ -68,28 +79,30 @@ class ProductsPluginLogic:
         Queriable by its unique ID (Dataverse GUID) OR by its product number (code within CommScope).
         """
 
-        select_fields = ["productnumber", "name", "description", "price",
-                         "standardcost", "quantityonhand", "stockvolume", 
-                         "statecode", "cs_issalesenabled", "cs_productgroup",
-                         "cs_itemtype"]
-        select_query = f"$select={','.join(select_fields)}"
-
         if not product_id and not product_number:
             raise ValueError(
                 "Either product_id or product_number must be provided.")
 
         elif product_id:
-            product_data = self.dv.retrieve(
-                "products", product_id, select_query)
-            return product_data
+            product_id = literal(product_id, "guid")
+            record = self.dv.replica.get("products", product_id)
+            if record is None:
+                record = await self.dv.retrieve("products", product_id, DETAILS_SELECT)
+            return product_details(record)
 
         elif product_number:
-            filter_query = f"$filter=productnumber eq '{product_number}'"
-            odata_query = f"{filter_query}&{select_query}"
-            results = self.dv.query("products", odata_query)
-            return results[0] if results else {}
-        
-    def search_products_by_name(
+            rows = self.dv.replica.rows("products")
+            if rows is not None:
+                # eq on a string is case-insensitive in Dataverse
+                match = next((row for row in rows
+                              if (row.get("productnumber") or "").lower() == product_number.lower()), None)
+            else:
+                odata_query = build_query([(PRODUCT_NUMBER, product_number)], select=DETAILS_SELECT)
+                results = await self.dv.query("products", odata_query)
+                match = results[0] if results else None
+            return product_details(match) if match else {}
+
+    async def search_products_by_name(
             self,
             search_query: str,
             top: int = 10
@@ -105,26 +118,25 @@ class ProductsPluginLogic:
             "top": top,
             "fuzzy": True
         }
-        response = self.dv.post(search_endpoint, payload)
+        response = await self.dv.post(search_endpoint, payload)
         # records = [item.get('@search.entity')
         #            for item in response.get('value', []) if item.get('@search.entity')]
         # return records
         return response
 
-    def inspect_product_fields(self) -> List[str]:
-        """Return the columns for a product record."""
-        records = self.dv.query("products", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_product_fields(self) -> List[str]:
+        """Return the columns for a product record, from the cached table metadata."""
+        return await self.dv.metadata.columns("products")
 
 
-def create_products_plugin_server(dv_client: Any) -> FastMCP:
+def create_products_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Products 'plugin' server."""
-    products_mcp = FastMCP(name="ProductsPlugin")
+    products_mcp = FastMCP(name="ProductsPlugin", tool_serializer=dumps)
     plugin_logic = ProductsPluginLogic(dv_client)
 
-    products_mcp.tool(plugin_logic.list_products)
-    products_mcp.tool(plugin_logic.get_product)
-    products_mcp.tool(plugin_logic.get_product_details)
-    products_mcp.tool(plugin_logic.inspect_product_fields)
+    products_mcp.tool(executor.wrap(plugin_logic.list_products))
+    products_mcp.tool(executor.wrap(plugin_logic.get_product))
+    products_mcp.tool(executor.wrap(plugin_logic.get_product_details))
+    products_mcp.tool(executor.wrap(plugin_logic.inspect_product_fields))
 
     return products_mcp
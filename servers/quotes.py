@@ -1,32 +1,67 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Literal
 from fastmcp import FastMCP
 
+from aggregation import GroupBy, aggregate
+from codec import dumps
+from columns import ColumnProfile, select_clause
+from executor import ToolExecutor
+from odata import CUSTOMER, OWNER, STATE
+from paging import page
+
 class QuotesPluginLogic:
     """Contains the business logic for quote-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_quotes(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N quotes from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("quotes", odata_query)
+    async def list_quotes(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List quotes from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        records, next_cursor = await self.dv.query_page("quotes", select_clause("quotes", profile), top, cursor)
+        return page(records, next_cursor)
+
+    async def get_quote(self, quote_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single quote by its ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.retrieve("quotes", quote_id, select_clause("quotes", profile))
 
-    def get_quote(self, quote_id: str) -> Dict[str, Any]:
-        """Retrieve a single quote by its ID."""
-        return self.dv.retrieve("quotes", quote_id)
+    async def aggregate_quotes(
+            self,
+            group_by: GroupBy = "status",
+            status: Optional[Literal[0, 1, 2, 3]] = None,
+            account_id: Optional[str] = None,
+            owner_id: Optional[str] = None,
+            closed_date_start: Optional[str] = None,
+            closed_date_end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Count quotes and total their amounts per group, computed by Dataverse in one request.
+        group_by is one of owner, business_unit, status, or close_month (by closed date).
+        Optional filters: status (0=Draft, 1=Active, 2=Won, 3=Closed), account_id, owner_id,
+        and a closed date range (YYYY-MM-DD).
+        Returns one row per group with its count and total, largest total first (months in calendar order).
+        """
+        return await aggregate(self.dv, "quotes", group_by,
+                               [(STATE, status), (CUSTOMER, account_id), (OWNER, owner_id)],
+                               closed_date_start, closed_date_end)
 
-    def inspect_quote_fields(self) -> List[str]:
-        """Return the columns for a quote record."""
-        records = self.dv.query("quotes", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_quote_fields(self) -> List[str]:
+        """Return the columns for a quote record, from the cached table metadata."""
+        return await self.dv.metadata.columns("quotes")
 
-def create_quotes_plugin_server(dv_client: Any) -> FastMCP:
+def create_quotes_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Quotes 'plugin' server."""
-    quotes_mcp = FastMCP(name="QuotesPlugin")
+    quotes_mcp = FastMCP(name="QuotesPlugin", tool_serializer=dumps)
     plugin_logic = QuotesPluginLogic(dv_client)
 
-    quotes_mcp.tool(plugin_logic.list_quotes)
-    quotes_mcp.tool(plugin_logic.get_quote)
-    quotes_mcp.tool(plugin_logic.inspect_quote_fields)
+    quotes_mcp.tool(executor.wrap(plugin_logic.list_quotes))
+    quotes_mcp.tool(executor.wrap(plugin_logic.get_quote))
+    quotes_mcp.tool(executor.wrap(plugin_logic.aggregate_quotes, slim=False))
+    quotes_mcp.tool(executor.wrap(plugin_logic.inspect_quote_fields))
 
     return quotes_mcp
@@ -1,32 +1,48 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, project, select_clause
+from executor import ToolExecutor
+from paging import cursor_source, page, slice_rows
+
 class TeamsPluginLogic:
     """Contains the business logic for team-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_teams(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N teams from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("teams", odata_query)
+    async def list_teams(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List teams from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        rows = self.dv.replica.rows("teams")
+        if rows is not None and cursor_source(cursor, "teams") in (None, "replica"):
+            rows, next_cursor = slice_rows("teams", rows, top, cursor, "replica")
+            return page([project("teams", row, profile) for row in rows], next_cursor)
+        records, next_cursor = await self.dv.query_page("teams", select_clause("teams", profile), top, cursor)
+        return page(records, next_cursor)
 
-    def get_team(self, team_id: str) -> Dict[str, Any]:
-        """Retrieve a single team by its team id."""
-        return self.dv.retrieve("teams", team_id)
+    async def get_team(self, team_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single team by its team id.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.lookup("teams", team_id, profile)
 
-    def inspect_team_fields(self) -> List[str]:
-        """Return the columns for an team record."""
-        records = self.dv.query("teams", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_team_fields(self) -> List[str]:
+        """Return the columns for an team record, from the cached table metadata."""
+        return await self.dv.metadata.columns("teams")
 
-def create_teams_plugin_server(dv_client: Any) -> FastMCP:
+def create_teams_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the teams 'plugin' server."""
-    teams_mcp = FastMCP(name="teamsPlugin")
+    teams_mcp = FastMCP(name="teamsPlugin", tool_serializer=dumps)
     plugin_logic = TeamsPluginLogic(dv_client)
 
-    teams_mcp.tool(plugin_logic.list_teams)
-    teams_mcp.tool(plugin_logic.get_team)
-    teams_mcp.tool(plugin_logic.inspect_team_fields)
+    teams_mcp.tool(executor.wrap(plugin_logic.list_teams))
+    teams_mcp.tool(executor.wrap(plugin_logic.get_team))
+    teams_mcp.tool(executor.wrap(plugin_logic.inspect_team_fields))
 
     return teams_mcp
@@ -1,49 +1,87 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastmcp import FastMCP
 
+from codec import dumps
+from columns import ColumnProfile, project, select_clause
+from executor import ToolExecutor
+from odata import Filter, build_query, literal
+from paging import cursor_source, page, slice_rows
+
+FULLNAME_CONTAINS = Filter("fullname", "contains", "string")
+MANAGER = Filter("_parentsystemuserid_value", "eq", "guid")
+
 class UsersPluginLogic:
     """Contains the business logic for user-related operations."""
     def __init__(self, dv_client: Any):
         self.dv = dv_client
 
-    def list_users(self, top: int = 5) -> List[Dict[str, Any]]:
-        """List the top N users from Dataverse."""
-        odata_query = f"$top={top}"
-        return self.dv.query("systemusers", odata_query)
+    async def list_users(self, top: int = 5, profile: ColumnProfile = "standard",
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        List users from Dataverse, top per page.
+        profile picks the columns returned: compact, standard or full.
+        Returns {"records": [...], "next_cursor": ...}; pass next_cursor back as cursor (with the same arguments) for the next page.
+        """
+        rows = self.dv.replica.rows("systemusers")
+        if rows is not None and cursor_source(cursor, "systemusers") in (None, "replica"):
+            rows, next_cursor = slice_rows("systemusers", rows, top, cursor, "replica")
+            return page([project("systemusers", row, profile) for row in rows], next_cursor)
+        records, next_cursor = await self.dv.query_page("systemusers", select_clause("systemusers", profile), top, cursor)
+        return page(records, next_cursor)
 
-    def get_user(self, user_id: str) -> Dict[str, Any]:
-        """Retrieve a single user by their GUID."""
-        return self.dv.retrieve("systemusers", user_id)
+    async def get_user(self, user_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a single user by their GUID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.lookup("systemusers", user_id, profile)
 
-    def get_users_by_name(self, name: str) -> List[Dict[str, Any]]:
-        """Retrieve users by at least a substring of their name."""
-        odata_query = f"$filter=contains(fullname, '{name}')"
-        return self.dv.query("systemusers", odata_query)
+    async def get_users_by_name(self, name: str, profile: ColumnProfile = "standard") -> List[Dict[str, Any]]:
+        """
+        Retrieve users by at least a substring of their name.
+        profile picks the columns returned: compact, standard or full.
+        """
+        rows = self.dv.replica.rows("systemusers")
+        if rows is not None:
+            return [project("systemusers", row, profile) for row in rows
+                    if name.lower() in (row.get("fullname") or "").lower()]
+        odata_query = build_query([(FULLNAME_CONTAINS, name)], select=select_clause("systemusers", profile))
+        return await self.dv.query("systemusers", odata_query)
 
-    def get_direct_reports(self, manager: str) -> List[Dict[str, Any]]:
-        """Retrieve users who report directly to a specified manager, based on manager GUID."""
-        odata_query = f"$filter=_parentsystemuserid_value eq '{manager}'"
-        return self.dv.query("systemusers", odata_query)
+    async def get_direct_reports(self, manager: str, profile: ColumnProfile = "standard") -> List[Dict[str, Any]]:
+        """
+        Retrieve users who report directly to a specified manager, based on manager GUID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        manager = literal(manager, "guid")
+        rows = self.dv.replica.rows("systemusers")
+        if rows is not None:
+            return [project("systemusers", row, profile) for row in rows
+                    if (row.get("_parentsystemuserid_value") or "").lower() == manager]
+        odata_query = build_query([(MANAGER, manager)], select=select_clause("systemusers", profile))
+        return await self.dv.query("systemusers", odata_query)
 
-    def get_business_unit_by_id(self, business_unit_id: str) -> Dict[str, Any]:
-        """Retrieve a business unit by its ID."""
-        return self.dv.retrieve("businessunits", business_unit_id)
+    async def get_business_unit_by_id(self, business_unit_id: str, profile: ColumnProfile = "standard") -> Dict[str, Any]:
+        """
+        Retrieve a business unit by its ID.
+        profile picks the columns returned: compact, standard or full.
+        """
+        return await self.dv.lookup("businessunits", business_unit_id, profile)
 
-    def inspect_user_fields(self) -> List[str]:
-        """Return the columns for a user record."""
-        records = self.dv.query("systemusers", "$top=1")
-        return list(records[0].keys()) if records else []
+    async def inspect_user_fields(self) -> List[str]:
+        """Return the columns for a user record, from the cached table metadata."""
+        return await self.dv.metadata.columns("systemusers")
 
-def create_users_plugin_server(dv_client: Any) -> FastMCP:
+def create_users_plugin_server(dv_client: Any, executor: ToolExecutor) -> FastMCP:
     """Factory function to create and configure the Users 'plugin' server."""
-    users_mcp = FastMCP(name="UsersPlugin")
+    users_mcp = FastMCP(name="UsersPlugin", tool_serializer=dumps)
     plugin_logic = UsersPluginLogic(dv_client)
 
-    users_mcp.tool(plugin_logic.list_users)
-    users_mcp.tool(plugin_logic.get_user)
-    users_mcp.tool(plugin_logic.get_users_by_name)
-    users_mcp.tool(plugin_logic.get_direct_reports)
-    users_mcp.tool(plugin_logic.get_business_unit_by_id)
-    users_mcp.tool(plugin_logic.inspect_user_fields)
+    users_mcp.tool(executor.wrap(plugin_logic.list_users))
+    users_mcp.tool(executor.wrap(plugin_logic.get_user))
+    users_mcp.tool(executor.wrap(plugin_logic.get_users_by_name))
+    users_mcp.tool(executor.wrap(plugin_logic.get_direct_reports))
+    users_mcp.tool(executor.wrap(plugin_logic.get_business_unit_by_id))
+    users_mcp.tool(executor.wrap(plugin_logic.inspect_user_fields))
 
     return users_mcp
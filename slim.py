@@ -0,0 +1,138 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from codec import dumps
+
+FORMATTED_VALUE = "@OData.Community.Display.V1.FormattedValue"
+LOOKUP = re.compile(r"^_(\w+)_value$")
+
+SLIM_RESULTS = os.getenv("SLIM_RESULTS", "1").lower() not in ("0", "false", "no")
+# largest tool result in bytes of JSON, for tools without their own budget; 0 means no limit
+DEFAULT_BUDGET = int(os.getenv("TOOL_RESULT_MAX_BYTES", "100000"))
+
+
+def parse_budgets(spec: Optional[str]) -> Dict[str, int]:
+    """Parse "list_opportunities=200000,get_account=20000" into per-tool byte budgets."""
+    budgets = {}
+    for item in (spec or "").split(","):
+        tool, _, size = item.partition("=")
+        if tool.strip() and size.strip():
+            budgets[tool.strip()] = int(size)
+    return budgets
+
+
+def _keep_label(raw: Any, label: Any) -> bool:
+    # option set and two-option labels; money, number and date formatting repeats the raw value
+    return isinstance(raw, (int, bool)) and isinstance(label, str) and any(c.isalpha() for c in label)
+
+
+def slim_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A record without nulls and OData annotations. Formatted values are kept where they add
+    something: the name of a lookup as <lookup>_name, the label of an option set as <column>_label.
+    """
+    slim = {}
+    for key, value in record.items():
+        if "@" in key:
+            column, _, annotation = key.partition("@")
+            if "@" + annotation != FORMATTED_VALUE or not column:
+                continue
+            lookup = LOOKUP.match(column)
+            if lookup:
+                slim[f"{lookup.group(1)}_name"] = value
+            elif _keep_label(record.get(column), value):
+                slim[f"{column}_label"] = value
+        elif value is not None:
+            slim[key] = slim_value(value)
+    return slim
+
+
+def slim_value(value: Any) -> Any:
+    """
+    Slim the records in a tool result: the items of a list, of a "records" or "value" envelope,
+    or a single record. Envelope keys such as next_cursor are kept as they are, nulls included.
+    Search results are unwrapped to their entities.
+    """
+    if isinstance(value, list):
+        return [slim_record(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        items = value.get("value")
+        if isinstance(items, list) and any(isinstance(item, dict) and "@search.entity" in item for item in items):
+            return [slim_record(item["@search.entity"]) for item in items if isinstance(item, dict) and item.get("@search.entity")]
+        for key in ("records", "value"):
+            if isinstance(value.get(key), list):
+                return {k: slim_value(item) if k == key else item for k, item in value.items() if "@" not in k}
+        return slim_record(value)
+    return value
+
+
+def _size(value: Any) -> int:
+    return len(dumps(value).encode())
+
+
+def enforce_budget(tool: str, value: Any, budget: int, size: Optional[int] = None) -> Any:
+    """
+    Cut a result down to budget bytes of JSON. Lists keep their leading items and end with a
+    {"_truncated": ...} marker, dicts keep their leading keys plus a "_truncated" key, and long
+    strings are cut with a note of how much was dropped. A page of a list tool has its records
+    cut like a list, keeping its next_cursor. size is the value's encoded size, when known;
+    items are only measured one by one when the value is over budget.
+    """
+    if budget <= 0 or (_size(value) if size is None else size) <= budget:
+        return value
+    note = f"Result of {tool} exceeded {budget} bytes; narrow the query (filters, top, profile) to see the rest."
+    if isinstance(value, list):
+        kept: List[Any] = []
+        used = 200  # room for the marker
+        for item in value:
+            used += _size(item) + 1
+            if used > budget:
+                break
+            kept.append(item)
+        return kept + [{"_truncated": True, "returned": len(kept), "total": len(value), "message": note}]
+    if isinstance(value, dict) and isinstance(value.get("records"), list):
+        rest = {key: item for key, item in value.items() if key != "records"}
+        return {**value, "records": enforce_budget(tool, value["records"], max(budget - _size(rest), 1))}
+    if isinstance(value, dict):
+        trimmed: Dict[str, Any] = {}
+        used = 200
+        for key, item in value.items():
+            used += _size(key) + _size(item) + 2
+            if used > budget:
+                break
+            trimmed[key] = item
+        trimmed["_truncated"] = {"returned_keys": len(trimmed), "total_keys": len(value), "message": note}
+        return trimmed
+    if isinstance(value, str):
+        cut = value.encode()[:max(budget - 100, 0)].decode(errors="ignore")
+        return f"{cut}... [truncated {len(value) - len(cut)} characters]"
+    return value
+
+
+class ResultShaper:
+    """Post-processing of tool results: slimming, then the tool's byte budget."""
+
+    def __init__(self, slim: bool = SLIM_RESULTS, default_budget: int = DEFAULT_BUDGET,
+                 budgets: Optional[Dict[str, int]] = None):
+        self.slim = slim
+        self.default_budget = default_budget
+        self.budgets = parse_budgets(os.getenv("TOOL_RESULT_BUDGETS")) if budgets is None else budgets
+        self.truncated = 0
+
+    def shape(self, tool: str, result: Any, slim: bool = True) -> Tuple[Any, str]:
+        """
+        Slim (unless the tool opted out) and budget one result. Returns it with its JSON text,
+        which is what gets measured and sent: a result under budget is encoded only once.
+        Strings are sent as they are.
+        """
+        shaped = slim_value(result) if self.slim and slim and not isinstance(result, str) else result
+        text = shaped if isinstance(shaped, str) else dumps(shaped)
+        budgeted = enforce_budget(tool, shaped, self.budgets.get(tool, self.default_budget), len(text.encode()))
+        if budgeted is not shaped:
+            self.truncated += 1
+            text = budgeted if isinstance(budgeted, str) else dumps(budgeted)
+        return budgeted, text
+
+    def stats(self) -> Dict[str, Any]:
+        return {"slim": self.slim, "default_budget": self.default_budget, "truncated": self.truncated}
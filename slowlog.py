@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from codec import dumps
+
+logger = logging.getLogger(__name__)
+
+# Dataverse calls slower than this are logged; 0 logs every call
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "1000"))
+# JSON lines file next to server.log; empty keeps the log in memory only
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow-queries.jsonl")
+# the file is rotated to <name>.1 beyond this size
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+# latest entries kept in memory for /admin/slow-queries
+SLOW_QUERY_KEEP = 200
+
+
+class SlowQueryLog:
+    """
+    Structured log of slow Dataverse calls, one JSON object per line. The latest entries are
+    also kept in memory for the admin route. record is called on the event loop, so lines are
+    queued and appended to the file from a worker thread.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, path: Optional[str] = SLOW_QUERY_LOG or None,
+                 max_bytes: int = SLOW_QUERY_LOG_MAX_BYTES, keep: int = SLOW_QUERY_KEEP):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.max_bytes = max_bytes
+        self.recent: deque = deque(maxlen=keep)
+        self.logged = 0
+        self._pending: List[str] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._writing = False
+        self._lock = threading.Lock()
+
+    def slow(self, elapsed_ms: float) -> bool:
+        return elapsed_ms >= self.threshold_ms
+
+    def record(self, entry: Dict[str, Any]):
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), **entry}
+        with self._lock:
+            self.recent.append(entry)
+            self.logged += 1
+            if self.path is None:
+                return
+            self._pending.append(dumps(entry) + "\n")
+            if self._writing:
+                # the running writer picks the line up before it stops
+                return
+            self._writing = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop to keep free, write now
+            self._write()
+            return
+        self._writer = loop.create_task(asyncio.to_thread(self._write))
+
+    def _write(self):
+        """Append queued lines until none are left."""
+        while True:
+            with self._lock:
+                lines, self._pending = self._pending, []
+                if not lines:
+                    self._writing = False
+                    return
+            try:
+                if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            except OSError as e:
+                logger.warning("Can't write the slow query log %s: %s", self.path, e)
+
+    async def flush(self):
+        """Wait for queued lines to reach the file."""
+        if self._writer is not None and not self._writer.done():
+            await self._writer
+
+    def entries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """The latest slow calls, newest first."""
+        return list(self.recent)[::-1][:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"threshold_ms": self.threshold_ms, "path": self.path, "logged": self.logged}
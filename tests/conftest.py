@@ -0,0 +1,31 @@
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from azure.core.credentials import AccessToken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import TokenProvider  # noqa: E402
+from config import DataverseClient  # noqa: E402
+
+BASE_URL = "https://org.crm.dynamics.com/api/data/v9.2"
+
+
+class StaticCredential:
+    def get_token(self, *scopes, **kwargs):
+        return AccessToken("token", int(time.time()) + 3600)
+
+
+@pytest.fixture
+def make_client():
+    """A DataverseClient whose requests go to handler instead of the network."""
+    def make(handler, **kwargs) -> DataverseClient:
+        client = DataverseClient(BASE_URL, {"Accept": "application/json"},
+                                 TokenProvider(StaticCredential(), "https://org/.default"), **kwargs)
+        client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler), auth=client.http.auth)
+        client.replica.tables = {}
+        return client
+    return make
@@ -0,0 +1,30 @@
+import asyncio
+
+import httpx
+import pytest
+
+import fastmcp_server
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(fastmcp_server, "ADMIN_TOKEN", "secret")
+
+    async def get(path):
+        transport = httpx.ASGITransport(app=fastmcp_server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={"Authorization": "Bearer secret"})
+    return lambda path: asyncio.run(get(path))
+
+
+@pytest.mark.parametrize("limit", ["abc", "-1", "0"])
+def test_invalid_slow_query_limits_are_rejected(admin, limit):
+    resp = admin(f"/admin/slow-queries?limit={limit}")
+    assert resp.status_code == 400
+    assert "limit" in resp.json()["error"]
+
+
+def test_slow_queries_need_the_admin_token(admin, monkeypatch):
+    assert admin("/admin/slow-queries?limit=10").json() == {"slow_queries": []}
+    monkeypatch.setattr(fastmcp_server, "ADMIN_TOKEN", "")
+    assert admin("/admin/slow-queries").status_code == 404
@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from aggregation import GROUP_COLUMNS, aggregate, apply_query
+from odata import REGION, STATE
+
+
+def test_apply_query_filters_then_groups():
+    assert apply_query("statecode", "totalamount", [(STATE, 0), (REGION, None)]) == (
+        "$apply=filter(statecode eq 0)/groupby((statecode),aggregate($count as count,totalamount with sum as total))")
+
+
+def test_region_is_only_offered_where_the_column_exists():
+    assert "region" in GROUP_COLUMNS["opportunities"]
+    for table in ("salesorders", "quotes", "invoices"):
+        assert "region" not in GROUP_COLUMNS[table]
+        with pytest.raises(ValueError, match="for " + table):
+            asyncio.run(aggregate(None, table, "region"))
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from azure.core.credentials import AccessToken
+
+from auth import TokenProvider
+
+
+class ExpiringCredential:
+    """Hands back the same token, already inside the refresh margin, on every call."""
+
+    def __init__(self, seconds_left: int):
+        self.token = AccessToken("token", int(time.time()) + seconds_left)
+        self.calls = 0
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        return self.token
+
+
+def test_refresh_loop_does_not_spin_on_a_token_that_does_not_advance():
+    credential = ExpiringCredential(120)
+    provider = TokenProvider(credential, "https://org/.default")
+
+    async def run():
+        await provider.start()
+        await asyncio.sleep(0.3)
+        await provider.stop()
+
+    asyncio.run(run())
+    # the first fetch, then one refresh because the token is inside the margin, then a wait
+    assert credential.calls == 2
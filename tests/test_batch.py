@@ -0,0 +1,80 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+
+from batch import decode_batch, encode_batch
+from config import DataverseError
+from odata import REGION, build_query
+from tests.conftest import BASE_URL
+
+
+def response_body(boundary, parts):
+    """A $batch response with one part per (status line, JSON body)."""
+    blocks = []
+    for status, body in parts:
+        blocks += [f"--{boundary}", "Content-Type: application/http", "Content-Transfer-Encoding: binary", "",
+                   f"HTTP/1.1 {status}", "Content-Type: application/json; odata.metadata=minimal", "", body]
+    return "\r\n".join(blocks + [f"--{boundary}--", ""])
+
+
+def test_encode_writes_one_get_per_url():
+    query = build_query([(REGION, "CS#1&2")], top=5)
+    content_type, body = encode_batch([f"{BASE_URL}/accounts?{query}", f"{BASE_URL}/accounts(1)"])
+    boundary = content_type.split("boundary=")[1]
+    text = body.decode()
+    assert text.count(f"--{boundary}\r\n") == 2
+    assert text.endswith(f"--{boundary}--\r\n")
+    assert (f"GET {BASE_URL}/accounts?$filter=cs_accountsalesregion%20eq%20'CS%231%262'&$top=5 HTTP/1.1"
+            in text.split("\r\n"))
+    assert f"GET {BASE_URL}/accounts(1) HTTP/1.1" in text.split("\r\n")
+
+
+def test_decode_returns_parts_in_order():
+    body = response_body("batchresponse_1", [("200 OK", '{"value": [{"name": "a"}]}'),
+                                             ("404 Not Found", '{"error": {"code": "0x1", "message": "gone"}}'),
+                                             ("204 No Content", "")])
+    parts = decode_batch("multipart/mixed; boundary=batchresponse_1", body)
+    assert [part.status_code for part in parts] == [200, 404, 204]
+    assert parts[0].body == {"value": [{"name": "a"}]}
+    assert parts[0].headers["content-type"].startswith("application/json")
+    assert not parts[1].ok and parts[1].body["error"]["message"] == "gone"
+    assert parts[2].body is None
+
+
+def test_decode_flattens_change_sets():
+    inner = response_body("changesetresponse_1", [("200 OK", '{"n": 1}'), ("200 OK", '{"n": 2}')])
+    body = (f"--batchresponse_1\r\nContent-Type: multipart/mixed; boundary=changesetresponse_1\r\n\r\n{inner}"
+            "--batchresponse_1--\r\n")
+    parts = decode_batch('multipart/mixed; boundary="batchresponse_1"', body)
+    assert [part.body for part in parts] == [{"n": 1}, {"n": 2}]
+
+
+def test_decode_needs_a_boundary():
+    with pytest.raises(ValueError):
+        decode_batch("multipart/mixed", "")
+
+
+def test_client_batch_round_trip(make_client):
+    def handler(request):
+        assert request.url.path.endswith("/$batch")
+        urls = re.findall(r"^GET (\S+) HTTP/1.1", request.content.decode(), re.MULTILINE)
+        assert len(urls) == 2
+        body = response_body("batchresponse_x", [("200 OK", '{"value": [{"name": "a"}]}'),
+                                                 ("404 Not Found", '{"error": {"code": "0x1", "message": "gone"}}')])
+        return httpx.Response(200, text=body, headers={"Content-Type": "multipart/mixed; boundary=batchresponse_x"})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            results = await client.batch([("accounts", "$top=1"), ("accounts(1)", "")], return_exceptions=True)
+            with pytest.raises(DataverseError):
+                await client.batch([("accounts", "$top=1"), ("accounts(1)", "")])
+        finally:
+            await client.aclose()
+        return results
+
+    records, missing = asyncio.run(run())
+    assert records == [{"name": "a"}]
+    assert isinstance(missing, DataverseError)
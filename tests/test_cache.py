@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+
+import cache
+from cache import FRESH, STALE, EtagStore, ResponseCache, parse_ttls
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttls_are_parsed_on_top_of_the_defaults():
+    ttls = parse_ttls("products=60, accounts=30,teams=0")
+    assert ttls["products"] == 60 and ttls["accounts"] == 30 and ttls["businessunits"] == 3600
+    assert "teams" not in ttls
+
+
+def test_entries_go_fresh_then_stale_then_expired(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    responses = ResponseCache(ttls={"products": 10}, stale_seconds=5)
+    responses.set("products", ("query", "products"), ["p"], 100)
+    responses.set("accounts", ("query", "accounts"), ["a"], 100)
+    assert responses.get(("query", "accounts")) == (None, None)
+    assert responses.get(("query", "products")) == (["p"], FRESH)
+    clock.now += 12
+    assert responses.get(("query", "products")) == (["p"], STALE)
+    clock.now += 5
+    assert responses.get(("query", "products")) == (None, None)
+    # still there as a last resort
+    assert responses.last_known(("query", "products")) == ["p"]
+    assert responses.stats()["stale_hits"] == 1 and responses.stats()["misses"] == 2
+
+
+def test_eviction_is_by_bytes_least_recently_used_first():
+    responses = ResponseCache(max_bytes=250, ttls={"products": 60})
+    for name in "abc":
+        responses.set("products", ("query", "products", name), name, 100)
+        if name == "b":
+            responses.get(("query", "products", "a"))
+    assert responses.get(("query", "products", "b")) == (None, None)
+    assert responses.get(("query", "products", "a"))[0] == "a"
+    assert responses.bytes == 200 and responses.evictions == 1
+    responses.set("products", ("query", "products", "huge"), "huge", 300)
+    assert responses.bytes == 200
+    responses.invalidate("products")
+    assert responses.bytes == 0 and responses.stats()["entries"] == 0
+
+
+def test_etag_store_is_bounded_by_bytes():
+    etags = EtagStore(max_bytes=150)
+    etags.set(("accounts", "1"), 'W/"1"', {"n": 1}, 100)
+    etags.set(("accounts", "2"), 'W/"2"', {"n": 2}, 100)
+    assert etags.get(("accounts", "1")) is None
+    assert etags.get(("accounts", "2")) == ('W/"2"', {"n": 2}, 100) and etags.bytes == 100
+
+
+def test_stale_reads_are_served_and_refreshed_in_the_background(make_client):
+    version = [0]
+
+    async def handler(request):
+        version[0] += 1
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"value": [{"version": version[0]}]})
+
+    async def main():
+        client = make_client(handler)
+        client.cache = ResponseCache(ttls={"products": 0.01}, stale_seconds=60)
+        try:
+            assert await client.query("products", "$select=name") == [{"version": 1}]
+            await asyncio.sleep(0.02)
+            # stale: answered from the cache at once, refreshed behind it
+            assert await client.query("products", "$select=name") == [{"version": 1}]
+            assert client.cache.stale_hits == 1
+            await asyncio.sleep(0.1)
+            assert version[0] == 2
+            assert client.cache.get(("query", "products", "$select=name", None)) == ([{"version": 2}], STALE)
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
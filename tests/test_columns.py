@@ -0,0 +1,41 @@
+import asyncio
+
+import httpx
+
+from columns import PayloadStats, expand_clause, select_clause
+from servers.opportunities import OpportunitiesPluginLogic
+
+
+def test_expand_applies_the_related_profile():
+    assert expand_clause("parentaccountid", "compact") == \
+        "$expand=parentaccountid(" + select_clause("accounts", "compact") + ")"
+    assert expand_clause("parentcontactid", "full") == "$expand=parentcontactid"
+
+
+def test_expanded_bytes_count_towards_the_related_table():
+    stats = PayloadStats()
+    stats.record("opportunities", "opportunityid", 100, expand=expand_clause("parentaccountid", "standard")[len("$expand="):])
+    stats.record("opportunities", "opportunityid", 50, expand="parentaccountid")
+    assert stats.stats()["accounts"]["standard"]["bytes"] == 100
+    assert stats.stats()["opportunities"]["custom"]["bytes"] == 50
+
+
+def test_opportunity_account_selects_only_what_it_returns(make_client):
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.params)
+        return httpx.Response(200, json={"opportunityid": "o", "parentaccountid": {"accountid": "a", "name": "Acme"}})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            return await OpportunitiesPluginLogic(client).get_opportunity_account("o"), client.payloads.stats()
+        finally:
+            await client.aclose()
+
+    account, payloads = asyncio.run(run())
+    assert account == {"accountid": "a", "name": "Acme"}
+    assert seen[0]["$select"] == "opportunityid"
+    assert seen[0]["$expand"] == "parentaccountid(" + select_clause("accounts") + ")"
+    assert payloads["accounts"]["standard"]["responses"] == 1
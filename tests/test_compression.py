@@ -0,0 +1,31 @@
+import asyncio
+import zlib
+
+from compression import CompressionMiddleware
+
+
+def event_stream_app(events):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        for i, event in enumerate(events):
+            await send({"type": "http.response.body", "body": event, "more_body": i < len(events) - 1})
+    return app
+
+
+def test_event_streams_are_compressed_and_keep_streaming():
+    events = [b"event: message\ndata: " + b'{"result": "' + b"x" * 2000 + b'"}\n\n', b""]
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(event_stream_app(events))(scope, None, send))
+
+    assert (b"content-encoding", b"gzip") in sent[0]["headers"]
+    first = sent[1]["body"]
+    # the first event can be decoded before the stream ends
+    assert zlib.decompressobj(31).decompress(first) == events[0]
+    assert len(first) < len(events[0])
+    assert zlib.decompress(b"".join(m["body"] for m in sent[1:]), 31) == events[0]
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import re
+import uuid
+from urllib.parse import unquote
+
+import httpx
+
+from servers.accounts import EMPTY_DEAL_SUMMARY, AccountsPluginLogic
+from tests.test_batch import response_body
+
+ACCOUNTS = [str(uuid.UUID(int=i)) for i in range(1, 131)]
+
+
+def grouped_rows(query: str):
+    """What Dataverse would answer for a deal summary query: two open deals and one won per account."""
+    rows = []
+    for account_id in re.findall(r"_parentaccountid_value eq ([0-9a-f-]{36})", query):
+        rows.append({"_parentaccountid_value": account_id, "statecode": 0, "deal_count": 2,
+                     "estimated": 100.0, "actual": None})
+        rows.append({"_parentaccountid_value": account_id, "statecode": 1, "deal_count": 1,
+                     "estimated": 50.0, "actual": 40.0})
+    return rows
+
+
+class FakeDataverse:
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if request.url.path.endswith("/$batch"):
+            urls = re.findall(r"^GET (\S+) HTTP/1.1", request.content.decode(), re.MULTILINE)
+            parts = [("200 OK", json.dumps({"value": grouped_rows(unquote(url))})) for url in urls]
+            return httpx.Response(200, text=response_body("batchresponse_d", parts),
+                                  headers={"Content-Type": "multipart/mixed; boundary=batchresponse_d"})
+        return httpx.Response(200, json={"value": grouped_rows(unquote(str(request.url)))})
+
+
+def run(make_client, account_ids):
+    fake = FakeDataverse()
+
+    async def main():
+        client = make_client(fake)
+        try:
+            return await AccountsPluginLogic(client).get_account_deal_summaries(account_ids)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main()), fake.requests
+
+
+def test_one_account_is_one_grouped_query(make_client):
+    summaries, requests = run(make_client, [ACCOUNTS[0].upper()])
+    assert len(requests) == 1 and "$apply" in requests[0].url.params
+    assert summaries == {ACCOUNTS[0]: dict(EMPTY_DEAL_SUMMARY, open_deal_count=2, open_revenue=100.0,
+                                           won_deal_count=1, won_revenue=40.0)}
+
+
+def test_long_id_lists_are_chunked_into_one_batch(make_client):
+    summaries, requests = run(make_client, ACCOUNTS + ACCOUNTS[:3])
+    assert len(requests) == 1 and requests[0].url.path.endswith("/$batch")
+    body = requests[0].content.decode()
+    # duplicates dropped, then split at ODATA_MAX_FILTER_LENGTH
+    assert body.count("GET ") == 3
+    # every part's rows are merged back under their account
+    assert list(summaries) == ACCOUNTS
+    assert all(summary["open_deal_count"] == 2 and summary["won_revenue"] == 40.0 and summary["lost_deal_count"] == 0
+               for summary in summaries.values())
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from fastmcp import FastMCP
+
+from codec import dumps
+from executor import ToolExecutor
+from slim import ResultShaper
+
+
+class SamplePluginLogic:
+    async def get_record(self) -> Dict[str, Any]:
+        return {"name": "a", "fax": None}
+
+    async def list_records(self) -> List[Dict[str, Any]]:
+        return [{"name": "a"}, {"name": "b"}]
+
+    async def find_record(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def describe(self) -> str:
+        return "plain text"
+
+
+def run_tools(register):
+    server = FastMCP(name="SamplePlugin", tool_serializer=dumps)
+    logic = SamplePluginLogic()
+    for fn in (logic.get_record, logic.list_records, logic.find_record, logic.describe):
+        server.tool(register(fn))
+
+    async def run():
+        tools = await server.get_tools()
+        return {name: await tool.run({}) for name, tool in tools.items()}
+    return asyncio.run(run())
+
+
+def test_results_match_what_fastmcp_builds():
+    executor = ToolExecutor(shaper=ResultShaper(slim=False))
+    try:
+        wrapped = run_tools(executor.wrap)
+    finally:
+        executor.shutdown()
+    plain = run_tools(lambda fn: fn)
+    for name, result in plain.items():
+        assert wrapped[name].content == result.content, name
+        assert wrapped[name].structured_content == result.structured_content, name
+
+
+def test_results_are_slimmed():
+    executor = ToolExecutor()
+    try:
+        result = run_tools(executor.wrap)["get_record"]
+    finally:
+        executor.shutdown()
+    assert result.content[0].text == '{"name":"a"}'
+    assert result.structured_content == {"name": "a"}
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from metadata import MetadataService, MetadataUnavailable, UnknownColumn
+from tests.test_batch import response_body
+
+ATTRIBUTES = [
+    {"LogicalName": "name", "AttributeType": "String"},
+    {"LogicalName": "statecode", "AttributeType": "State"},
+    {"LogicalName": "ownerid", "AttributeType": "Owner"},
+    {"LogicalName": "owneridname", "AttributeType": "String", "AttributeOf": "ownerid"},
+    {"LogicalName": "entityimage", "AttributeType": "Virtual"},
+    {"LogicalName": "secret", "AttributeType": "String", "IsValidForRead": False},
+]
+STATES = [{"LogicalName": "statecode", "OptionSet": {"Options": [
+    {"Value": 0, "Label": {"UserLocalizedLabel": {"Label": "Active"}}},
+    {"Value": 1, "Label": {"UserLocalizedLabel": {"Label": "Inactive"}}}]}}]
+PICKLISTS = [{"LogicalName": "industrycode", "OptionSet": {"Options": [
+    {"Value": 1, "Label": {"UserLocalizedLabel": {"Label": "Accounting"}}},
+    {"Value": 2, "Label": {"UserLocalizedLabel": None}}]}}]
+
+
+class FakeDataverse:
+    """Answers RetrieveVersion, EntitySetName lookups and the EntityDefinitions $batch, and counts the calls."""
+
+    def __init__(self):
+        self.version = "9.2.1"
+        self.version_ok = True
+        self.batch_ok = True
+        self.attributes = ATTRIBUTES
+        self.calls = {"version": 0, "batch": 0}
+
+    def __call__(self, request):
+        if request.url.path.endswith("RetrieveVersion()"):
+            self.calls["version"] += 1
+            return httpx.Response(200 if self.version_ok else 500, json={"Version": self.version})
+        if request.url.path.endswith("/EntityDefinitions"):
+            known = "EntitySetName eq 'cs_regions'" in request.url.params["$filter"]
+            return httpx.Response(200, json={"value": [{"LogicalName": "cs_region"}] if known else []})
+        self.calls["batch"] += 1
+        if not self.batch_ok:
+            return httpx.Response(500)
+        parts = [("200 OK", json.dumps({"value": self.attributes})), ("200 OK", json.dumps({"value": PICKLISTS})),
+                 ("200 OK", json.dumps({"value": STATES})), ("200 OK", json.dumps({"value": []}))]
+        return httpx.Response(200, text=response_body("batchresponse_m", parts),
+                              headers={"Content-Type": "multipart/mixed; boundary=batchresponse_m"})
+
+
+@pytest.fixture
+def service(make_client, tmp_path):
+    fake = FakeDataverse()
+    client = make_client(fake)
+    client.metadata = MetadataService(client, cache_dir=tmp_path)
+    yield client.metadata, fake
+    asyncio.run(client.aclose())
+
+
+def test_attributes_are_parsed(service):
+    meta, _ = service
+    assert asyncio.run(meta.column_types("accounts")) == {"name": "String", "statecode": "State",
+                                                           "_ownerid_value": "Owner"}
+    assert asyncio.run(meta.options("accounts", "statecode")) == {0: "Active", 1: "Inactive"}
+
+
+def test_validate_suggests_close_columns(service):
+    meta, _ = service
+    asyncio.run(meta.validate("accounts", ["name", "statecode"]))
+    with pytest.raises(UnknownColumn, match="did you mean statecode"):
+        asyncio.run(meta.validate("accounts", ["statcode"]))
+
+
+def test_metadata_is_shared_through_the_file(service, tmp_path, make_client):
+    meta, fake = service
+    asyncio.run(meta.columns("accounts"))
+    other = MetadataService(make_client(fake), cache_dir=tmp_path)
+    assert asyncio.run(other.columns("accounts")) == ["_ownerid_value", "name", "statecode"]
+    assert fake.calls["batch"] == 1
+    assert other.stats()["disk_hits"] == 1
+
+
+def test_a_failed_fetch_is_not_repeated_right_away(service, monkeypatch):
+    meta, fake = service
+    fake.batch_ok = False
+
+    async def run():
+        with pytest.raises(httpx.HTTPStatusError):
+            await meta.table("accounts")
+        with pytest.raises(MetadataUnavailable):
+            await meta.table("accounts")
+        # validation goes ahead without metadata
+        await meta.validate("accounts", ["anything"])
+    asyncio.run(run())
+    assert fake.calls["batch"] == 1
+    assert meta.stats()["failing"] == ["accounts"]
+
+    fake.batch_ok = True
+    monkeypatch.setitem(meta._retry_at, "accounts", 0.0)
+    assert "name" in asyncio.run(meta.columns("accounts"))
+    assert fake.calls["batch"] == 2
+
+
+def test_disk_is_only_marked_loaded_after_the_version_check(service, monkeypatch):
+    meta, fake = service
+    fake.version_ok = False
+    asyncio.run(meta.columns("accounts"))
+    asyncio.run(meta.columns("leads"))
+    assert fake.calls["version"] == 1
+    assert not meta._disk_loaded
+
+    fake.version_ok = True
+    monkeypatch.setattr(meta, "_disk_retry_at", 0.0)
+    asyncio.run(meta.columns("accounts"))
+    assert meta._disk_loaded and meta.stats()["version"] == "9.2.1"
+    assert fake.calls["version"] == 2
+
+
+def test_option_sets_and_custom_tables(service):
+    meta, fake = service
+    assert asyncio.run(meta.options("accounts", "industrycode")) == {1: "Accounting", 2: None}
+    assert asyncio.run(meta.options("accounts", "name")) == {}
+    # a table missing from ENTITY_LOGICAL_NAMES is looked up by its entity set name
+    assert "name" in asyncio.run(meta.columns("cs_regions"))
+    with pytest.raises(ValueError, match="Unknown table"):
+        asyncio.run(meta.columns("nothings"))
+
+
+def test_a_disk_copy_missing_a_column_is_refreshed(service, tmp_path, make_client):
+    meta, fake = service
+    asyncio.run(meta.columns("accounts"))
+    fake.attributes = ATTRIBUTES + [{"LogicalName": "cs_tier", "AttributeType": "Picklist"}]
+    other = MetadataService(make_client(fake), cache_dir=tmp_path)
+    asyncio.run(other.validate("accounts", ["cs_tier"]))
+    assert fake.calls["batch"] == 2
+    with pytest.raises(UnknownColumn):
+        asyncio.run(other.validate("accounts", ["cs_teir_typo"]))
+    assert fake.calls["batch"] == 2
+
+
+def test_the_file_is_dropped_when_the_version_changes(service, tmp_path, make_client):
+    meta, fake = service
+    asyncio.run(meta.columns("accounts"))
+    fake.version = "9.2.2"
+    other = MetadataService(make_client(fake), cache_dir=tmp_path)
+    asyncio.run(other.columns("accounts"))
+    assert fake.calls["batch"] == 2 and other.stats()["disk_hits"] == 0
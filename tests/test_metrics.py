@@ -0,0 +1,15 @@
+import pytest
+
+from metrics import table_label
+
+
+@pytest.mark.parametrize("table, label", [
+    ("accounts", "accounts"),
+    ("accounts(6f1d0bb4-3f36-4b71-8f86-8bd2b2f2a6a1)", "accounts"),
+    ("EntityDefinitions(LogicalName='account')/Attributes", "EntityDefinitions"),
+    ("/api/search/v1.0/query", "search"),
+    ("api/search/v2.0/suggest", "search"),
+    ("", "unknown"),
+])
+def test_table_labels_are_bounded(table, label):
+    assert table_label(table) == label
@@ -0,0 +1,58 @@
+import pytest
+
+from mirror import SqliteMirror, UnsupportedQuery, _literal
+from odata import REGION, STATE, build_query
+
+TABLES = {"accounts": ("accountid", ["cs_accountsalesregion", "statecode", "_ownerid_value"])}
+ROWS = [
+    ("A1", {"accountid": "a1", "name": "contoso", "cs_accountsalesregion": "NAR", "statecode": 0,
+            "_ownerid_value": "AAAA0000-0000-0000-0000-000000000001"}),
+    ("A2", {"accountid": "a2", "name": "Fabrikam", "cs_accountsalesregion": "EMEA", "statecode": 0}),
+    ("A3", {"accountid": "a3", "name": "Adatum & Sons", "cs_accountsalesregion": "nar", "statecode": 1}),
+]
+
+
+@pytest.fixture
+def mirror():
+    store = SqliteMirror(":memory:", TABLES)
+    store.replace("accounts", ROWS, "delta")
+    yield store
+    store.close()
+
+
+def names(records):
+    return [record["name"] for record in records]
+
+
+def test_filter_and_sort_translate_to_sql(mirror):
+    sql, params, select = mirror._sql("accounts", "$filter=statecode eq 0 and name ne null"
+                                                  "&$orderby=name desc&$top=2&$select=name", None)
+    assert sql == ('SELECT data FROM "accounts" WHERE "statecode" = ? AND json_extract(data, \'$.name\') IS NOT NULL'
+                   ' ORDER BY json_extract(data, \'$.name\') COLLATE NOCASE DESC LIMIT ? OFFSET ?')
+    assert params == [0, 2, 0]
+    assert select == ["name"]
+
+
+def test_strings_compare_case_insensitively(mirror):
+    assert names(mirror.query("accounts", build_query([(REGION, "nar")], sort_by="name", sort_direction="asc"))) \
+        == ["Adatum & Sons", "contoso"]
+    assert names(mirror.query("accounts", "$filter=name eq 'FABRIKAM'")) == ["Fabrikam"]
+    assert names(mirror.query("accounts", "$filter=_ownerid_value eq aaaa0000-0000-0000-0000-000000000001")) \
+        == ["contoso"]
+    assert names(mirror.query("accounts", build_query([(STATE, 1)]))) == ["Adatum & Sons"]
+
+
+def test_encoded_string_literals_are_decoded(mirror):
+    query = build_query([(REGION, "nar")]) + " and name eq 'adatum %26 sons'"
+    assert names(mirror.query("accounts", query)) == ["Adatum & Sons"]
+
+
+def test_unsupported_queries_go_to_dataverse(mirror):
+    with pytest.raises(UnsupportedQuery):
+        mirror.query("accounts", "$expand=primarycontactid")
+    with pytest.raises(UnsupportedQuery):
+        mirror.query("accounts", "$filter=contains(name,'con')")
+
+
+def test_encoded_dates_are_decoded():
+    assert _literal("2024-01-01T00:00:00%2B02:00") == "2024-01-01T00:00:00+02:00"
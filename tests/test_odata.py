@@ -0,0 +1,58 @@
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+from coalesce import normalize_query
+from odata import REGION, STATE, Filter, any_of, build_query, literal
+from tests.conftest import BASE_URL
+
+
+def test_build_query_is_canonical():
+    query = build_query([(REGION, "NAR"), (STATE, 0), (Filter("name", "contains"), None)],
+                        top=5, sort_by="name", sort_direction="asc", select="$select=name")
+    assert query == ("$filter=cs_accountsalesregion eq 'NAR' and statecode eq 0"
+                     "&$orderby=name asc&$select=name&$top=5")
+
+
+def test_string_literals_are_escaped():
+    assert literal("O'Brien") == "'O''Brien'"
+    assert literal("O'Brien", encode=False) == "'O''Brien'"
+    assert literal(None) == "null"
+    with pytest.raises(ValueError):
+        literal("not-a-guid", "guid")
+
+
+def test_reserved_characters_stay_inside_the_literal():
+    query = build_query([(REGION, "CS#100&x+y 50%")], top=1)
+    assert query == "$filter=cs_accountsalesregion eq 'CS%23100%26x%2By 50%25'&$top=1"
+    # still two options, for the coalescing keys and for Dataverse
+    assert normalize_query(query).split("&") == ["$filter=cs_accountsalesregion eq 'CS%23100%26x%2By 50%25'",
+                                                  "$top=1"]
+    url = httpx.URL(f"{BASE_URL}/accounts?{query}")
+    assert url.fragment == ""
+    assert dict(parse_qsl(url.query.decode())) == {
+        "$filter": "cs_accountsalesregion eq 'CS#100&x+y 50%'", "$top": "1"}
+
+
+def test_any_of_splits_long_filters():
+    chunks = any_of("name", ["a", "b", "c", "a"], max_length=34)
+    assert chunks == ["(name eq 'a' or name eq 'b')", "(name eq 'c')"]
+
+
+def test_numbers_and_dates_survive_the_query_string():
+    close = Filter("estimatedclosedate", "ge", "date")
+    value = Filter("estimatedvalue", "ge", "number")
+    query = build_query([(close, "2024-01-01T00:00:00+02:00"), (value, 1e16)])
+    assert query == "$filter=estimatedclosedate ge 2024-01-01T00:00:00%2B02:00 and estimatedvalue ge 10000000000000000"
+    assert dict(parse_qsl(httpx.URL(f"{BASE_URL}/opportunities?{query}").query.decode())) == {
+        "$filter": "estimatedclosedate ge 2024-01-01T00:00:00+02:00 and estimatedvalue ge 10000000000000000"}
+    assert literal(1e-7) == "0.0000001"
+    assert literal(0.1) == "0.1"
+    assert literal("2024-01-01T00:00:00+02:00", "date", encode=False) == "2024-01-01T00:00:00+02:00"
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf")])
+def test_non_finite_numbers_are_rejected(value):
+    with pytest.raises(ValueError):
+        literal(value)
@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+import pytest
+
+from paging import InvalidCursor, cursor_source, decode_cursor, encode_cursor, page_size, slice_rows
+
+
+def test_cursor_round_trip():
+    state = {"k": "link", "t": "accounts", "u": "https://org/accounts?$skiptoken=x%3D1", "n": 50}
+    cursor = encode_cursor(state)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "accounts") == state
+    assert cursor_source(cursor, "accounts") == "link"
+    assert cursor_source(None, "accounts") is None
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor({"k": "link", "t": "contacts", "u": ""}),
+                                    encode_cursor({"k": "other", "t": "accounts"}), encode_cursor([1, 2])])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "accounts")
+
+
+def test_page_size_is_clamped():
+    assert page_size(0) == 1
+    assert page_size(10000) == 5000
+
+
+def test_offset_cursor_walks_local_rows():
+    rows = [{"n": i} for i in range(5)]
+    first, cursor = slice_rows("teams", rows, 2, None, "replica")
+    assert first == [{"n": 0}, {"n": 1}]
+    assert cursor_source(cursor, "teams") == "replica"
+    # the page size travels in the cursor
+    second, cursor = slice_rows("teams", rows, 100, cursor, "replica")
+    third, last = slice_rows("teams", rows, 100, cursor, "replica")
+    assert second == [{"n": 2}, {"n": 3}] and third == [{"n": 4}] and last is None
+    with pytest.raises(InvalidCursor):
+        slice_rows("teams", rows, 2, encode_cursor({"k": "offset", "t": "teams", "s": "mirror", "o": 2, "n": 2}),
+                   "replica")
+
+
+def test_client_pages_follow_the_next_link(make_client):
+    seen = []
+
+    def handler(request):
+        seen.append((str(request.url), request.headers.get("Prefer")))
+        if "$skiptoken" in request.url.params:
+            return httpx.Response(200, json={"value": [{"name": "c"}]})
+        return httpx.Response(200, json={"value": [{"name": "a"}, {"name": "b"}],
+                                         "@odata.nextLink": f"{request.url}&$skiptoken=2"})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            first, cursor = await client.query_page("accounts", "$select=name", top=2)
+            second, last = await client.query_page("accounts", "ignored", cursor=cursor)
+            with pytest.raises(InvalidCursor):
+                await client.query_page("contacts", cursor=cursor)
+        finally:
+            await client.aclose()
+        return first, second, last
+
+    first, second, last = asyncio.run(run())
+    assert [r["name"] for r in first + second] == ["a", "b", "c"] and last is None
+    assert len(seen) == 2 and "$skiptoken=2" in seen[1][0]
+    assert all(prefer.startswith("odata.maxpagesize=2") for _, prefer in seen)
+
+
+def test_page_size_is_capped_at_max_records(make_client):
+    prefers = []
+
+    def handler(request):
+        prefers.append(request.headers["Prefer"])
+        return httpx.Response(200, json={"value": [{"name": "a"}, {"name": "b"}, {"name": "c"}]})
+
+    async def run():
+        client = make_client(handler)
+        try:
+            return await client.query("accounts", "$select=name", max_records=2)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == [{"name": "a"}, {"name": "b"}]
+    assert "odata.maxpagesize=2" in prefers[0]
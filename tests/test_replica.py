@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from config import DataverseClient
+from servers.products import ProductsPluginLogic
+from servers.users import UsersPluginLogic
+from tests.conftest import BASE_URL
+
+PRODUCT_ID = "6f1d0bb4-3f36-4b71-8f86-8bd2b2f2a6a1"
+MANAGER_ID = "0a8e7f5c-1111-4c2e-9a1e-5c4b1a2d3e4f"
+PRODUCT = {"@odata.etag": 'W/"7"', "productid": PRODUCT_ID, "productnumber": "CS-100", "name": "Cable",
+           "description": None, "price": 10.0, "price@OData.Community.Display.V1.FormattedValue": "$10.00",
+           "standardcost": 4.0, "quantityonhand": 3, "stockvolume": None, "statecode": 0,
+           "cs_issalesenabled": True, "cs_productgroup": "Fiber", "cs_itemtype": 1}
+REPLICA_ROW = dict(PRODUCT, currentcost=5.0, _ownerid_value=MANAGER_ID)
+USER = {"systemuserid": "9d4c1a6e-2222-4c2e-9a1e-5c4b1a2d3e4f", "fullname": "Ana",
+        "_parentsystemuserid_value": MANAGER_ID}
+
+
+def api(request):
+    if "$filter" in request.url.params:
+        return httpx.Response(200, json={"value": [PRODUCT]})
+    return httpx.Response(200, json=PRODUCT)
+
+
+def run(make_client, replicated, call):
+    async def main():
+        client = make_client(api)
+        if replicated:
+            client.replica.tables = {"products": "productid", "systemusers": "systemuserid"}
+            client.replica.store.replace("products", [(PRODUCT_ID.upper(), REPLICA_ROW)], "delta")
+            client.replica.store.replace("systemusers", [(USER["systemuserid"], USER)], "delta")
+        try:
+            return await call(client)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("replicated", [False, True])
+def test_product_details_have_one_shape(make_client, replicated):
+    by_id = run(make_client, replicated, lambda c: ProductsPluginLogic(c).get_product_details(PRODUCT_ID.upper()))
+    by_number = run(make_client, replicated,
+                    lambda c: ProductsPluginLogic(c).get_product_details(product_number="cs-100"))
+    expected = {key: value for key, value in PRODUCT.items() if key != "@odata.etag"}
+    assert by_id == by_number == expected
+
+
+@pytest.mark.parametrize("replicated", [False, True])
+def test_ids_are_validated_on_both_paths(make_client, replicated):
+    with pytest.raises(ValueError):
+        run(make_client, replicated, lambda c: UsersPluginLogic(c).get_direct_reports("not-a-guid"))
+    with pytest.raises(ValueError):
+        run(make_client, replicated, lambda c: c.lookup("products", "1; drop"))
+
+
+def test_direct_reports_from_the_replica(make_client):
+    reports = run(make_client, True, lambda c: UsersPluginLogic(c).get_direct_reports(MANAGER_ID.upper(), "full"))
+    assert reports == [USER]
+
+
+@pytest.mark.parametrize("mode, replica_has, mirror_has", [("api", True, False), ("mirror", False, True)])
+def test_a_table_is_synced_into_one_store(monkeypatch, tmp_path, mode, replica_has, mirror_has):
+    monkeypatch.setenv("DATAVERSE_MIRROR_PATH", str(tmp_path / "mirror.db"))
+    monkeypatch.setenv("DATAVERSE_READ_MODE", mode)
+    monkeypatch.delenv("REPLICA_TABLES", raising=False)
+    monkeypatch.delenv("MIRROR_TABLES", raising=False)
+    client = DataverseClient(BASE_URL, {}, None)
+    assert ("products" in client.replica.tables) is replica_has
+    assert ("products" in client.mirror.tables) is mirror_has
+    assert "systemusers" in client.replica.tables and "accounts" in client.mirror.tables
+    client.mirror.store.close()
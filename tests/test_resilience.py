@@ -0,0 +1,158 @@
+import asyncio
+
+import httpx
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(error_rate=0.5, window=4, min_requests=2, cooldown=0)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_breaker_opens_and_probe_closes_it():
+    breaker = open_breaker()
+    assert breaker.check() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    breaker.record(True, probe=True)
+    assert breaker.state == CLOSED
+    assert breaker.check() is False
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker()
+    breaker.check()
+    breaker.record(False, probe=True)
+    assert breaker.state == OPEN
+
+
+def test_released_probe_lets_another_through():
+    breaker = open_breaker()
+    assert breaker.check() is True
+    breaker.release(True)
+    assert breaker.check() is True
+
+
+def test_cancelled_probe_does_not_wedge_the_client(make_client):
+    stall = asyncio.Event()
+
+    async def handler(request):
+        if request.url.params.get("n") == "stall":
+            await stall.wait()
+        return httpx.Response(200, json={"value": []})
+
+    async def main():
+        client = make_client(handler)
+        client.breaker = open_breaker()
+        # _send itself: reads share one request through coalescing, which a waiter can't cancel
+        probe = asyncio.create_task(client._send("GET", f"{client.base_url}/accounts?n=stall", "accounts"))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        for i in range(3):
+            assert await client.query_with_params("accounts", {"n": str(i)}) == {"value": []}
+        assert client.breaker.state == CLOSED
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_probe_failing_before_the_request_is_sent_is_released(make_client):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"value": []})
+
+    async def main():
+        client = make_client(handler)
+        client.breaker = open_breaker()
+        real_request = client.http.request
+
+        async def no_token(*args, **kwargs):
+            raise RuntimeError("credential unavailable")
+
+        client.http.request = no_token
+        with pytest.raises(RuntimeError):
+            await client.query_with_params("accounts", {"n": "1"})
+        client.http.request = real_request
+        assert await client.query_with_params("accounts", {"n": "2"}) == {"value": []}
+        assert client.breaker.state == CLOSED
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_hedged_duplicate_goes_through_the_concurrency_limit(make_client):
+    active, peak = [0], [0]
+
+    async def handler(request):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        try:
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={"value": []})
+        finally:
+            active[0] -= 1
+
+    async def main():
+        client = make_client(handler)
+        limiter = client.throttle.limiter("org.crm.dynamics.com")
+        limiter.limit = limiter.maximum = 1
+        client.hedger.budget = 1
+        client.hedger._latencies.extend([0.01] * 50)
+        await client._send("GET", f"{client.base_url}/accounts", "accounts")
+        assert client.hedger.hedged == 1
+        assert peak[0] == 1
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_no_hedge_while_requests_are_held_by_retry_after():
+    from resilience import Hedger
+
+    async def main():
+        hedger = Hedger(budget=1)
+        hedger._latencies.extend([0.01] * 50)
+        sent = []
+
+        async def request():
+            sent.append(1)
+            await asyncio.sleep(0.1)
+            return httpx.Response(200)
+
+        await hedger.send(request, busy=lambda: True)
+        assert len(sent) == 1 and hedger.hedged == 0
+
+    asyncio.run(main())
+
+
+def test_a_fast_server_error_does_not_beat_a_slower_success():
+    from resilience import Hedger
+
+    async def main():
+        hedger = Hedger(budget=1)
+        hedger._latencies.extend([0.01] * 50)
+        statuses = iter([(0.1, 200), (0.0, 503)])
+
+        async def request():
+            delay, status = next(statuses)
+            await asyncio.sleep(delay)
+            return httpx.Response(status)
+
+        resp = await hedger.send(request)
+        assert resp.status_code == 200 and hedger.hedged == 1 and hedger.hedge_won == 0
+
+        statuses = iter([(0.2, 500), (0.0, 502)])
+        resp = await hedger.send(request)
+        assert resp.status_code == 502
+
+    asyncio.run(main())
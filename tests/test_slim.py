@@ -0,0 +1,55 @@
+import slim
+from codec import dumps
+from slim import FORMATTED_VALUE, ResultShaper, enforce_budget, slim_value
+
+
+def test_records_lose_nulls_and_annotations():
+    record = {"@odata.etag": "W/1", "name": "Contoso", "telephone1": None, "statecode": 0,
+              f"statecode{FORMATTED_VALUE}": "Active", "_ownerid_value": "1",
+              f"_ownerid_value{FORMATTED_VALUE}": "Ada"}
+    assert slim_value(record) == {"name": "Contoso", "statecode": 0, "statecode_label": "Active",
+                                  "_ownerid_value": "1", "ownerid_name": "Ada"}
+    assert slim_value([record, "text"])[0]["ownerid_name"] == "Ada"
+
+
+def test_envelope_keys_are_kept():
+    page = {"records": [{"name": "a", "fax": None}], "next_cursor": None}
+    assert slim_value(page) == {"records": [{"name": "a"}], "next_cursor": None}
+    raw = {"@odata.context": "x", "value": [{"name": "a", "fax": None}]}
+    assert slim_value(raw) == {"value": [{"name": "a"}]}
+
+
+def test_search_results_are_unwrapped():
+    hits = {"value": [{"@search.score": 1, "@search.entity": {"name": "a", "fax": None}}]}
+    assert slim_value(hits) == [{"name": "a"}]
+
+
+def test_tools_can_opt_out_of_slimming():
+    groups = [{"group": None, "count": 2, "total": 10.0}]
+    assert ResultShaper(default_budget=0).shape("aggregate_orders", groups, slim=False) == \
+        (groups, '[{"group":null,"count":2,"total":10.0}]')
+
+
+def test_budget_cuts_records_and_keeps_the_cursor():
+    page = {"records": [{"name": "x" * 50} for _ in range(20)], "next_cursor": "abc"}
+    cut = enforce_budget("list_accounts", page, 600)
+    assert cut["next_cursor"] == "abc"
+    assert cut["records"][-1]["_truncated"] is True
+    assert len(cut["records"]) < 20
+
+
+def test_results_under_budget_are_encoded_once(monkeypatch):
+    calls = []
+
+    def counting_dumps(value):
+        calls.append(value)
+        return dumps(value)
+
+    monkeypatch.setattr(slim, "dumps", counting_dumps)
+    assert ResultShaper(default_budget=1000).shape("get_account", {"name": "a", "fax": None}) == \
+        ({"name": "a"}, '{"name":"a"}')
+    assert len(calls) == 1
+
+    value, text = ResultShaper(default_budget=300).shape("list_accounts", [{"name": "x" * 50}] * 20)
+    assert value[-1]["_truncated"] is True
+    assert text == dumps(value)
@@ -0,0 +1,31 @@
+import asyncio
+import json
+
+from slowlog import SlowQueryLog
+
+
+def test_lines_are_written_off_the_event_loop(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(threshold_ms=0, path=str(path))
+
+    async def run():
+        for i in range(100):
+            log.record({"table": "accounts", "elapsed_ms": i})
+        # nothing touched the disk on the loop
+        assert not path.exists()
+        await log.flush()
+    asyncio.run(run())
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["elapsed_ms"] for line in lines] == list(range(100))
+    assert log.entries(2)[0]["elapsed_ms"] == 99
+
+
+def test_the_file_is_rotated(tmp_path):
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(threshold_ms=0, path=str(path), max_bytes=10)
+    # without an event loop the line is written straight away
+    log.record({"table": "accounts"})
+    log.record({"table": "leads"})
+    assert "accounts" in (tmp_path / "slow.jsonl.1").read_text()
+    assert "leads" in path.read_text()
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from throttle import BURST_REMAINING, AdaptiveLimiter, Throttle, retry_after
+
+
+@pytest.mark.parametrize("value, expected", [("7", 7.0), ("-3", 0.0), ("soon", None), (None, None)])
+def test_retry_after_in_seconds(value, expected):
+    headers = {"Retry-After": value} if value is not None else {}
+    assert retry_after(httpx.Response(429, headers=headers)) == expected
+
+
+def test_retry_after_as_a_date():
+    wait = retry_after(httpx.Response(503, headers={"Retry-After": formatdate(time.time() + 30, usegmt=True)}))
+    assert 28 <= wait <= 30
+
+
+def test_limit_grows_additively_and_halves_once_per_round():
+    async def main():
+        limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=10)
+        started = await limiter.acquire()
+        assert await limiter.release(started, httpx.Response(200)) is None
+        assert limiter.limit == 4.25
+
+        # two requests of the same round throttled: only one decrease
+        first, second = await limiter.acquire(), await limiter.acquire()
+        assert await limiter.release(first, httpx.Response(429, headers={"Retry-After": "0"})) == 0.0
+        assert await limiter.release(second, httpx.Response(429)) == 0.0
+        assert limiter.limit == 2.125 and limiter.throttled == 2
+        # a request sent after the decrease halves it again
+        third = await limiter.acquire()
+        await limiter.release(third, httpx.Response(503))
+        assert limiter.limit == 1.0625
+
+        # server errors leave the limit alone, a low burst allowance caps it
+        await limiter.release(await limiter.acquire(), httpx.Response(500))
+        assert limiter.limit == 1.0625
+        limiter.limit = 8
+        await limiter.release(await limiter.acquire(), httpx.Response(200, headers={BURST_REMAINING: "3"}))
+        assert limiter.limit == 3 and limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_retry_after_holds_the_host_and_the_request_is_retried():
+    async def main():
+        throttle = Throttle()
+        limiter = throttle.limiter("org")
+        statuses = [429, 200]
+
+        async def request():
+            return httpx.Response(statuses.pop(0), headers={"Retry-After": "0.2"})
+
+        started = time.monotonic()
+        resp = await throttle.send("org", request, True)
+        assert resp.status_code == 200 and limiter.retries == 1
+        assert time.monotonic() - started >= 0.2
+
+        # not idempotent: the throttled response comes back as is
+        statuses[:] = [429]
+        assert (await throttle.send("org", request, False)).status_code == 429
+
+    asyncio.run(main())
+
+
+def test_cancelled_request_gives_its_slot_back():
+    async def main():
+        throttle = Throttle()
+        limiter = throttle.limiter("org")
+
+        answered = asyncio.Event()
+
+        async def request():
+            await answered.wait()
+            return httpx.Response(200)
+
+        task = asyncio.create_task(throttle.send("org", request, True))
+        await asyncio.sleep(0.01)
+        assert limiter.in_flight == 1
+        # release has to wait for the lock, and is cancelled there like a losing hedge
+        async with limiter._cond:
+            answered.set()
+            await asyncio.sleep(0.01)
+            task.cancel()
+        await asyncio.sleep(0.01)
+        assert task.cancelled()
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_timing_starts_once_a_slot_is_free():
+    async def main():
+        throttle = Throttle()
+        limiter = throttle.limiter("org")
+        limiter.limit = 1
+        samples = []
+
+        async def request():
+            await asyncio.sleep(0.1)
+            return httpx.Response(200)
+
+        await asyncio.gather(*(throttle.send("org", request, True, samples.append) for _ in range(3)))
+        # the second and third queued behind the first, which doesn't count
+        assert len(samples) == 3 and max(samples) < 0.15
+
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core.credentials import AccessToken
+
+import auth
+from token_cache import FileTokenCache
+
+
+def test_tokens_round_trip(tmp_path):
+    cache = FileTokenCache(tmp_path)
+    cache.save("scope", AccessToken("abc", int(time.time()) + 3600), "managed_identity")
+    other = FileTokenCache(tmp_path)
+    assert other.load("scope").token == "abc"
+    assert other.load("scope", min_valid_seconds=7200) is None
+    assert other.last_credential() == "managed_identity"
+    assert b"abc" not in (tmp_path / "tokens.bin").read_bytes()
+
+
+def test_processes_starting_together_share_one_key(tmp_path):
+    with ThreadPoolExecutor(8) as pool:
+        caches = list(pool.map(lambda _: FileTokenCache(tmp_path), range(16)))
+    caches[0].save("scope", AccessToken("abc", int(time.time()) + 3600))
+    assert all(cache.load("scope").token == "abc" for cache in caches)
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".tokens-key-")] == []
+
+
+def test_a_malformed_key_turns_the_cache_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "FileTokenCache", lambda: FileTokenCache(tmp_path, key="not-a-key"))
+    assert auth.create_credential().cache is None
+    (tmp_path / "tokens.key").write_bytes(b"")
+    monkeypatch.setattr(auth, "FileTokenCache", lambda: FileTokenCache(tmp_path))
+    assert auth.create_credential().cache is None
+
+
+class Unavailable:
+    def get_token(self, *scopes, **kwargs):
+        raise RuntimeError("not signed in")
+
+
+class Available:
+    made = 0
+
+    def __init__(self):
+        Available.made += 1
+
+    def get_token(self, *scopes, **kwargs):
+        return AccessToken("abc", int(time.time()) + 3600)
+
+
+def test_the_last_successful_credential_is_tried_first(tmp_path):
+    probed = []
+
+    def probe(name, credential):
+        def make():
+            probed.append(name)
+            return credential()
+        return make
+
+    chain = {"environment": probe("environment", Unavailable), "azure_cli": probe("azure_cli", Available)}
+    auth.CachedChainCredential(FileTokenCache(tmp_path), chain).get_token("scope")
+    assert probed == ["environment", "azure_cli"]
+
+    probed.clear()
+    FileTokenCache(tmp_path).discard("scope")
+    auth.CachedChainCredential(FileTokenCache(tmp_path), chain).get_token("scope")
+    assert probed == ["azure_cli"]
+
+
+def test_the_chain_holds_single_credentials():
+    assert "default" not in auth.CREDENTIAL_CHAIN
+    assert list(auth.CREDENTIAL_CHAIN)[-1] == "managed_identity"
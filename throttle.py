@@ -0,0 +1,169 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+# concurrent requests per host: where the limit starts, and how far it may move
+THROTTLE_INITIAL_LIMIT = float(os.getenv("THROTTLE_INITIAL_LIMIT", "8"))
+THROTTLE_MIN_LIMIT = float(os.getenv("THROTTLE_MIN_LIMIT", "1"))
+# Dataverse allows 52 concurrent requests per user
+THROTTLE_MAX_LIMIT = float(os.getenv("THROTTLE_MAX_LIMIT", "52"))
+# retries of a throttled idempotent request, and the longest Retry-After worth waiting for
+THROTTLE_MAX_RETRIES = int(os.getenv("THROTTLE_MAX_RETRIES", "5"))
+THROTTLE_MAX_WAIT = float(os.getenv("THROTTLE_MAX_WAIT_SECONDS", "120"))
+THROTTLE_BACKOFF = float(os.getenv("THROTTLE_BACKOFF_SECONDS", "0.5"))
+
+THROTTLED = (429, 503)
+BURST_REMAINING = "x-ms-ratelimit-burst-remaining-xrm-requests"
+
+
+def retry_after(resp: httpx.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given in seconds or as an HTTP date."""
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int) -> float:
+    """Full jitter: anywhere up to an exponentially growing cap, so retries spread out."""
+    return random.uniform(0, min(THROTTLE_BACKOFF * 2 ** attempt, 30.0))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one host. Each successful response grows the limit by
+    1/limit (about one more request per round trip), each throttled one halves it, once
+    per round of requests. A Retry-After holds every request to the host until it passes,
+    and a low x-ms-ratelimit burst allowance caps the limit before Dataverse has to throttle.
+    Requests over the limit queue rather than fail.
+    """
+
+    def __init__(self, initial: float = THROTTLE_INITIAL_LIMIT, minimum: float = THROTTLE_MIN_LIMIT,
+                 maximum: float = THROTTLE_MAX_LIMIT):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.in_flight = 0
+        self.queued = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.retries = 0
+        self._decreased_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns when the request started, to pass back to release."""
+        self.queued += 1
+        try:
+            async with self._cond:
+                while True:
+                    delay = self.blocked_until - time.monotonic()
+                    if delay > 0:
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), delay)
+                        except asyncio.TimeoutError:
+                            pass
+                    elif self.in_flight < int(self.limit):
+                        break
+                    else:
+                        await self._cond.wait()
+                self.in_flight += 1
+        finally:
+            self.queued -= 1
+        return time.monotonic()
+
+    async def release(self, started: float, resp: Optional[httpx.Response] = None) -> Optional[float]:
+        """
+        Free the slot and adjust the limit to the response. For a throttled response,
+        returns the Retry-After in seconds, or 0 when there was none.
+        """
+        wait = None
+        async with self._cond:
+            self.in_flight -= 1
+            if resp is not None and resp.status_code in THROTTLED:
+                self.throttled += 1
+                wait = retry_after(resp) or 0.0
+                # a round of requests sent before the last decrease shouldn't halve it again
+                if started >= self._decreased_at:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased_at = time.monotonic()
+                self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+            elif resp is not None and resp.status_code < 500:
+                remaining = resp.headers.get(BURST_REMAINING)
+                if remaining is not None and remaining.isdigit() and int(remaining) < self.limit:
+                    self.limit = max(self.minimum, float(remaining))
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+        return wait
+
+    def busy(self) -> bool:
+        """Requests are queued for a slot or held by a Retry-After."""
+        return self.queued > 0 or self.blocked_until > time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "blocked_for": round(max(self.blocked_until - time.monotonic(), 0.0), 1),
+        }
+
+
+class Throttle:
+    """An AdaptiveLimiter per host, and the retry loop around a request."""
+
+    def __init__(self, max_retries: int = THROTTLE_MAX_RETRIES, max_wait: float = THROTTLE_MAX_WAIT):
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def limiter(self, host: str) -> AdaptiveLimiter:
+        limiter = self.limiters.get(host)
+        if limiter is None:
+            limiter = self.limiters[host] = AdaptiveLimiter()
+        return limiter
+
+    async def send(self, host: str, request, idempotent: bool,
+                   timed: Optional[Callable[[float], None]] = None) -> httpx.Response:
+        """
+        Send through the host's limiter. request is a no-argument coroutine function.
+        Throttled idempotent requests are retried after the Retry-After (or a jittered
+        backoff); anything else gets the throttled response back. timed is given the
+        seconds from acquiring a slot to the response, for attempts that weren't throttled.
+        """
+        limiter = self.limiter(host)
+        attempt = 0
+        while True:
+            started = await limiter.acquire()
+            resp = None
+            try:
+                resp = await request()
+            finally:
+                # shielded: a cancelled hedge must still give its slot back
+                wait = await asyncio.shield(limiter.release(started, resp))
+            if timed is not None and wait is None:
+                timed(time.monotonic() - started)
+            if wait is None or not idempotent or attempt >= self.max_retries or wait > self.max_wait:
+                return resp
+            limiter.retries += 1
+            # everyone waits out the Retry-After in acquire; the jitter keeps them from returning at once
+            await asyncio.sleep(backoff(attempt))
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: limiter.stats() for host, limiter in self.limiters.items()}
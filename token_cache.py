@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from azure.core.credentials import AccessToken
+from cryptography.fernet import Fernet, InvalidToken
+
+try:
+    import fcntl
+except ImportError:  # windows, fall back to atomic replace without locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(os.getenv("TOKEN_CACHE_DIR", Path.home() / ".cache" / "dataverse-mcp"))
+
+
+class FileTokenCache:
+    """
+    Encrypted, file-backed token cache shared by every server process on the machine.
+    It also remembers which credential in the chain last produced a token.
+
+    The Fernet key is read from TOKEN_CACHE_KEY. When that isn't set, a key file is
+    generated next to the cache with owner-only permissions. A key stored next to the
+    ciphertext only keeps the tokens from being read off a copied or backed-up cache file;
+    anyone who can read both files as this user can decrypt them. Set TOKEN_CACHE_KEY
+    (e.g. from a secret store) to keep the key elsewhere.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, key: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+        self.path = self.cache_dir / "tokens.bin"
+        self.lock_path = self.cache_dir / "tokens.lock"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._fernet = Fernet(key or os.getenv("TOKEN_CACHE_KEY") or self._load_or_create_key())
+
+    def _load_or_create_key(self) -> bytes:
+        key_path = self.cache_dir / "tokens.key"
+        try:
+            return key_path.read_bytes().strip()
+        except FileNotFoundError:
+            pass
+        key = Fernet.generate_key()
+        # write the key in full before it appears under its name, so a process starting at the
+        # same time never reads a half-written file; the link fails if another process won
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".tokens-key-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(key)
+            os.link(tmp, key_path)
+        except FileExistsError:
+            return key_path.read_bytes().strip()
+        finally:
+            os.unlink(tmp)
+        return key
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self._fernet.decrypt(self.path.read_bytes()))
+        except FileNotFoundError:
+            return {}
+        except (InvalidToken, ValueError):
+            logger.warning("Token cache at %s is unreadable, ignoring it", self.path)
+            return {}
+
+    def _write(self, data: Dict[str, Any]):
+        blob = self._fernet.encrypt(json.dumps(data).encode("utf-8"))
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".tokens-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, self.path)
+
+    def load(self, scope: str, min_valid_seconds: float = 0) -> Optional[AccessToken]:
+        """Return the cached token for a scope if it stays valid for at least min_valid_seconds."""
+        with self._locked():
+            entry = self._read().get("tokens", {}).get(scope)
+        if not entry or entry["expires_on"] - time.time() <= min_valid_seconds:
+            return None
+        return AccessToken(entry["token"], entry["expires_on"])
+
+    def save(self, scope: str, token: AccessToken, credential_name: Optional[str] = None):
+        with self._locked():
+            data = self._read()
+            now = time.time()
+            tokens = {s: e for s, e in data.get("tokens", {}).items() if e["expires_on"] > now}
+            tokens[scope] = {"token": token.token, "expires_on": token.expires_on}
+            data["tokens"] = tokens
+            if credential_name:
+                data["last_credential"] = credential_name
+            self._write(data)
+
+    def discard(self, scope: str):
+        """Forget the cached token for a scope, e.g. after the server rejected it."""
+        with self._locked():
+            data = self._read()
+            if data.get("tokens", {}).pop(scope, None) is not None:
+                self._write(data)
+
+    def last_credential(self) -> Optional[str]:
+        with self._locked():
+            return self._read().get("last_credential")
@@ -0,0 +1,274 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from codec import dumps
+
+logger = logging.getLogger(__name__)
+
+# where finished spans go: "chrome", "otlp" or both ("chrome,otlp"); empty turns tracing off
+TRACE_EXPORT = [item.strip() for item in os.getenv("TRACE_EXPORT", "").lower().split(",") if item.strip()]
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.json")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "dataverse-mcp")
+# share of tool calls traced; the decision is made once per trace
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "5"))
+# spans waiting for export beyond this are dropped
+TRACE_MAX_PENDING = int(os.getenv("TRACE_MAX_PENDING", "10000"))
+
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# literals in an OData query: strings, GUIDs, dates and numbers
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b"
+                      r"|\b\d{4}-\d{2}-\d{2}(?:T[\d:.]+Z?)?\b|(?<![\w.])-?\d+(?:\.\d+)?\b")
+
+
+def query_shape(odata_query: str) -> str:
+    """An OData query with its literal values replaced by ?, so requests group by shape."""
+    return LITERALS.sub("?", odata_query)
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    recording = True
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        if self.sampled:
+            self.attributes.update(attributes)
+
+
+class _NoopSpan:
+    recording = False
+
+    def set(self, **attributes: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+def current_span():
+    """The active span, or a no-op one, so callers can always .set() attributes."""
+    current = _current.get()
+    return current if current is not None and current.sampled else NOOP_SPAN
+
+
+class ChromeTraceExporter:
+    """
+    Appends spans to a Chrome trace file (JSON array format, which may be left open),
+    for chrome://tracing or ui.perfetto.dev. Each trace gets its own row.
+    """
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    async def export(self, spans: List[Span]):
+        await asyncio.to_thread(self._write, spans)
+
+    def _write(self, spans: List[Span]):
+        lines = []
+        for span in spans:
+            args = {**span.attributes, "trace_id": span.trace_id, "span_id": span.span_id}
+            if span.error:
+                args["error"] = span.error
+            lines.append(dumps({
+                "name": span.name, "cat": span.kind, "ph": "X", "pid": os.getpid(),
+                "tid": int(span.trace_id[:7], 16), "ts": span.start_ns // 1000,
+                "dur": max((span.end_ns - span.start_ns) // 1000, 1), "args": args,
+            }))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write("[\n")
+            f.write("".join(line + ",\n" for line in lines))
+
+    async def aclose(self):
+        pass
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter:
+    """Posts spans to an OpenTelemetry collector as OTLP/HTTP JSON, e.g. http://localhost:4318/v1/traces."""
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, service_name: str = SERVICE_NAME):
+        self.url = f"{endpoint}/v1/traces"
+        self.service_name = service_name
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "dataverse-mcp"}, "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                # 1 internal, 3 client
+                "kind": 3 if span.kind == "client" else 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items() if v is not None],
+                "status": {"code": 2, "message": span.error} if span.error else {},
+            } for span in spans]}],
+        }]}
+
+    async def export(self, spans: List[Span]):
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10)
+        resp = await self._http.post(self.url, content=dumps(self.encode(spans)),
+                                     headers={"Content-Type": "application/json"})
+        resp.raise_for_status()
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+
+
+EXPORTERS = {"chrome": ChromeTraceExporter, "otlp": OtlpExporter}
+
+
+class Tracer:
+    """Collects finished spans and exports them in the background every TRACE_FLUSH_SECONDS."""
+
+    def __init__(self, exporters: List[Any], sample_rate: float = TRACE_SAMPLE_RATE):
+        self.exporters = exporters
+        self.sample_rate = sample_rate
+        self._pending: List[Span] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def finish(self, span: Span):
+        with self._lock:
+            if len(self._pending) >= TRACE_MAX_PENDING:
+                self.dropped += 1
+                return
+            self._pending.append(span)
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(TRACE_FLUSH_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        with self._lock:
+            spans, self._pending = self._pending, []
+        if not spans:
+            return
+        for exporter in self.exporters:
+            try:
+                await exporter.export(spans)
+            except Exception as e:
+                logger.warning("Exporting %d spans with %s failed: %s", len(spans), type(exporter).__name__, e)
+        self.exported += len(spans)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        for exporter in self.exporters:
+            await exporter.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"export": [type(e).__name__ for e in self.exporters], "sample_rate": self.sample_rate,
+                "pending": len(self._pending), "exported": self.exported, "dropped": self.dropped}
+
+
+def create_tracer(names: List[str] = TRACE_EXPORT) -> Tracer:
+    unknown = [name for name in names if name not in EXPORTERS]
+    if unknown:
+        raise ValueError(f"Unknown TRACE_EXPORT {', '.join(unknown)}, use chrome and/or otlp")
+    return Tracer([EXPORTERS[name]() for name in names])
+
+
+TRACER = create_tracer()
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", traceparent: Optional[str] = None,
+         **attributes: Any) -> Iterator[Any]:
+    """
+    Run the block in a child of the current span, or in a new trace. traceparent (a W3C
+    header, e.g. from the MCP client) continues a trace started elsewhere.
+    """
+    if not TRACER.enabled:
+        yield NOOP_SPAN
+        return
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+    else:
+        incoming = TRACEPARENT.match(traceparent or "")
+        if incoming:
+            trace_id, parent_id, sampled = incoming.group(1), incoming.group(2), incoming.group(3) == "01"
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < TRACER.sample_rate
+    current = Span(name, kind, trace_id, parent_id, sampled, attributes)
+    token = _current.set(current)
+    try:
+        yield current if sampled else NOOP_SPAN
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current.reset(token)
+        if sampled:
+            TRACER.finish(current)
+
+
+def traced(name: str) -> Callable:
+    """Trace an async DataverseClient method; its first argument is recorded as the table."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def run(self, table, *args, **kwargs):
+            with span(name, table=table):
+                return await fn(self, table, *args, **kwargs)
+        return run
+    return decorate